@@ -0,0 +1,87 @@
+package com.AIce.Backend.dashboard.service;
+
+import lombok.RequiredArgsConstructor;
+import lombok.extern.slf4j.Slf4j;
+import org.springframework.beans.factory.annotation.Value;
+import org.springframework.boot.context.event.ApplicationReadyEvent;
+import org.springframework.context.event.EventListener;
+import org.springframework.jdbc.core.JdbcTemplate;
+import org.springframework.scheduling.annotation.Scheduled;
+import org.springframework.stereotype.Component;
+
+import java.sql.Date;
+import java.time.LocalDate;
+import java.time.ZoneOffset;
+
+@Slf4j
+@Component
+@RequiredArgsConstructor
+public class TokenUsagePartitionScheduler {
+
+    private final JdbcTemplate jdbcTemplate;
+
+    // 미리 만들어 둘 일 파티션 수 (오늘 포함)
+    @Value("${token-usage.partition.premake-days:7}")
+    private int premakeDays;
+
+    // 보관 일수 (0 이하면 retention 비활성화)
+    @Value("${token-usage.partition.retention-days:0}")
+    private int retentionDays;
+
+    // true면 분리 후 삭제, false면 분리만 (아카이브 후 수동 삭제)
+    @Value("${token-usage.partition.drop-detached:false}")
+    private boolean dropDetached;
+
+    @EventListener(ApplicationReadyEvent.class)
+    public void onStartup() {
+        ensurePartitions();
+    }
+
+    // 매일 00:10 (UTC) 파티션 생성 + 보관 기간 지난 파티션 분리
+    @Scheduled(cron = "0 10 0 * * *", zone = "UTC")
+    public void maintain() {
+        ensurePartitions();
+        applyRetention();
+    }
+
+    public void ensurePartitions() {
+        try {
+            Integer created = jdbcTemplate.queryForObject(
+                    "SELECT token_usage_ensure_partitions(?, ?)",
+                    Integer.class,
+                    Date.valueOf(LocalDate.now(ZoneOffset.UTC)),
+                    premakeDays
+            );
+            if (created != null && created > 0) {
+                log.info("token_usage 파티션 {}개 생성", created);
+            }
+        } catch (Exception e) {
+            log.error("token_usage 파티션 생성 실패", e);
+        }
+        checkDefaultPartition();
+    }
+
+    // DEFAULT 파티션은 정상 상태에서 비어 있어야 함 (남아 있으면 파티션 범위 밖 시각의 행)
+    public void checkDefaultPartition() {
+        try {
+            Long rows = jdbcTemplate.queryForObject("SELECT COUNT(*) FROM token_usage_default", Long.class);
+            if (rows != null && rows > 0) {
+                log.warn("token_usage_default에 {}건 남아 있음 (해당 날짜 파티션 생성 시 자동 이동)", rows);
+            }
+        } catch (Exception e) {
+            log.error("token_usage_default 확인 실패", e);
+        }
+    }
+
+    public void applyRetention() {
+        if (retentionDays <= 0) {
+            return;
+        }
+        try {
+            jdbcTemplate.update("CALL token_usage_retention(?, ?)", retentionDays, dropDetached);
+            log.info("token_usage retention 적용 (보관 {}일, 삭제: {})", retentionDays, dropDetached);
+        } catch (Exception e) {
+            log.error("token_usage retention 실패", e);
+        }
+    }
+}
@@ -8,15 +8,24 @@ import com.AIce.Backend.global.annotation.ReadOnlyTransactional;
 import com.AIce.Backend.usersetting.dto.*;
 import com.AIce.Backend.usersetting.exception.*;
 import lombok.RequiredArgsConstructor;
+import lombok.extern.slf4j.Slf4j;
+import org.springframework.data.redis.core.StringRedisTemplate;
 import org.springframework.stereotype.Service;
 import org.springframework.transaction.annotation.Transactional;
+import org.springframework.transaction.support.TransactionSynchronization;
+import org.springframework.transaction.support.TransactionSynchronizationManager;
 
+@Slf4j
 @RequiredArgsConstructor
 @Service
 public class UserSettingService {
 
+    // Data 서버의 system prompt 캐시 무효화 채널
+    private static final String INVALIDATE_CHANNEL = "user-setting.invalidate";
+
     private final UserSettingRepository userSettingRepository;
     private final UserRepository userRepository;
+    private final StringRedisTemplate redisTemplate;
 
     @ReadOnlyTransactional
     public UserSettingResponse getMySetting(Long userId) {
@@ -42,6 +51,7 @@ public class UserSettingService {
         us.setAdditionalContext(req.getAdditionalContext());
 
         userSettingRepository.save(us);
+        publishInvalidationAfterCommit(userId);
         return toResp(us);
     }
 
@@ -56,9 +66,24 @@ public class UserSettingService {
         if (req.getTraits() != null) us.setTraits(req.getTraits());
         if (req.getAdditionalContext() != null) us.setAdditionalContext(req.getAdditionalContext());
 
+        publishInvalidationAfterCommit(userId);
         return toResp(us);
     }
 
+    private void publishInvalidationAfterCommit(Long userId) {
+        TransactionSynchronizationManager.registerSynchronization(new TransactionSynchronization() {
+            @Override
+            public void afterCommit() {
+                try {
+                    redisTemplate.convertAndSend(INVALIDATE_CHANNEL, String.valueOf(userId));
+                } catch (Exception e) {
+                    // 실패해도 Data 서버 캐시는 TTL 후 갱신됨
+                    log.warn("[UserSetting] invalidation publish failed userId={}", userId, e);
+                }
+            }
+        });
+    }
+
     private UserSettingResponse toResp(UserSetting us) {
         return UserSettingResponse.builder()
                 .userSettingId(us.getUserSettingId())
@@ -0,0 +1,113 @@
+BEGIN;
+
+-- token_usage → created_at 기준 일 단위 RANGE 파티션
+-- 최근 24시간 집계/대시보드 조회가 파티션 1~2개만 읽도록 함
+-- (파티션 테이블의 PK에는 파티션 키가 포함되어야 하므로 PK = (id, created_at))
+
+ALTER TABLE token_usage RENAME TO token_usage_legacy;
+ALTER TABLE token_usage_legacy RENAME CONSTRAINT token_usage_pkey TO token_usage_legacy_pkey;
+
+CREATE TABLE token_usage (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    user_id BIGINT REFERENCES users(user_id),
+    message_id UUID REFERENCES chat_message(message_id),
+    prompt_tokens INT,
+    completion_tokens INT,
+    total_tokens INT,
+    cost_usd NUMERIC(14, 6),
+    energy_wh NUMERIC(14, 6),
+    co2_g NUMERIC(14, 6),
+    saved_tokens INT,
+    saved_cost_usd NUMERIC(14, 6),
+    saved_energy_wh NUMERIC(14, 6),
+    saved_co2_g NUMERIC(14, 6),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- 파티션이 아직 없는 시각의 행을 받아주는 안전망 (정상 상태에서는 비어 있어야 함)
+CREATE TABLE token_usage_default PARTITION OF token_usage DEFAULT;
+
+-- 시간 범위 스캔용 BRIN (created_at은 insert 순서와 거의 일치)
+CREATE INDEX idx_token_usage_created_at_brin ON token_usage USING BRIN (created_at) WITH (pages_per_range = 32);
+-- 사용자별 기간 집계: 인덱스만으로 처리 (heap 접근 없음)
+CREATE INDEX idx_token_usage_user_created ON token_usage (user_id, created_at)
+    INCLUDE (total_tokens, saved_tokens, cost_usd);
+
+-- 일 파티션 생성: token_usage_pYYYYMMDD, [해당일 00:00 UTC, 다음날 00:00 UTC)
+-- p_from부터 p_days일치를 만들고 새로 만든 개수 반환 (이미 있으면 건너뜀)
+CREATE OR REPLACE FUNCTION token_usage_ensure_partitions(p_from DATE, p_days INT)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    d DATE;
+    part_name TEXT;
+    created INT := 0;
+BEGIN
+    -- 여러 인스턴스가 동시에 호출해도 한 번씩만 생성
+    PERFORM pg_advisory_xact_lock(hashtext('token_usage_partitions'));
+    FOR i IN 0..GREATEST(p_days, 1) - 1 LOOP
+        d := p_from + i;
+        part_name := format('token_usage_p%s', to_char(d, 'YYYYMMDD'));
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF token_usage FOR VALUES FROM (%L) TO (%L)',
+                part_name,
+                d::timestamp AT TIME ZONE 'UTC',
+                (d + 1)::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- 보관 기간이 지난 일 파티션 분리 (p_drop = true면 삭제까지)
+-- 분리된 테이블은 이름 그대로 남으므로 아카이브 후 직접 DROP 가능
+CREATE OR REPLACE PROCEDURE token_usage_retention(p_keep_days INT, p_drop BOOLEAN DEFAULT FALSE)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    part RECORD;
+    cutoff DATE := (NOW() AT TIME ZONE 'UTC')::date - p_keep_days;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('token_usage_partitions'));
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'token_usage'::regclass
+          AND c.relname ~ '^token_usage_p[0-9]{8}$'
+          AND to_date(substring(c.relname from 14), 'YYYYMMDD') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE token_usage DETACH PARTITION %I', part.relname);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', part.relname);
+        END IF;
+        RAISE NOTICE 'token_usage partition % detached (dropped: %)', part.relname, p_drop;
+    END LOOP;
+END;
+$$;
+
+-- 기존 데이터 범위 + 앞으로 7일치 파티션 생성 후 이관
+SELECT token_usage_ensure_partitions(
+    LEAST(COALESCE((SELECT MIN(created_at AT TIME ZONE 'UTC')::date FROM token_usage_legacy), CURRENT_DATE), CURRENT_DATE),
+    (CURRENT_DATE - LEAST(COALESCE((SELECT MIN(created_at AT TIME ZONE 'UTC')::date FROM token_usage_legacy), CURRENT_DATE), CURRENT_DATE)) + 8
+);
+
+INSERT INTO token_usage (
+    id, user_id, message_id, prompt_tokens, completion_tokens, total_tokens,
+    cost_usd, energy_wh, co2_g, saved_tokens, saved_cost_usd, saved_energy_wh, saved_co2_g, created_at
+)
+SELECT
+    id, user_id, message_id, prompt_tokens, completion_tokens, total_tokens,
+    cost_usd, energy_wh, co2_g, saved_tokens, saved_cost_usd, saved_energy_wh, saved_co2_g,
+    COALESCE(created_at, NOW())
+FROM token_usage_legacy;
+
+DROP TABLE token_usage_legacy;
+
+COMMIT;
@@ -0,0 +1,55 @@
+BEGIN;
+
+-- token_usage_ensure_partitions 보완:
+-- 파티션이 없던 날짜의 행이 DEFAULT 파티션에 들어가 있으면 같은 범위의 파티션 생성이 실패함
+-- (updated partition constraint for default partition would be violated)
+-- → 해당 날짜 행을 임시 테이블로 옮기고 파티션 생성 후 다시 insert (새 파티션으로 라우팅)
+
+CREATE OR REPLACE FUNCTION token_usage_ensure_partitions(p_from DATE, p_days INT)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    d DATE;
+    part_name TEXT;
+    lo TIMESTAMPTZ;
+    hi TIMESTAMPTZ;
+    moved BIGINT;
+    created INT := 0;
+BEGIN
+    -- 여러 인스턴스가 동시에 호출해도 한 번씩만 생성
+    PERFORM pg_advisory_xact_lock(hashtext('token_usage_partitions'));
+    FOR i IN 0..GREATEST(p_days, 1) - 1 LOOP
+        d := p_from + i;
+        part_name := format('token_usage_p%s', to_char(d, 'YYYYMMDD'));
+        IF to_regclass(part_name) IS NULL THEN
+            lo := d::timestamp AT TIME ZONE 'UTC';
+            hi := (d + 1)::timestamp AT TIME ZONE 'UTC';
+
+            CREATE TEMP TABLE IF NOT EXISTS token_usage_default_move (LIKE token_usage) ON COMMIT DROP;
+            WITH moved_rows AS (
+                DELETE FROM token_usage_default
+                WHERE created_at >= lo AND created_at < hi
+                RETURNING *
+            )
+            INSERT INTO token_usage_default_move SELECT * FROM moved_rows;
+            GET DIAGNOSTICS moved = ROW_COUNT;
+
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF token_usage FOR VALUES FROM (%L) TO (%L)',
+                part_name, lo, hi
+            );
+            created := created + 1;
+
+            IF moved > 0 THEN
+                INSERT INTO token_usage SELECT * FROM token_usage_default_move;
+                TRUNCATE token_usage_default_move;
+                RAISE WARNING 'token_usage_default: % rows moved to %', moved, part_name;
+            END IF;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+COMMIT;
@@ -1,6 +1,16 @@
+import os
+import time
+import threading
+from typing import Any, Dict
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-import os
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import get_settings
+
+_settings = get_settings()
+
 
 def get_db_url():
     """
@@ -13,8 +23,67 @@ def get_db_url():
     db = os.environ["POSTGRES_DB"]
     return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}"
 
+
+class _PoolStats:
+    """커넥션 checkout 대기 시간/타임아웃 누적 통계"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+
+    def record(self, wait_sec: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total_sec += wait_sec
+            self.wait_max_sec = max(self.wait_max_sec, wait_sec)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg = self.wait_total_sec / self.checkouts if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "checkout_wait_ms_avg": round(avg * 1000, 3),
+                "checkout_wait_ms_max": round(self.wait_max_sec * 1000, 3),
+            }
+
+
+_pool_stats = _PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool + checkout 대기 시간 측정 (새 커넥션 생성 시간 포함)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            _pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        _pool_stats.record(time.perf_counter() - start, timed_out=False)
+        return conn
+
+
 # 세션 팩토리
-engine = create_engine(get_db_url(), echo=False, future=True)
+engine = create_engine(
+    get_db_url(),
+    echo=False,
+    future=True,
+    poolclass=TimedQueuePool,
+    pool_size=_settings.DB_POOL_SIZE,
+    max_overflow=_settings.DB_MAX_OVERFLOW,
+    pool_timeout=_settings.DB_POOL_TIMEOUT_SEC,
+    pool_recycle=_settings.DB_POOL_RECYCLE_SEC,
+    pool_pre_ping=_settings.DB_POOL_PRE_PING,
+    connect_args={"options": f"-c statement_timeout={_settings.DB_STATEMENT_TIMEOUT_MS}"},
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_session():
@@ -25,4 +94,19 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def pool_status() -> Dict[str, Any]:
+    """
+    커넥션 풀 현황 (사용 중/유휴/overflow + checkout 대기 통계)
+    """
+    pool = engine.pool
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": _settings.DB_MAX_OVERFLOW,
+    }
+    status.update(_pool_stats.snapshot())
+    return status
@@ -0,0 +1,157 @@
+# app/adapters/db_writer.py
+import os
+import time
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.adapters.db import get_session
+
+logger = logging.getLogger("db-writer")
+
+DB_WRITE_BATCH_MAX_ROWS = int(os.getenv("DB_WRITE_BATCH_MAX_ROWS", "500"))
+DB_WRITE_MAX_LATENCY_MS = int(os.getenv("DB_WRITE_MAX_LATENCY_MS", "1000"))
+
+ErrorHandler = Callable[[Optional[str], Exception], None]
+
+
+class FailedWrite(NamedTuple):
+    """항목별 재시도까지 실패한 항목 (flush() 반환값)"""
+    stmt: Any
+    params: Dict[str, Any]
+    trace_id: Optional[str]
+    error: Exception
+
+    @property
+    def table(self) -> Optional[str]:
+        table = getattr(self.stmt, "table", None)
+        return getattr(table, "name", None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """dead-letter 발행용 (JSON 직렬화 안 되는 값은 문자열로)"""
+        return {
+            "table": self.table,
+            "trace_id": self.trace_id,
+            "params": {k: v if isinstance(v, (str, int, float, bool, type(None))) else str(v)
+                       for k, v in self.params.items()},
+            "error": str(self.error),
+        }
+
+
+def _row_of(obj) -> Dict[str, Any]:
+    """ORM 객체 → insert 파라미터 (값이 없는 컬럼은 빼서 컬럼 default가 적용되도록)"""
+    row = {}
+    for col in obj.__table__.columns:
+        val = getattr(obj, col.key, None)
+        if val is not None:
+            row[col.key] = val
+    return row
+
+
+class BatchWriter:
+    """
+    Write-behind 저장소.
+    ORM 행(insert)과 executemany 가능한 문장(update 등)을 모아서 flush() 때 한 트랜잭션으로 저장한다.
+
+    내구성 규칙: flush()가 반환된 뒤에만 해당 행들이 DB에 있다고 볼 수 있으므로,
+    Kafka 오프셋은 반드시 flush() 이후에 커밋해야 한다 (at-least-once).
+    배치 트랜잭션이 실패하면 항목별로 개별 트랜잭션 재시도 후, 그래도 실패하면 on_error(trace_id, e) 호출하고
+    flush()가 실패 항목 목록을 반환 → 호출자가 dead-letter로 보낸 뒤에 커밋해야 행이 유실되지 않음.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = DB_WRITE_BATCH_MAX_ROWS,
+        max_latency_ms: int = DB_WRITE_MAX_LATENCY_MS,
+        on_error: Optional[ErrorHandler] = None,
+    ):
+        self.max_rows = max_rows
+        self.max_latency_sec = max_latency_ms / 1000.0
+        self.on_error = on_error
+        # (statement, params, trace_id) — 추가 순서 유지
+        self._pending: List[Tuple[Any, Dict[str, Any], Optional[str]]] = []
+        self._first_at: Optional[float] = None
+        self._inserts: Dict[str, Any] = {}
+
+    # -----------------------
+    # 적재
+    # -----------------------
+    def add(self, obj, trace_id: Optional[str] = None) -> None:
+        """ORM 객체 1건 insert 예약"""
+        table = obj.__table__
+        stmt = self._inserts.get(table.name)
+        if stmt is None:
+            stmt = self._inserts[table.name] = insert(table)
+        self.execute(stmt, _row_of(obj), trace_id)
+
+    def add_all(self, objs, trace_id: Optional[str] = None) -> None:
+        for obj in objs:
+            self.add(obj, trace_id)
+
+    def execute(self, stmt, params: Dict[str, Any], trace_id: Optional[str] = None) -> None:
+        """임의 문장(예: 카운터 증가 update) 1건 예약. 같은 문장끼리 executemany로 묶인다."""
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._pending.append((stmt, params, trace_id))
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def due(self) -> bool:
+        """max_rows 이상 쌓였거나 가장 오래된 항목이 max_latency를 넘었으면 True"""
+        if not self._pending:
+            return False
+        if len(self._pending) >= self.max_rows:
+            return True
+        return (time.monotonic() - self._first_at) >= self.max_latency_sec
+
+    # -----------------------
+    # flush
+    # -----------------------
+    def flush(self) -> List[FailedWrite]:
+        """예약된 모든 항목을 저장하고, 항목별 재시도까지 실패한 항목을 반환 (전부 저장되면 빈 리스트)"""
+        pending, self._pending, self._first_at = self._pending, [], None
+        if not pending:
+            return []
+
+        try:
+            with get_session() as session:
+                for stmt, params_list in self._group(pending):
+                    session.execute(stmt, params_list)
+                session.commit()
+            return []
+        except Exception:
+            logger.exception("❌ DB 배치 저장 실패 (%d건), 항목별로 재시도", len(pending))
+
+        failed: List[FailedWrite] = []
+        for stmt, params, trace_id in pending:
+            try:
+                with get_session() as session:
+                    session.execute(stmt, [params])
+                    session.commit()
+            except Exception as e:
+                logger.exception("❌ DB 저장 실패 (trace_id=%s)", trace_id)
+                failed.append(FailedWrite(stmt, params, trace_id, e))
+                if self.on_error is not None:
+                    self.on_error(trace_id, e)
+        return failed
+
+    def flush_if_due(self) -> bool:
+        if self.due():
+            self.flush()
+            return True
+        return False
+
+    @staticmethod
+    def _group(pending):
+        """
+        같은 문장 + 같은 파라미터 키 묶음을 executemany 단위로 묶음 (처음 등장한 순서 유지)
+        """
+        groups: Dict[Tuple[int, Tuple[str, ...]], Tuple[Any, List[Dict[str, Any]]]] = {}
+        for stmt, params, _ in pending:
+            key = (id(stmt), tuple(sorted(params)))
+            if key not in groups:
+                groups[key] = (stmt, [])
+            groups[key][1].append(params)
+        return list(groups.values())
@@ -1,15 +1,47 @@
 import os
 import json
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from confluent_kafka import Consumer, Producer, KafkaException
 
 KAFKA_BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "3.35.206.91:29092")
 
-def make_producer(bootstrap: Optional[str] = None) -> Producer:
+# Producer 배치/압축 설정 (produce는 비동기로 쌓이고 librdkafka가 linger 단위로 묶어서 전송)
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "5"))
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", "65536"))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION_TYPE", "lz4")
+KAFKA_FLUSH_TIMEOUT_SEC = float(os.getenv("KAFKA_FLUSH_TIMEOUT_SEC", "10"))
+# flush_all: flush(KAFKA_FLUSH_TIMEOUT_SEC)를 최대 몇 번까지 반복할지
+KAFKA_FLUSH_MAX_ATTEMPTS = int(os.getenv("KAFKA_FLUSH_MAX_ATTEMPTS", "3"))
+
+logger = logging.getLogger("kafka-io")
+
+DeliveryCallback = Callable[[Any, Any], None]
+
+
+def _log_delivery(err, msg) -> None:
+    """기본 delivery callback: 실패만 로그로 남김"""
+    if err is not None:
+        logger.error("❌ Kafka 전송 실패 topic=%s key=%s: %s", msg.topic(), msg.key(), err)
+
+
+def make_producer(
+    bootstrap: Optional[str] = None,
+    extra_config: Optional[Dict[str, Any]] = None,
+) -> Producer:
     """
-    Kafka Producer 생성
+    Kafka Producer 생성 (linger/batch/압축 설정 포함)
     """
-    return Producer({"bootstrap.servers": bootstrap or KAFKA_BOOTSTRAP})
+    cfg = {
+        "bootstrap.servers": bootstrap or KAFKA_BOOTSTRAP,
+        "linger.ms": KAFKA_LINGER_MS,
+        "batch.size": KAFKA_BATCH_SIZE,
+        "compression.type": KAFKA_COMPRESSION,
+        "enable.idempotence": True,
+    }
+    if extra_config:
+        cfg.update(extra_config)
+    return Producer(cfg)
 
 def make_consumer(
     topics: Iterable[str],
@@ -37,31 +69,62 @@ def publish(
     key: Optional[str] = None,
     value: Optional[Dict[str, Any]] = None,
     headers: Optional[List[Tuple[str, bytes]]] = None,
+    on_delivery: Optional[DeliveryCallback] = None,
 ) -> None:
     """
     Kafka 메시지 발행 (key, value, headers 지원)
+    produce 후 flush 하지 않고 poll(0)으로 delivery callback만 처리한다.
+    전송 완료 보장이 필요한 시점(스트림 완료, 배치 커밋, 종료)에는 flush()를 호출할 것.
     """
     payload = json.dumps(value or {}, ensure_ascii=False).encode("utf-8")
+    kwargs = dict(
+        key=(key.encode() if isinstance(key, str) else key),
+        value=payload,
+        headers=headers,
+        on_delivery=on_delivery or _log_delivery,
+    )
     try:
-        producer.produce(
-            topic,
-            key=(key.encode() if isinstance(key, str) else key),
-            value=payload,
-            headers=headers,
-        )
-        producer.flush(1.0)
+        producer.produce(topic, **kwargs)
     except BufferError:
-        # 버퍼 꽉 찼으면 flush 후 재시도
-        producer.poll(0)
-        producer.produce(
-            topic,
-            key=(key.encode() if isinstance(key, str) else key),
-            value=payload,
-            headers=headers,
-        )
-        producer.flush(1.0)
+        # 로컬 큐가 꽉 찼으면 전송이 빠질 때까지 기다린 후 재시도
+        producer.poll(1.0)
+        producer.produce(topic, **kwargs)
     except KafkaException as e:
         raise e
+    producer.poll(0)
+
+
+def poll_producer(producer: Producer) -> int:
+    """
+    대기 중인 delivery callback 처리 (idle 루프에서 주기적으로 호출)
+    """
+    return producer.poll(0)
+
+
+def flush_producer(producer: Producer, timeout: Optional[float] = None) -> int:
+    """
+    큐에 남은 메시지 전송 완료까지 대기. 남은 메시지 수를 반환.
+    """
+    remaining = producer.flush(KAFKA_FLUSH_TIMEOUT_SEC if timeout is None else timeout)
+    if remaining:
+        logger.warning("⚠️ Kafka flush 타임아웃, 미전송 메시지 %d건", remaining)
+    return remaining
+
+
+def flush_all(producer: Producer, max_attempts: Optional[int] = None) -> None:
+    """
+    큐가 빌 때까지 flush 반복, max_attempts번 안에 못 비우면 KafkaException.
+    브로커에 닿지 않는 동안 무한 대기하지 않고, 호출자가 오프셋 커밋 없이 종료 → 재시작 후 배치 재처리.
+    """
+    attempts = KAFKA_FLUSH_MAX_ATTEMPTS if max_attempts is None else max_attempts
+    remaining = 0
+    for _ in range(max(attempts, 1)):
+        remaining = flush_producer(producer)
+        if not remaining:
+            return
+    logger.error("❌ Kafka flush %d회 실패, 미전송 메시지 %d건", attempts, remaining)
+    raise KafkaException(f"Kafka flush failed: {remaining} messages still queued")
+
 
 def read_headers(msg) -> Dict[str, bytes]:
     hdrs = {}
@@ -1,42 +1,220 @@
 import os
 import json
 import redis
-from typing import Optional
+import redis.asyncio as aioredis
+from typing import Dict, Iterable, List, Optional
 # 환경 변수 기반 설정
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_TTL_SEC = int(os.getenv("REDIS_TTL_SEC", "3600"))  # 기본 1시간 TTL
+HISTORY_MAX_TURNS = int(os.getenv("REDIS_HISTORY_MAX_TURNS", "5"))
 
 r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+_ar: Optional[aioredis.StrictRedis] = None
+_br: Optional[redis.StrictRedis] = None
 
 
-def append_conversation(room_id: str, role: str, content: str, max_turns: int = 5):
+def get_binary_redis() -> redis.StrictRedis:
+    """바이너리 값(임베딩 벡터 등)용 클라이언트 (decode_responses=False, 지연 생성)"""
+    global _br
+    if _br is None:
+        _br = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    return _br
+
+
+def get_async_redis() -> aioredis.StrictRedis:
+    """async 엔드포인트용 Redis 클라이언트 (지연 생성)"""
+    global _ar
+    if _ar is None:
+        _ar = aioredis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    return _ar
+
+
+async def close_async_redis():
+    global _ar
+    if _ar is not None:
+        await _ar.close()
+        _ar = None
+
+
+# -----------------------
+# 대화 히스토리 (Redis list)
+#   chat:{room_id}:messages → [json({"role","content"}), ...]
+#   append: RPUSH + LTRIM + EXPIRE 를 MULTI 한 번으로 (원자적, O(추가 건수))
+#   read:   LRANGE -limit -1
+#   예전 JSON blob(string) 키는 WRONGTYPE 오류가 날 때만 list로 변환
+# -----------------------
+def _history_key(room_id: str) -> str:
+    return f"chat:{room_id}:messages"
+
+
+def _encode_entries(messages: Iterable[Dict[str, str]]) -> List[str]:
+    return [
+        json.dumps({"role": m["role"], "content": m["content"]}, ensure_ascii=False)
+        for m in messages
+        if m.get("content")
+    ]
+
+
+def _decode_entries(raw: List[str]) -> List[Dict[str, str]]:
+    history = []
+    for item in raw:
+        try:
+            history.append(json.loads(item))
+        except (TypeError, ValueError):
+            continue
+    return history
+
+
+def _is_wrongtype(e: Exception) -> bool:
+    # 파이프라인 오류는 "Command # 1 (...) of pipeline caused error: WRONGTYPE ..." 형태
+    return isinstance(e, redis.ResponseError) and "WRONGTYPE" in str(e)
+
+
+def _migrate_blob(key: str) -> None:
+    """예전 blob(string) 키를 같은 내용의 list로 변환 (WATCH로 동시 변환 방지)"""
+    with r.pipeline(transaction=True) as pipe:
+        try:
+            pipe.watch(key)
+            if pipe.type(key) != "string":
+                return
+            blob = pipe.get(key)
+            ttl = pipe.ttl(key)
+            entries = _encode_entries(json.loads(blob) if blob else [])
+            pipe.multi()
+            pipe.delete(key)
+            if entries:
+                pipe.rpush(key, *entries)
+                pipe.expire(key, ttl if ttl and ttl > 0 else REDIS_TTL_SEC)
+            pipe.execute()
+        except redis.WatchError:
+            # 다른 writer가 먼저 변환함
+            pass
+
+
+def append_messages(room_id: str, messages: List[Dict[str, str]], max_turns: int = HISTORY_MAX_TURNS):
     """
-    Redis에 대화 저장 (최근 max_turns 유지)
-    기존 구조(chat:{room_id}:messages)를 유지하면서 user/assistant 모두 append.
+    여러 메시지를 한 번의 round trip으로 추가
+    최근 max_turns * 2개 메시지만 유지 (user+assistant 쌍)
     """
-    key = f"chat:{room_id}:messages"
-    history_json = r.get(key)
-    if history_json:
-        history = json.loads(history_json)
-    else:
-        history = []
+    entries = _encode_entries(messages)
+    if not entries:
+        return
+    key = _history_key(room_id)
+
+    def _write():
+        with r.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *entries)
+            pipe.ltrim(key, -max_turns * 2, -1)
+            pipe.expire(key, REDIS_TTL_SEC)
+            pipe.execute()
 
-    # 새 대화 추가
-    if content:
-        history.append({"role": role, "content": content})
+    try:
+        _write()
+    except redis.ResponseError as e:
+        if not _is_wrongtype(e):
+            raise
+        _migrate_blob(key)
+        _write()
 
-    # 최근 max_turns * 2개 메시지만 유지 (user+assistant 쌍)
-    if len(history) > max_turns * 2:
-        history = history[-max_turns * 2:]
 
-    # TTL 포함 저장
-    r.setex(key, REDIS_TTL_SEC, json.dumps(history, ensure_ascii=False))
+def append_turn(room_id: str, user_content: str, assistant_content: str, max_turns: int = HISTORY_MAX_TURNS):
+    """user/assistant 한 턴을 한 번에 저장"""
+    append_messages(
+        room_id,
+        [{"role": "user", "content": user_content}, {"role": "assistant", "content": assistant_content}],
+        max_turns,
+    )
+
+
+def append_conversation(room_id: str, role: str, content: str, max_turns: int = HISTORY_MAX_TURNS):
+    """
+    Redis에 대화 저장 (최근 max_turns 유지)
+    한 턴을 저장할 때는 append_turn 사용 (round trip 1회)
+    """
+    append_messages(room_id, [{"role": role, "content": content}], max_turns)
 
 
 def get_conversation(room_id: str, limit: Optional[int] = None):
-    key = f"chat:{room_id}:messages"
-    history_json = r.get(key)
-    history = json.loads(history_json) if history_json else []
-    return history[-limit:] if (limit and limit > 0) else history
\ No newline at end of file
+    """최근 limit개 메시지 (limit 없으면 전체)"""
+    key = _history_key(room_id)
+    start = -limit if (limit and limit > 0) else 0
+    try:
+        raw = r.lrange(key, start, -1)
+    except redis.ResponseError as e:
+        if not _is_wrongtype(e):
+            raise
+        _migrate_blob(key)
+        raw = r.lrange(key, start, -1)
+    return _decode_entries(raw)
+
+
+# -----------------------
+# async 버전 (동일한 list 포맷)
+# -----------------------
+async def _migrate_blob_async(key: str) -> None:
+    async with get_async_redis().pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            if await pipe.type(key) != "string":
+                return
+            blob = await pipe.get(key)
+            ttl = await pipe.ttl(key)
+            entries = _encode_entries(json.loads(blob) if blob else [])
+            pipe.multi()
+            pipe.delete(key)
+            if entries:
+                pipe.rpush(key, *entries)
+                pipe.expire(key, ttl if ttl and ttl > 0 else REDIS_TTL_SEC)
+            await pipe.execute()
+        except redis.WatchError:
+            pass
+
+
+async def append_messages_async(room_id: str, messages: List[Dict[str, str]], max_turns: int = HISTORY_MAX_TURNS):
+    entries = _encode_entries(messages)
+    if not entries:
+        return
+    key = _history_key(room_id)
+
+    async def _write():
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *entries)
+            pipe.ltrim(key, -max_turns * 2, -1)
+            pipe.expire(key, REDIS_TTL_SEC)
+            await pipe.execute()
+
+    try:
+        await _write()
+    except redis.ResponseError as e:
+        if not _is_wrongtype(e):
+            raise
+        await _migrate_blob_async(key)
+        await _write()
+
+
+async def append_turn_async(room_id: str, user_content: str, assistant_content: str, max_turns: int = HISTORY_MAX_TURNS):
+    await append_messages_async(
+        room_id,
+        [{"role": "user", "content": user_content}, {"role": "assistant", "content": assistant_content}],
+        max_turns,
+    )
+
+
+async def append_conversation_async(room_id: str, role: str, content: str, max_turns: int = HISTORY_MAX_TURNS):
+    await append_messages_async(room_id, [{"role": role, "content": content}], max_turns)
+
+
+async def get_conversation_async(room_id: str, limit: Optional[int] = None):
+    ar = get_async_redis()
+    key = _history_key(room_id)
+    start = -limit if (limit and limit > 0) else 0
+    try:
+        raw = await ar.lrange(key, start, -1)
+    except redis.ResponseError as e:
+        if not _is_wrongtype(e):
+            raise
+        await _migrate_blob_async(key)
+        raw = await ar.lrange(key, start, -1)
+    return _decode_entries(raw)
@@ -0,0 +1,52 @@
+# app/contracts/token_usage_event.py
+from dataclasses import dataclass, asdict
+from datetime import timezone
+from typing import Any, Dict, Optional
+
+
+def _to_float(v) -> float:
+    return float(v) if v is not None else 0.0
+
+
+@dataclass
+class TokenUsageEvent:
+    """
+    token_usage 행 1건을 Kafka로 발행하는 계약 스키마.
+    Spark 스트리밍 집계(stream_token_usage_aggregation.py)가 소비한다.
+    event_id = token_usage.id (재발행 시 중복 제거 키)
+    """
+
+    event_id: str                 # token_usage.id (UUID)
+    user_id: Optional[str]        # 사용자 ID (대시보드 집계 키, 문자열)
+    message_id: Optional[str]     # 메시지 ID
+    source: str                   # "filter" | "llm"
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    cost_usd: float
+    saved_tokens: int
+    saved_cost_usd: float
+    created_at: int               # epoch milliseconds (UTC)
+    schema_version: str = "1.0.0"
+
+    @classmethod
+    def from_row(cls, tu, source: str) -> "TokenUsageEvent":
+        created_at = tu.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return cls(
+            event_id=str(tu.id),
+            user_id=str(tu.user_id) if tu.user_id is not None else None,
+            message_id=str(tu.message_id) if tu.message_id is not None else None,
+            source=source,
+            prompt_tokens=tu.prompt_tokens or 0,
+            completion_tokens=tu.completion_tokens or 0,
+            total_tokens=tu.total_tokens or 0,
+            cost_usd=_to_float(tu.cost_usd),
+            saved_tokens=tu.saved_tokens or 0,
+            saved_cost_usd=_to_float(tu.saved_cost_usd),
+            created_at=int(created_at.timestamp() * 1000),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
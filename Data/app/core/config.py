@@ -18,8 +18,22 @@ class Settings(BaseSettings):
     KAFKA_TOPIC_IN_LLM: str = "chat.filter.result.v1"
     KAFKA_TOPIC_OUT_LLM_DELTA: str = "chat.llm.answer.delta.v1"
     KAFKA_TOPIC_OUT_LLM_DONE: str = "chat.llm.answer.done.v1"
+    KAFKA_TOPIC_TOKEN_USAGE: str = "chat.token.usage.v1"
+    KAFKA_TOPIC_DB_DLQ: str = "chat.db.dlq.v1"
 
     FILTER_MODEL_PATH: str = Field("/app/models/filter", env="FILTER_MODEL_PATH")
+    # fp32 (기본) | int8 (torch dynamic quantization) | onnx (onnxruntime 필요, FILTER_ONNX_PATH)
+    FILTER_BACKEND: str = Field("fp32", env="FILTER_BACKEND")
+    FILTER_ONNX_PATH: Optional[str] = Field(default=None, env="FILTER_ONNX_PATH")
+    # 필터 모델 동적 배칭 (최대 배치 크기 / 첫 요청 후 최대 대기 / 추론 스레드 torch 스레드 수, 0이면 기본값)
+    FILTER_SCHED_MAX_BATCH: int = Field(64, env="FILTER_SCHED_MAX_BATCH")
+    FILTER_SCHED_MAX_WAIT_MS: float = Field(5.0, env="FILTER_SCHED_MAX_WAIT_MS")
+    FILTER_SCHED_TIMEOUT_SEC: float = Field(30.0, env="FILTER_SCHED_TIMEOUT_SEC")
+    FILTER_TORCH_THREADS: int = Field(0, env="FILTER_TORCH_THREADS")
+    # 분류 결과 캐시 ((모델 버전, 텍스트) LRU, 짧은 prefix만 저장)
+    FILTER_CACHE_SIZE: int = Field(50000, env="FILTER_CACHE_SIZE")
+    FILTER_CACHE_MAX_CHARS: int = Field(64, env="FILTER_CACHE_MAX_CHARS")
+    FILTER_MODEL_VERSION: Optional[str] = Field(default=None, env="FILTER_MODEL_VERSION")
     
     # Elasticsearch
     ELASTICSEARCH_URL: str = Field("http://elasticsearch:9200", env="ELASTICSEARCH_URL")
@@ -28,6 +42,15 @@ class Settings(BaseSettings):
     # Embedding
     EMBED_MODEL_PATH: str = Field("/app/models/embedding", env="EMBED_MODEL_PATH")
     EMBED_DIMS: int = Field(768, env="EMBED_DIMS")
+    # torch | int8 (dynamic quantization) | onnx (onnxruntime 필요)
+    EMBED_BACKEND: str = Field("torch", env="EMBED_BACKEND")
+    EMBED_ONNX_PATH: Optional[str] = Field(default=None, env="EMBED_ONNX_PATH")
+    EMBED_BATCH_SIZE: int = Field(32, env="EMBED_BATCH_SIZE")
+    # 쿼리 임베딩 캐시 (프로세스 LRU + 선택적 Redis 2차 캐시, float16 저장)
+    EMBED_CACHE_SIZE: int = Field(4096, env="EMBED_CACHE_SIZE")
+    EMBED_CACHE_MAX_CHARS: int = Field(1000, env="EMBED_CACHE_MAX_CHARS")
+    EMBED_CACHE_REDIS_ENABLED: bool = Field(False, env="EMBED_CACHE_REDIS_ENABLED")
+    EMBED_CACHE_REDIS_TTL_SEC: int = Field(86400, env="EMBED_CACHE_REDIS_TTL_SEC")
 
     # GPT
     GMS_API_URL: str = Field(..., env="GMS_API_URL")
@@ -47,6 +70,14 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = Field("password", env="POSTGRES_PASSWORD")
     POSTGRES_DB: str = Field("postgres", env="POSTGRES_DB")
 
+    # SQLAlchemy 커넥션 풀
+    DB_POOL_SIZE: int = Field(10, env="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(20, env="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT_SEC: float = Field(10.0, env="DB_POOL_TIMEOUT_SEC")
+    DB_POOL_RECYCLE_SEC: int = Field(1800, env="DB_POOL_RECYCLE_SEC")
+    DB_POOL_PRE_PING: bool = Field(True, env="DB_POOL_PRE_PING")
+    DB_STATEMENT_TIMEOUT_MS: int = Field(30000, env="DB_STATEMENT_TIMEOUT_MS")
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,16 +1,38 @@
+import time
+_IMPORT_START = time.perf_counter()
+
+import os
+import logging
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
 from app.utils.es import get_es, wait_for_es, es_health, close_es
+from app.adapters.db import pool_status
 from app.routers.filter_router import router as filter_router
 from app.routers.embed import router as embed_router
 from app.routers.summarize_router import router as summarize_router
 from app.services.embed_service import store_text
 from app.routers import debug_filter 
 from app.routers import chat_router
+from app.services.filter_service import close_filter_log_indexer
+from app.services.chat_service import close_async_clients, close_usage_producer
+from app.services import model_registry
 
 load_dotenv()
 
+logger = logging.getLogger("main")
+
+# 모델은 첫 사용 시 로드, 미리 로드할 모델은 MODEL_WARMUP="filter,embedding" (또는 "all")
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "")
+# app.main import 시간 예산 (초과 시 경고 — 무거운 import가 다시 들어왔는지 확인용)
+APP_IMPORT_BUDGET_SEC = float(os.getenv("APP_IMPORT_BUDGET_SEC", "5.0"))
+IMPORT_SEC = time.perf_counter() - _IMPORT_START
+if IMPORT_SEC > APP_IMPORT_BUDGET_SEC:
+    logger.warning("⚠️ app.main import %.2fs (예산 %.1fs 초과)", IMPORT_SEC, APP_IMPORT_BUDGET_SEC)
+else:
+    logger.info("⏱️ app.main import %.2fs", IMPORT_SEC)
+
 app = FastAPI(
     title="SETA ML API",
     description="ML API for SETA",
@@ -24,10 +46,18 @@ app.include_router(chat_router.router)
 def on_startup():
     get_es()
     wait_for_es(timeout_sec=10)
+    # 포트는 바로 열고 모델은 백그라운드에서 로드 (/health/ready로 완료 확인)
+    model_registry.warm_up_in_background(model_registry.parse_names(MODEL_WARMUP))
 
 @app.on_event("shutdown")
 def on_shutdown():
+    close_filter_log_indexer()
     close_es()
+    close_usage_producer()
+
+@app.on_event("shutdown")
+async def on_shutdown_async():
+    await close_async_clients()
 
 app.include_router(filter_router)
 app.include_router(embed_router)
@@ -48,4 +78,14 @@ def health_check():
         "es_version": es.get("version"),
         "api_version": "1.0.0",
         "error": es.get("error"),
-    }
\ No newline at end of file
+    }
+
+@app.get("/health/db-pool")
+def db_pool_health():
+    return pool_status()
+
+@app.get("/health/ready")
+def readiness():
+    status = model_registry.readiness()
+    status["import_sec"] = round(IMPORT_SEC, 3)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
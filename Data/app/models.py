@@ -108,7 +108,8 @@ class TokenUsage(Base):
     saved_cost_usd = Column(Numeric(14, 6))
     saved_energy_wh = Column(Numeric(14, 6))
     saved_co2_g = Column(Numeric(14, 6))
-    created_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+    # created_at 기준 일 단위 파티션 (V2 마이그레이션) → PK = (id, created_at)
+    created_at = Column(TIMESTAMP, primary_key=True, nullable=False, default=datetime.utcnow)
 
 
 class FilterResult(Base):
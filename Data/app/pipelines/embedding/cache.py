@@ -0,0 +1,145 @@
+# app/pipelines/embedding/cache.py
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.adapters.redis_io import get_binary_redis
+from app.pipelines.embedding.model import get_provider
+
+logger = logging.getLogger("embedding-cache")
+
+_settings = get_settings()
+_WS = re.compile(r"\s+")
+
+Encoder = Callable[[str], List[float]]
+
+
+def normalize_text(text: str) -> str:
+    """캐시 키용 정규화 (NFC + 앞뒤 공백 제거 + 연속 공백 1칸)"""
+    return _WS.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+class EmbeddingCache:
+    """
+    정규화된 텍스트 해시 → 임베딩 벡터 캐시
+    - 1차: 프로세스 내 LRU
+    - 2차(선택): Redis, float16 바이트로 저장 (768차원 기준 1.5KB)
+    namespace에 모델 경로를 넣어 모델이 바뀌면 키가 달라지도록 함 (callable이면 키를 만들 때마다 호출)
+    """
+
+    def __init__(
+        self,
+        namespace: Union[str, Callable[[], str]],
+        maxsize: int = _settings.EMBED_CACHE_SIZE,
+        max_chars: int = _settings.EMBED_CACHE_MAX_CHARS,
+        use_redis: bool = _settings.EMBED_CACHE_REDIS_ENABLED,
+        redis_ttl_sec: int = _settings.EMBED_CACHE_REDIS_TTL_SEC,
+    ):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.max_chars = max_chars
+        self.use_redis = use_redis
+        self.redis_ttl_sec = redis_ttl_sec
+
+        self._data: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def key(self, normalized: str) -> str:
+        namespace = self.namespace() if callable(self.namespace) else self.namespace
+        digest = hashlib.sha1(f"{namespace}\0{normalized}".encode("utf-8")).hexdigest()
+        return f"emb:{digest}"
+
+    # -----------------------
+    # 조회 / 저장
+    # -----------------------
+    def get_or_compute(self, text: str, encode: Encoder) -> List[float]:
+        """
+        캐시에 있으면 반환, 없으면 원문으로 encode 후 저장.
+        키만 정규화된 텍스트 기준 (encode 입력을 바꾸면 캐시 미스에서도 벡터가 달라짐)
+        """
+        normalized = normalize_text(text)
+        if self.maxsize <= 0 or len(normalized) > self.max_chars:
+            return encode(text)
+
+        key = self.key(normalized)
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return list(vec)
+
+        vec = self._redis_get(key)
+        if vec is not None:
+            with self._lock:
+                self.redis_hits += 1
+            self._put_local(key, vec)
+            return list(vec)
+
+        with self._lock:
+            self.misses += 1
+        vec = list(encode(text))
+        self._put_local(key, vec)
+        self._redis_set(key, vec)
+        return list(vec)
+
+    def _put_local(self, key: str, vec: List[float]) -> None:
+        with self._lock:
+            self._data[key] = vec
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    # Redis는 best-effort: 장애 시 로컬 캐시/모델로 진행
+    def _redis_get(self, key: str) -> Optional[List[float]]:
+        if not self.use_redis:
+            return None
+        try:
+            raw = get_binary_redis().get(key)
+        except Exception as e:
+            logger.warning("⚠️ 임베딩 Redis 캐시 조회 실패: %s", e)
+            return None
+        if not raw:
+            return None
+        return np.frombuffer(raw, dtype=np.float16).astype(np.float32).tolist()
+
+    def _redis_set(self, key: str, vec: List[float]) -> None:
+        if not self.use_redis:
+            return
+        try:
+            get_binary_redis().setex(key, self.redis_ttl_sec, np.asarray(vec, dtype=np.float16).tobytes())
+        except Exception as e:
+            logger.warning("⚠️ 임베딩 Redis 캐시 저장 실패: %s", e)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+            }
+
+
+# EMBED_MODEL_PATH 모델을 쓰는 모든 호출부(embed_service, prompt_builder, chat_service) 공용
+# 백엔드(int8/onnx)마다 벡터가 조금씩 달라서 namespace에 포함
+# 설정값(EMBED_BACKEND)이 아니라 provider가 실제로 로드한 백엔드 기준 (onnx 로드 실패 시 torch)
+_query_cache = EmbeddingCache(namespace=lambda: get_provider().cache_namespace)
+
+
+def cached_embedding(text: str, encode: Encoder) -> List[float]:
+    return _query_cache.get_or_compute(text, encode)
+
+
+def cache_stats() -> Dict[str, int]:
+    return _query_cache.stats()
@@ -1,11 +1,12 @@
 # app/pipelines/embedding/model.py
-import math, hashlib
-from sentence_transformers import SentenceTransformer
+import os, json, math, hashlib, threading
 from app.core.config import get_settings
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 _settings = get_settings()
-_model: Optional[SentenceTransformer] = None
 
 
 def _fallback_hash_embedding(text: str) -> list[float]:
@@ -21,24 +22,179 @@ def _fallback_hash_embedding(text: str) -> list[float]:
     return [v / norm for v in vec]
 
 
-def get_model() -> Optional[SentenceTransformer]:
-    global _model
-    if _model is None:
-        try:
-            _model = SentenceTransformer(_settings.EMBED_MODEL_PATH)
-            print(f"[embedding.model] Loaded model from {_settings.EMBED_MODEL_PATH}")
-        except Exception as e:
-            print(f"[embedding.model] fallback (reason: {e})")
-            _model = None
-    return _model
+# -----------------------
+# 백엔드
+#   torch : SentenceTransformer 그대로 (기본)
+#   int8  : SentenceTransformer + torch dynamic quantization (nn.Linear → qint8)
+#   onnx  : onnxruntime + 토크나이저, 풀링/정규화는 모델 폴더 설정을 따름
+#           (EMBED_ONNX_PATH에 양자화된 .onnx를 지정하면 int8 ONNX)
+# -----------------------
+class _TorchBackend:
+    def __init__(self, model_path: str, quantize: bool = False):
+        # 무거운 import는 실제 로드 시점에 (서버 기동 시간 단축)
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_path, device="cpu")
+        if quantize:
+            import torch
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def encode(self, texts: List[str], batch_size: int, normalize: bool):
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize,
+            show_progress_bar=False,
+        )
+
+
+class _OnnxBackend:
+    def __init__(self, model_path: str, onnx_path: str):
+        import numpy as np
+        import onnxruntime as ort  # 선택 의존성
+        from transformers import AutoTokenizer
+
+        self._np = np
+        modules = self._read_json(os.path.join(model_path, "modules.json")) or []
+        types = [m.get("type", "") for m in modules]
+        unsupported = [t for t in types if not t.endswith(("Transformer", "Pooling", "Normalize"))]
+        if unsupported:
+            raise RuntimeError(f"ONNX 백엔드가 지원하지 않는 모듈: {unsupported}")
+        self.model_normalizes = any(t.endswith("Normalize") for t in types)
+
+        pooling = self._read_json(os.path.join(model_path, "1_Pooling", "config.json")) or {}
+        if pooling.get("pooling_mode_cls_token"):
+            self.pooling = "cls"
+        elif pooling.get("pooling_mode_max_tokens"):
+            self.pooling = "max"
+        else:
+            self.pooling = "mean"
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        st_cfg = self._read_json(os.path.join(model_path, "sentence_bert_config.json")) or {}
+        self.max_length = st_cfg.get("max_seq_length") or 512
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _read_json(path: str):
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def encode(self, texts: List[str], batch_size: int, normalize: bool):
+        np = self._np
+        out = []
+        for i in range(0, len(texts), batch_size):
+            enc = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+            mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+            if self.pooling == "cls":
+                emb = hidden[:, 0]
+            elif self.pooling == "max":
+                emb = np.where(mask > 0, hidden, -1e9).max(axis=1)
+            else:
+                emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize or self.model_normalizes:
+                emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            out.append(emb)
+        return np.concatenate(out, axis=0)
+
+
+class EmbeddingProvider:
+    """
+    프로세스 공용 임베딩 모델 (EMBED_MODEL_PATH)
+    - 처음 encode 시점에 1회만 로드 (스레드 안전)
+    - EMBED_BACKEND로 torch / int8 / onnx 선택, onnx 로드 실패 시 torch로 대체
+    """
+
+    def __init__(self, model_path: str, backend: str = "torch", onnx_path: Optional[str] = None,
+                 batch_size: int = 32):
+        self.model_path = model_path
+        self.backend = backend
+        self.onnx_path = onnx_path or os.path.join(model_path, "onnx", "model.onnx")
+        self.batch_size = batch_size
+        self._impl = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._impl is not None
+
+    def load(self):
+        if self._impl is not None:
+            return self._impl
+        with self._lock:
+            if self._impl is None:
+                self._impl = self._create()
+                print(f"[embedding.model] Loaded model from {self.model_path} (backend={self.backend})")
+        return self._impl
+
+    def _create(self):
+        if self.backend == "onnx":
+            try:
+                return _OnnxBackend(self.model_path, self.onnx_path)
+            except Exception as e:
+                print(f"[embedding.model] onnx backend unavailable, using torch (reason: {e})")
+                self.backend = "torch"
+        return _TorchBackend(self.model_path, quantize=(self.backend == "int8"))
+
+    @property
+    def cache_namespace(self) -> str:
+        """임베딩 캐시 namespace: 로드 후 실제 백엔드 기준 (onnx → torch 대체 시 onnx 키와 섞이지 않도록)"""
+        self.load()
+        return f"{self.model_path}:{self.backend}"
+
+    def encode_many(self, texts: Sequence[str], normalize: bool = False,
+                    batch_size: Optional[int] = None) -> List[List[float]]:
+        if not texts:
+            return []
+        embs = self.load().encode(list(texts), batch_size or self.batch_size, normalize)
+        return embs.tolist()
+
+    def encode(self, text: str, normalize: bool = False) -> List[float]:
+        return self.encode_many([text], normalize=normalize)[0]
+
+
+_provider = EmbeddingProvider(
+    _settings.EMBED_MODEL_PATH,
+    backend=_settings.EMBED_BACKEND,
+    onnx_path=_settings.EMBED_ONNX_PATH,
+    batch_size=_settings.EMBED_BATCH_SIZE,
+)
+
+
+def get_provider() -> EmbeddingProvider:
+    return _provider
+
+
+def get_model() -> Optional["SentenceTransformer"]:
+    """torch 계열 백엔드의 SentenceTransformer (없거나 로드 실패 시 None)"""
+    try:
+        impl = _provider.load()
+    except Exception as e:
+        print(f"[embedding.model] fallback (reason: {e})")
+        return None
+    return getattr(impl, "model", None)
+
 
 def get_embedding(text: str) -> list[float]:
-    m = get_model()
-    if m is None:
+    try:
+        return _provider.encode(text, normalize=True)
+    except Exception as e:
+        print(f"[embedding.model] fallback (reason: {e})")
         return _fallback_hash_embedding(text)
-    emb = m.encode(
-        [text],
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    )[0]
-    return emb.tolist()
\ No newline at end of file
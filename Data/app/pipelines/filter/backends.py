@@ -0,0 +1,108 @@
+# app/pipelines/filter/backends.py
+import os
+from typing import Dict, List, Optional, Tuple
+
+Result = Tuple[str, Dict[str, float]]
+
+MAX_LENGTH = 128
+
+
+class TorchFilterBackend:
+    """
+    PyTorch 백엔드
+    - fp32: 기존 AutoModelForSequenceClassification 그대로
+    - int8: nn.Linear를 dynamic quantization (CPU 전용, 정확도 차이는 benchmark로 확인)
+    """
+
+    def __init__(self, model_path: str, quantize: bool = False):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        self.name = "int8" if quantize else "fp32"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        model = AutoModelForSequenceClassification.from_pretrained(model_path, local_files_only=True)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.id2label = model.config.id2label
+
+    def classify(self, texts: List[str], batch_size: int = 64) -> List[Result]:
+        from app.pipelines.filter.filter_classifier import classify_batch
+        return classify_batch(texts, self.model, self.tokenizer, batch_size=batch_size)
+
+
+class OnnxFilterBackend:
+    """ONNX Runtime 백엔드 (onnxruntime 선택 의존성, export_onnx로 만든 모델 사용)"""
+
+    def __init__(self, model_path: str, onnx_path: str, num_threads: int = 0):
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.name = "onnx"
+        self._np = np
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.id2label = AutoConfig.from_pretrained(model_path, local_files_only=True).id2label
+        self.model = None
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            opts.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def classify(self, texts: List[str], batch_size: int = 64) -> List[Result]:
+        np = self._np
+        results: List[Result] = []
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            enc = self.tokenizer(chunk, return_tensors="np", truncation=True, max_length=MAX_LENGTH, padding=True)
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            logits = self.session.run(None, feeds)[0]
+            logits = logits - logits.max(axis=-1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=-1, keepdims=True)
+            for row in probs:
+                pred_idx = int(row.argmax())
+                prob_dict = {self.id2label[i]: float(p) for i, p in enumerate(row)}
+                results.append((self.id2label[pred_idx], prob_dict))
+        return results
+
+
+def export_onnx(model_path: str, onnx_path: str, opset: int = 14) -> str:
+    """fp32 모델을 ONNX로 export (batch/seq 길이 동적)"""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path, local_files_only=True)
+    model.eval()
+
+    sample = tokenizer(["안녕하세요", "오늘 일정 알려줘"], return_tensors="pt", padding=True)
+    names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    dynamic_axes = {k: {0: "batch", 1: "seq"} for k in names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[k] for k in names),
+            onnx_path,
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    return onnx_path
+
+
+def create_backend(kind: str, model_path: str, onnx_path: Optional[str] = None, num_threads: int = 0):
+    """kind: fp32 | int8 | onnx"""
+    if kind == "onnx":
+        return OnnxFilterBackend(model_path, onnx_path or os.path.join(model_path, "model.onnx"), num_threads)
+    if kind in ("fp32", "int8"):
+        return TorchFilterBackend(model_path, quantize=(kind == "int8"))
+    raise ValueError(f"unknown filter backend: {kind}")
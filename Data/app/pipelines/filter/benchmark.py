@@ -0,0 +1,137 @@
+# app/pipelines/filter/benchmark.py
+"""
+필터 백엔드 정확도 parity + 지연시간 벤치마크
+
+    python -m app.pipelines.filter.benchmark --sample labeled.jsonl --backends fp32,int8,onnx
+
+sample: 한 줄에 {"text": "...", "label": "greeting"} (label 없으면 정확도는 생략)
+fp32(현재 모델)를 기준으로 라벨 일치율 / 확률 최대 차이 / 최종 drop·pass 판단 일치율을 비교하고,
+배치 크기별 p50/p95 지연시간과 처리량을 출력한다.
+일치율이 --min-agreement 미만인 백엔드가 있으면 exit code 1.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Dict, List, Optional
+
+from app.core.config import get_settings
+from app.pipelines.filter.backends import create_backend, export_onnx
+from app.pipelines.filter.filter_classifier import filter_classifier_batch
+
+
+def load_sample(path: str, limit: Optional[int] = None):
+    texts: List[str] = []
+    labels: List[Optional[str]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            texts.append(row["text"])
+            labels.append(row.get("label"))
+            if limit and len(texts) >= limit:
+                break
+    return texts, labels
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def measure_latency(backend, texts: List[str], batch_size: int, repeat: int) -> Dict[str, float]:
+    backend.classify(texts[:batch_size], batch_size=batch_size)  # warm-up
+    times: List[float] = []
+    n = 0
+    for _ in range(repeat):
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            t0 = time.perf_counter()
+            backend.classify(chunk, batch_size=batch_size)
+            times.append((time.perf_counter() - t0) * 1000.0)
+            n += len(chunk)
+    total_sec = sum(times) / 1000.0
+    return {
+        "batch_size": batch_size,
+        "p50_ms": round(statistics.median(times), 2),
+        "p95_ms": round(_percentile(times, 95), 2),
+        "msgs_per_sec": round(n / total_sec, 1) if total_sec else 0.0,
+    }
+
+
+def compare(reference, candidate, texts: List[str], labels: List[Optional[str]]) -> Dict[str, float]:
+    ref = reference.classify(texts)
+    got = candidate.classify(texts)
+
+    agree = sum(1 for (a, _), (b, _) in zip(ref, got) if a == b)
+    max_diff = max(
+        (abs(pa[k] - pb.get(k, 0.0)) for (_, pa), (_, pb) in zip(ref, got) for k in pa),
+        default=0.0,
+    )
+    out = {
+        "label_agreement": round(agree / len(texts), 4) if texts else 1.0,
+        "max_prob_diff": round(max_diff, 5),
+    }
+
+    labeled = [(pred, lab) for (pred, _), lab in zip(got, labels) if lab]
+    if labeled:
+        out["accuracy"] = round(sum(1 for p, l in labeled if p == l) / len(labeled), 4)
+
+    # 실제 파이프라인(prefix → full-sentence) 최종 판단 비교
+    ref_dec = filter_classifier_batch(texts, classify=reference.classify)
+    got_dec = filter_classifier_batch(texts, classify=candidate.classify)
+    same = sum(1 for a, b in zip(ref_dec, got_dec) if a["status"] == b["status"] and a["label"] == b["label"])
+    out["decision_agreement"] = round(same / len(texts), 4) if texts else 1.0
+    return out
+
+
+def main(argv=None) -> int:
+    settings = get_settings()
+    p = argparse.ArgumentParser(description="filter backend parity/latency benchmark")
+    p.add_argument("--sample", required=True, help="labeled jsonl ({text, label})")
+    p.add_argument("--backends", default="fp32,int8,onnx")
+    p.add_argument("--model-path", default=settings.FILTER_MODEL_PATH)
+    p.add_argument("--onnx-path", default=settings.FILTER_ONNX_PATH)
+    p.add_argument("--export-onnx", action="store_true", help="onnx 파일이 없으면 fp32 모델에서 export")
+    p.add_argument("--batch-sizes", default="1,16,64")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--threads", type=int, default=settings.FILTER_TORCH_THREADS)
+    p.add_argument("--min-agreement", type=float, default=0.99)
+    args = p.parse_args(argv)
+
+    if args.threads > 0:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    texts, labels = load_sample(args.sample, args.limit)
+    kinds = [k.strip() for k in args.backends.split(",") if k.strip()]
+    onnx_path = args.onnx_path or os.path.join(args.model_path, "model.onnx")
+    if "onnx" in kinds and args.export_onnx and not os.path.exists(onnx_path):
+        print(f"exporting ONNX → {onnx_path}")
+        export_onnx(args.model_path, onnx_path)
+
+    reference = create_backend("fp32", args.model_path)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    report = {"sample_size": len(texts), "backends": {}}
+    failed = False
+    for kind in kinds:
+        backend = reference if kind == "fp32" else create_backend(kind, args.model_path, onnx_path, args.threads)
+        entry = {"latency": [measure_latency(backend, texts, bs, args.repeat) for bs in batch_sizes]}
+        entry.update(compare(reference, backend, texts, labels))
+        if entry["label_agreement"] < args.min_agreement:
+            failed = True
+        report["backends"][kind] = entry
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
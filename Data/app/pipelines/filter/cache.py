@@ -0,0 +1,77 @@
+# app/pipelines/filter/cache.py
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+Result = Tuple[str, Dict[str, float]]
+
+
+class ClassifyCache:
+    """
+    (모델 버전, 입력 텍스트) → 분류 결과 LRU
+    "아", "저기요", "감사합니다" 같은 짧은 prefix가 대부분이라 반복 추론을 dict 조회로 대체.
+    max_chars보다 긴 텍스트(남은 문장 전체 등)는 재사용 가능성이 낮아 저장하지 않음.
+    """
+
+    def __init__(self, maxsize: int, max_chars: int = 64):
+        self.maxsize = maxsize
+        self.max_chars = max_chars
+        self._data: "OrderedDict[Tuple[str, str], Result]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: str, text: str) -> Optional[Result]:
+        with self._lock:
+            res = self._data.get((version, text))
+            if res is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((version, text))
+            self.hits += 1
+        # probs dict는 drop_logs에 그대로 들어가므로 복사해서 반환
+        return res[0], dict(res[1])
+
+    def put(self, version: str, text: str, res: Result) -> None:
+        if self.maxsize <= 0 or len(text) > self.max_chars:
+            return
+        with self._lock:
+            self._data[(version, text)] = (res[0], dict(res[1]))
+            self._data.move_to_end((version, text))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def classify(
+        self,
+        version: str,
+        texts: List[str],
+        classify: Callable[[List[str]], List[Result]],
+    ) -> List[Result]:
+        """캐시에 없는 텍스트만 classify로 넘기고 입력 순서대로 결과 반환"""
+        out: List[Optional[Result]] = [None] * len(texts)
+        missing: List[str] = []
+        missing_idx: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            res = self.get(version, text)
+            if res is not None:
+                out[i] = res
+                continue
+            if text not in missing_idx:
+                missing_idx[text] = []
+                missing.append(text)
+            missing_idx[text].append(i)
+
+        if missing:
+            for text, res in zip(missing, classify(missing)):
+                self.put(version, text, res)
+                for i in missing_idx[text]:
+                    out[i] = res
+        return out  # type: ignore[return-value]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -1,5 +1,5 @@
-import torch
-from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 PREFIX_FILTER_LABELS = {
     "call_only", "reaction_only", "greeting",
@@ -47,6 +47,8 @@ def resolve_final_label(drop_logs: List[Dict[str, Any]]) -> Optional[str]:
 
 
 def classify_text(text: str, model, tokenizer):
+    import torch  # 앱 import 시점에는 torch를 로드하지 않음 (실제 추론 시 로드)
+
     model.eval()
     inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=128)
     with torch.no_grad():
@@ -59,17 +61,37 @@ def classify_text(text: str, model, tokenizer):
     return pred_label, prob_dict
 
 
-def filter_classifier(
-    input_text: str,
+def classify_batch(
+    texts: List[str],
     model,
     tokenizer,
-    threshold: float = 0.8,
-    margin: float = 0.05
-) -> Dict[str, Any]:
+    batch_size: int = 64,
+) -> List[Tuple[str, Dict[str, float]]]:
+    """
+    여러 텍스트를 padding된 배치로 한 번에 분류.
+    반환값은 입력 순서대로 classify_text와 같은 (pred_label, prob_dict) 튜플.
+    """
+    if not texts:
+        return []
+    import torch
 
-    drop_logs: List[Dict[str, Any]] = []
-    kept_sentences: List[str] = []
+    model.eval()
+    id2label = model.config.id2label
+    results: List[Tuple[str, Dict[str, float]]] = []
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+        inputs = tokenizer(chunk, return_tensors="pt", truncation=True, max_length=128, padding=True)
+        with torch.no_grad():
+            logits = model(**inputs).logits
+            probs = torch.softmax(logits, dim=-1).tolist()
+            pred_idxs = torch.argmax(logits, dim=-1).tolist()
+        for pred_idx, row in zip(pred_idxs, probs):
+            prob_dict = {id2label[i]: float(p) for i, p in enumerate(row)}
+            results.append((id2label[int(pred_idx)], prob_dict))
+    return results
 
+
+def split_sentences(input_text: str) -> List[str]:
     # 문장 분리 (.?! 기준)
     sentences: List[str] = []
     buf = ""
@@ -81,76 +103,88 @@ def filter_classifier(
             buf = ""
     if buf.strip():
         sentences.append(buf.strip())
+    return sentences
+
 
-    for sent in sentences:
-        tokens = sent.split()
-        if not tokens:
+@dataclass
+class _SentenceState:
+    sent: str
+    tokens: List[str]
+    drop_logs: List[Dict[str, Any]] = field(default_factory=list)
+    kept_sentences: List[str] = field(default_factory=list)
+
+    def candidates(self) -> List[str]:
+        """현재 tokens 상태에서 판단에 필요할 수 있는 모든 입력 (1/2/3-gram prefix + 남은 문장)"""
+        texts = [" ".join(self.tokens[:n]) for n in [1, 2, 3] if len(self.tokens) >= n]
+        texts.append(" ".join(self.tokens))
+        return texts
+
+
+def _replay_step(
+    state: _SentenceState,
+    results: Dict[str, Tuple[str, Dict[str, float]]],
+    threshold: float,
+) -> None:
+    """
+    미리 계산된 분류 결과로 기존 prefix → full-sentence 판단을 한 단계 진행.
+    prefix가 잘려나가면 state.tokens에 남은 토큰이 유지되어 다음 라운드에서 이어서 처리된다.
+    """
+    tokens = state.tokens
+    sent = state.sent
+
+    for n in [1, 2, 3]:
+        if len(tokens) < n:
             continue
+        prefix = " ".join(tokens[:n])
+        pred, probs = results[prefix]
+
+        if pred == "meaningful":
+            state.kept_sentences.append(" ".join(tokens))
+            state.tokens = []
+            return
+
+        top_score = probs[pred]
+        use_th = LABEL_THRESHOLDS.get(pred, threshold)
+        if pred in PREFIX_FILTER_LABELS and top_score >= use_th:
+            if n == 1 and token_has_particle(tokens[0]):
+                state.kept_sentences.append(" ".join(tokens))
+                state.tokens = []
+                return
+
+            state.drop_logs.append({
+                "원문": sent,
+                "단계": f"{n}-gram prefix",
+                "text": prefix,
+                "label": pred,
+                "confidence": float(top_score),
+                "probs": probs
+            })
+            state.tokens = tokens[n:]
+            return
+
+    remaining = " ".join(tokens)
+    pred, probs = results[remaining]
+    state.tokens = []
 
-        while tokens:
-            matched_prefix = False
-
-            for n in [1, 2, 3]:
-                if len(tokens) < n:
-                    continue
-                prefix = " ".join(tokens[:n])
-                pred, probs = classify_text(prefix, model, tokenizer)
-
-                if pred == "meaningful":
-                    kept_sentences.append(" ".join(tokens))
-                    tokens = []
-                    matched_prefix = True
-                    break
-
-                top_score = probs[pred]
-                use_th = LABEL_THRESHOLDS.get(pred, threshold)
-                if pred in PREFIX_FILTER_LABELS and top_score >= use_th:
-                    if n == 1 and token_has_particle(tokens[0]):
-                        kept_sentences.append(" ".join(tokens))
-                        tokens = []
-                        matched_prefix = True
-                        break
-
-                    drop_logs.append({
-                        "원문": sent,
-                        "단계": f"{n}-gram prefix",
-                        "text": prefix,
-                        "label": pred,
-                        "confidence": float(top_score),
-                        "probs": probs
-                    })
-                    tokens = tokens[n:]
-                    matched_prefix = True
-                    break
-
-            if matched_prefix:
-                continue  
-
-            remaining = " ".join(tokens)
-            pred, probs = classify_text(remaining, model, tokenizer)
-
-            if pred == "meaningful":
-                kept_sentences.append(remaining)
-                tokens = []
-                break
-
-            top_score = probs[pred]
-            use_th = LABEL_THRESHOLDS.get(pred, threshold)
-            if pred in FULL_FILTER_LABELS and top_score >= use_th:
-                drop_logs.append({
-                    "원문": sent,
-                    "단계": "full-sentence",
-                    "label": pred,
-                    "confidence": float(top_score),
-                    "probs": probs
-                })
-                tokens = []
-                break
-            else:
-                kept_sentences.append(remaining)
-                tokens = []
-                break
+    if pred == "meaningful":
+        state.kept_sentences.append(remaining)
+        return
 
+    top_score = probs[pred]
+    use_th = LABEL_THRESHOLDS.get(pred, threshold)
+    if pred in FULL_FILTER_LABELS and top_score >= use_th:
+        state.drop_logs.append({
+            "원문": sent,
+            "단계": "full-sentence",
+            "label": pred,
+            "confidence": float(top_score),
+            "probs": probs
+        })
+    else:
+        state.kept_sentences.append(remaining)
+
+
+def _build_decision(drop_logs: List[Dict[str, Any]], kept_sentences: List[str]) -> Dict[str, Any]:
     final_label = resolve_final_label(drop_logs)
     max_conf = max((log["confidence"] for log in drop_logs), default=0.0)
 
@@ -175,3 +209,74 @@ def filter_classifier(
             "drop_logs": drop_logs,
             "kept_sentences": []
         }
+
+
+def filter_classifier_batch(
+    input_texts: List[str],
+    model=None,
+    tokenizer=None,
+    threshold: float = 0.8,
+    margin: float = 0.05,
+    batch_size: int = 64,
+    classify: Optional[Callable[[List[str]], List[Tuple[str, Dict[str, float]]]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    여러 메시지를 한 번에 필터링.
+    라운드마다 아직 끝나지 않은 모든 문장의 prefix/남은 문장 후보를 모아 한 배치로 추론하고,
+    그 결과로 filter_classifier와 동일한 drop/keep 판단을 재생한다.
+    (prefix가 잘려나간 문장만 다음 라운드로 넘어감)
+    classify를 주면 classify_batch 대신 사용 (예: InferenceScheduler.classify_many)
+    """
+    if classify is None:
+        classify = lambda texts: classify_batch(texts, model, tokenizer, batch_size=batch_size)
+
+    per_message: List[List[_SentenceState]] = []
+    active: List[_SentenceState] = []
+    for text in input_texts:
+        states = []
+        for sent in split_sentences(text or ""):
+            tokens = sent.split()
+            if not tokens:
+                continue
+            states.append(_SentenceState(sent=sent, tokens=tokens))
+        per_message.append(states)
+        active.extend(states)
+
+    results: Dict[str, Tuple[str, Dict[str, float]]] = {}
+    while active:
+        pending: List[str] = []
+        seen = set(results)
+        for state in active:
+            for cand in state.candidates():
+                if cand not in seen:
+                    seen.add(cand)
+                    pending.append(cand)
+        for text, res in zip(pending, classify(pending)):
+            results[text] = res
+
+        for state in active:
+            _replay_step(state, results, threshold)
+        active = [state for state in active if state.tokens]
+
+    decisions: List[Dict[str, Any]] = []
+    for states in per_message:
+        drop_logs: List[Dict[str, Any]] = []
+        kept_sentences: List[str] = []
+        for state in states:
+            drop_logs.extend(state.drop_logs)
+            kept_sentences.extend(state.kept_sentences)
+        decisions.append(_build_decision(drop_logs, kept_sentences))
+    return decisions
+
+
+def filter_classifier(
+    input_text: str,
+    model=None,
+    tokenizer=None,
+    threshold: float = 0.8,
+    margin: float = 0.05,
+    classify: Optional[Callable[[List[str]], List[Tuple[str, Dict[str, float]]]]] = None,
+) -> Dict[str, Any]:
+    return filter_classifier_batch(
+        [input_text], model, tokenizer, threshold=threshold, margin=margin, classify=classify
+    )[0]
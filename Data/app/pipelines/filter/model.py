@@ -0,0 +1,120 @@
+# app/pipelines/filter/model.py
+import os
+import threading
+from typing import Any, Optional, Tuple
+
+from app.core.config import get_settings
+from app.pipelines.filter.scheduler import InferenceScheduler
+from app.pipelines.filter.cache import ClassifyCache
+
+_settings = get_settings()
+
+
+class FilterModelProvider:
+    """
+    BERT 필터 모델 백엔드 (FILTER_MODEL_PATH)
+    - FILTER_BACKEND로 fp32 / int8 / onnx 선택 (backends.py)
+    - 처음 load() 시점에 1회만 로드 (스레드 안전)
+    - transformers import도 로드 시점까지 미룸 (서버 기동 시간 단축)
+    """
+
+    def __init__(self, model_path: str, backend: str = "fp32", onnx_path: Optional[str] = None,
+                 num_threads: int = 0):
+        self.model_path = model_path
+        self.backend = backend
+        self.onnx_path = onnx_path
+        self.num_threads = num_threads
+        self._backend = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._backend is not None
+
+    @property
+    def version(self) -> str:
+        """분류 결과 캐시 키용 모델 버전 (FILTER_MODEL_VERSION 없으면 경로/백엔드/config 수정 시각)"""
+        if self._version is None:
+            if _settings.FILTER_MODEL_VERSION:
+                self._version = _settings.FILTER_MODEL_VERSION
+            else:
+                config_path = os.path.join(self.model_path, "config.json")
+                mtime = int(os.path.getmtime(config_path)) if os.path.exists(config_path) else 0
+                self._version = f"{self.model_path}:{self.backend}:{mtime}"
+        return self._version
+
+    def load(self):
+        if self._backend is not None:
+            return self._backend
+        with self._lock:
+            if self._backend is None:
+                from app.pipelines.filter.backends import create_backend
+
+                self._backend = create_backend(self.backend, self.model_path, self.onnx_path, self.num_threads)
+                print(f"[filter.model] Loaded model from {self.model_path} (backend={self.backend})")
+        return self._backend
+
+
+_provider = FilterModelProvider(
+    _settings.FILTER_MODEL_PATH,
+    backend=_settings.FILTER_BACKEND,
+    onnx_path=_settings.FILTER_ONNX_PATH,
+    num_threads=_settings.FILTER_TORCH_THREADS,
+)
+
+
+def get_filter_provider() -> FilterModelProvider:
+    return _provider
+
+
+def get_filter_backend():
+    """설정된 백엔드 (classify(texts, batch_size) 제공)"""
+    return _provider.load()
+
+
+def get_filter_model() -> Tuple[Any, Any]:
+    """(model, tokenizer) — onnx 백엔드면 model은 None"""
+    backend = _provider.load()
+    return backend.model, backend.tokenizer
+
+
+_scheduler: Optional[InferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_filter_scheduler() -> InferenceScheduler:
+    """프로세스 공용 동적 배칭 스케줄러 (API 요청/워커가 같은 추론 스레드를 공유)"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                def _classify(texts):
+                    return get_filter_backend().classify(texts, batch_size=_settings.FILTER_SCHED_MAX_BATCH)
+
+                _scheduler = InferenceScheduler(
+                    _classify,
+                    max_batch_size=_settings.FILTER_SCHED_MAX_BATCH,
+                    max_wait_ms=_settings.FILTER_SCHED_MAX_WAIT_MS,
+                    num_threads=_settings.FILTER_TORCH_THREADS,
+                )
+    return _scheduler
+
+
+_classify_cache = ClassifyCache(_settings.FILTER_CACHE_SIZE, max_chars=_settings.FILTER_CACHE_MAX_CHARS)
+
+
+def _classify_uncached(texts):
+    return get_filter_scheduler().classify_many(texts, timeout=_settings.FILTER_SCHED_TIMEOUT_SEC)
+
+
+def classify_many(texts):
+    """
+    classify_batch 대체 함수 (filter_classifier(classify=...)용)
+    짧은 prefix는 결과 캐시에서 찾고, 나머지만 스케줄러로 추론
+    """
+    return _classify_cache.classify(_provider.version, texts, _classify_uncached)
+
+
+def classify_cache_stats():
+    return _classify_cache.stats()
@@ -0,0 +1,152 @@
+# app/pipelines/filter/scheduler.py
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("filter-scheduler")
+
+Result = Tuple[str, Dict[str, float]]
+ClassifyFn = Callable[[List[str]], List[Result]]
+
+
+class InferenceScheduler:
+    """
+    동적 배칭 추론 스케줄러.
+    여러 호출자(API 스레드, 워커)의 분류 요청을 큐에 모았다가
+    max_batch_size 건이 차거나 첫 요청 후 max_wait_ms 가 지나면 한 번에 forward.
+
+    - 추론은 전용 스레드 1개에서만 실행 (torch.set_num_threads로 CPU 사용량 고정)
+    - submit()은 Future를 반환, 같은 배치 안의 중복 텍스트는 한 번만 계산
+    """
+
+    def __init__(
+        self,
+        classify_fn: ClassifyFn,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        num_threads: int = 0,
+        name: str = "filter-infer",
+    ):
+        self.classify_fn = classify_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_sec = max_wait_ms / 1000.0
+        self.num_threads = num_threads
+        self.name = name
+
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.batches = 0
+        self.items = 0
+
+    # -----------------------
+    # 요청
+    # -----------------------
+    def submit(self, text: str) -> "Future[Result]":
+        if self._stopped:
+            raise RuntimeError("InferenceScheduler is stopped")
+        self._ensure_thread()
+        fut: "Future[Result]" = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def submit_many(self, texts: List[str]) -> List["Future[Result]"]:
+        return [self.submit(t) for t in texts]
+
+    def classify_many(self, texts: List[str], timeout: Optional[float] = None) -> List[Result]:
+        """classify_batch와 같은 형태로 쓰는 동기 헬퍼 (입력 순서대로 결과 반환)"""
+        futures = self.submit_many(texts)
+        return [f.result(timeout=timeout) for f in futures]
+
+    # -----------------------
+    # 추론 스레드
+    # -----------------------
+    def _ensure_thread(self) -> None:
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    logger.warning("⚠️ 필터 추론 스레드가 종료되어 다시 시작")
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: Tuple[str, Future]) -> List[Tuple[str, Future]]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_sec
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # stop 신호는 다시 넣어서 루프에서 처리
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        if self.num_threads > 0:
+            try:
+                import torch
+                torch.set_num_threads(self.num_threads)
+            except Exception:
+                logger.exception("❌ torch 스레드 수 설정 실패")
+
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            try:
+                batch = self._collect(first)
+                batch = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+                if batch:
+                    self._process(batch)
+            except Exception as e:
+                # 배치 처리 중 어떤 예외든 스레드는 살려 두고, 아직 결과가 없는 요청만 실패 처리
+                logger.exception("❌ 필터 배치 추론 실패 (%d건)", len(batch))
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def _process(self, batch: List[Tuple[str, Future]]) -> None:
+        unique: List[str] = []
+        index: Dict[str, int] = {}
+        for text, _ in batch:
+            if text not in index:
+                index[text] = len(unique)
+                unique.append(text)
+
+        results = self.classify_fn(unique)
+        if len(results) != len(unique):
+            raise ValueError(f"classify_fn returned {len(results)} results for {len(unique)} texts")
+
+        for text, fut in batch:
+            fut.set_result(results[index[text]])
+        self.batches += 1
+        self.items += len(batch)
+
+    def stop(self) -> None:
+        """남은 요청까지 처리하고 스레드 종료"""
+        self._stopped = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
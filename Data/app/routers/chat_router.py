@@ -1,20 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.adapters.db import get_session
 from app.contracts.raw_filtered import RawFilteredMessage
-from app.services.chat_service import process_user_message
+from app.services.chat_service import process_user_message_async, build_stream_prompt, stream_user_message
 from app.adapters.db import get_db
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 @router.post("/send")
-def send_message(payload: RawFilteredMessage, session: Session = Depends(get_db)):
+async def send_message(payload: RawFilteredMessage, session: Session = Depends(get_db)):
     """
     사용자 메시지를 받아 GPT 응답 생성 후 반환
     - system prompt + redis 최근 대화 + ES 유사 맥락 → GPT 호출
     - 답변 Redis에 저장
     """
     try:
-        reply = process_user_message(session, payload)
+        reply = await process_user_message_async(session, payload)
         return {
             "trace_id": payload.trace_id,
             "user_id": payload.user_id,
@@ -24,3 +25,22 @@ def send_message(payload: RawFilteredMessage, session: Session = Depends(get_db)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/send/stream")
+async def send_message_stream(payload: RawFilteredMessage, session: Session = Depends(get_db)):
+    """
+    /send의 스트리밍 버전 (SSE)
+    - 맥락 조회 후 LLM 토큰 delta를 바로 전달 (data: {"type":"chunk","delta":...})
+    - 완료 시 Redis 히스토리/TokenUsage 저장 후 data: {"type":"done","usage":...}
+    """
+    try:
+        prompt = await build_stream_prompt(session, payload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        stream_user_message(prompt, payload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
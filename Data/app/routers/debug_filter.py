@@ -1,18 +1,14 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
 from app.contracts.raw_filtered_schema import RawFilteredMessageSchema
 from app.adapters.db import get_db
 from app.services import filter_service
 from app.pipelines.filter.filter_classifier import filter_classifier
+from app.pipelines.filter.model import classify_many
 
 router = APIRouter()
 
-# 모델/토크나이저 미리 로드 (서버 시작 시 1회)
-model = AutoModelForSequenceClassification.from_pretrained("/app/models/filter", local_files_only=True)
-tokenizer = AutoTokenizer.from_pretrained("/app/models/filter", local_files_only=True)
-
 
 @router.post("/debug/filter")
 def debug_filter(msg: RawFilteredMessageSchema, db: Session = Depends(get_db)):
@@ -24,7 +20,9 @@ def debug_filter(msg: RawFilteredMessageSchema, db: Session = Depends(get_db)):
     - 결과 JSON 반환
     """
 
-    decision = filter_classifier(msg.final_text or msg.text, model, tokenizer)
+    # 모델은 첫 요청 시 로드 (MODEL_WARMUP으로 미리 로드 가능)
+    # 추론은 공용 스케줄러에서 동시 요청과 함께 배치 처리
+    decision = filter_classifier(msg.final_text or msg.text, classify=classify_many)
 
     # DB 저장
     filter_service.save_filter_results(msg, decision, rule_name="ml")
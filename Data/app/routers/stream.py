@@ -1,17 +1,20 @@
 import json
+import asyncio
+import os
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from confluent_kafka import Consumer
-import os
-import asyncio
 
-from app.adapters.kafka_io import make_consumer
+from app.services.stream_hub import StreamHub, OVERFLOW_TOPIC
 
 router = APIRouter()
 
-KAFKA_BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "3.35.206.91:29092")
 TOPIC_DELTA = os.getenv("KAFKA_TOPIC_OUT_LLM_DELTA", "chat.llm.answer.delta.v1")
 TOPIC_DONE = os.getenv("KAFKA_TOPIC_OUT_LLM_DONE", "chat.llm.answer.done.v1")
+SSE_HEARTBEAT_SEC = float(os.getenv("SSE_HEARTBEAT_SEC", "15"))
+
+# 프로세스 공용 Kafka consumer → room별 큐 fan-out
+hub = StreamHub([TOPIC_DELTA, TOPIC_DONE])
+router.add_event_handler("shutdown", hub.stop)
 
 
 @router.get("/api/stream/{room_id}")
@@ -19,33 +22,29 @@ async def stream_events(room_id: str):
     """
     SSE endpoint for real-time LLM responses
     """
-    consumer: Consumer = make_consumer(
-        topics=[TOPIC_DELTA, TOPIC_DONE],
-        group_id=f"sse-consumer-{room_id}",
-        auto_offset_reset="latest",
-    )
+    queue = hub.subscribe(room_id)
 
     async def event_generator():
         try:
             while True:
-                msg = consumer.poll(1.0)
-                if msg is None:
-                    await asyncio.sleep(0.1)
-                    continue
-                if msg.error():
-                    continue
-
-                data = json.loads(msg.value())
-                if data.get("room_id") != room_id:
+                try:
+                    topic, data = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    # 연결 유지 + 끊긴 클라이언트 감지용
+                    yield ": keep-alive\n\n"
                     continue
 
-                if msg.topic() == TOPIC_DELTA:
+                if topic == TOPIC_DELTA:
                     yield f"data: {json.dumps({'type':'chunk','delta':data['delta']}, ensure_ascii=False)}\n\n"
 
-                elif msg.topic() == TOPIC_DONE:
+                elif topic == TOPIC_DONE:
                     yield f"data: {json.dumps({'type':'done','usage':data.get('usage',{})}, ensure_ascii=False)}\n\n"
                     break  # end SSE after done
+
+                elif topic == OVERFLOW_TOPIC:
+                    yield f"data: {json.dumps({'type':'error','reason':'slow_consumer'}, ensure_ascii=False)}\n\n"
+                    break
         finally:
-            consumer.close()
+            hub.unsubscribe(room_id, queue)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
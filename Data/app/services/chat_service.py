@@ -1,39 +1,87 @@
 import os
 import json
+import asyncio
+import logging
+import uuid
+import httpx
 import requests
-from typing import List
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
 from sqlalchemy.orm import Session
-from sentence_transformers import SentenceTransformer
 
-from app.models import UserSetting
-from app.utils.es import get_es
-from app.adapters.redis_io import append_conversation  # 표준: (room_id, role, content)
+from app.models import UserSetting, TokenUsage
+from app.contracts.token_usage_event import TokenUsageEvent
+from app.adapters.kafka_io import make_producer, publish, flush_producer
+from app.adapters.db import get_session
+from app.services import llm_client
+from app.utils.es import get_es, get_async_es, close_async_es
+from app.utils.usage import estimate_usage_by_tokens
+from app.services.system_prompt_cache import SystemPromptCache
+from app.pipelines.embedding.cache import cached_embedding
+from app.pipelines.embedding.model import get_provider
+from app.adapters.redis_io import append_turn  # user/assistant 한 턴 저장 (round trip 1회)
+from app.adapters.redis_io import get_conversation_async, append_turn_async, close_async_redis
+
+logger = logging.getLogger("chat-service")
 
 # ===============================
 # ENV / 상수
 # ===============================
 REDIS_TTL_SEC = int(os.getenv("REDIS_TTL_SEC", "3600"))  # 유지: 다른 레이어에서 TTL 사용 시 참고
-EMBED_MODEL_PATH = os.getenv("EMBED_MODEL_PATH", "/app/models/embedding")
 USER_MEMORY_EMBED_INDEX = os.getenv("USER_MEMORY_EMBED_INDEX", "user_memory_embedding")
 
 GMS_API_KEY = os.getenv("GMS_API_KEY")
 GMS_API_URL = os.getenv("GMS_API_URL")
 GMS_MODEL_NAME = os.getenv("GMS_MODEL_NAME", "gpt-4o-mini")
 GMS_TIMEOUT = float(os.getenv("GMS_TIMEOUT_SEC", "30"))
+GMS_MAX_CONNECTIONS = int(os.getenv("GMS_MAX_CONNECTIONS", "100"))
+GMS_MAX_KEEPALIVE = int(os.getenv("GMS_MAX_KEEPALIVE", "20"))
 
 KNN_TOP_K = int(os.getenv("KNN_TOP_K", "3"))
 KNN_MIN_SCORE = float(os.getenv("KNN_MIN_SCORE", "0.7"))
 KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", "100"))
 
+# token_usage insert 이벤트 (Spark 스트리밍 집계 입력, 워커와 같은 토픽)
+KAFKA_OUT_USAGE = os.getenv("KAFKA_TOPIC_TOKEN_USAGE", "chat.token.usage.v1")
+
 # ===============================
-# 임베딩 모델 (지연 로딩)
+# async HTTP 클라이언트 (커넥션 풀 공유)
 # ===============================
-_embedder = None
-def get_embedder() -> SentenceTransformer:
-    global _embedder
-    if _embedder is None:
-        _embedder = SentenceTransformer(EMBED_MODEL_PATH)
-    return _embedder
+_http_client: Optional[httpx.AsyncClient] = None
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=GMS_TIMEOUT,
+            limits=httpx.Limits(max_connections=GMS_MAX_CONNECTIONS, max_keepalive_connections=GMS_MAX_KEEPALIVE),
+        )
+    return _http_client
+
+# ===============================
+# TokenUsage 이벤트 Producer (첫 저장 시 생성)
+# ===============================
+_usage_producer = None
+def get_usage_producer():
+    global _usage_producer
+    if _usage_producer is None:
+        _usage_producer = make_producer()
+    return _usage_producer
+
+def close_usage_producer():
+    """shutdown 시 남은 TokenUsage 이벤트 전송"""
+    global _usage_producer
+    if _usage_producer is not None:
+        flush_producer(_usage_producer)
+        _usage_producer = None
+
+async def close_async_clients():
+    """shutdown 시 async HTTP/ES/Redis 클라이언트 정리"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await close_async_es()
+    await close_async_redis()
 
 # ===============================
 # System Prompt 생성
@@ -67,6 +115,14 @@ def build_system_prompt(session: Session, user_id: str) -> str:
 
     return "\n- ".join(parts)
 
+
+_prompt_cache = SystemPromptCache(build_system_prompt)
+
+
+def get_system_prompt(session: Session, user_id: str) -> str:
+    """build_system_prompt 캐시 버전"""
+    return _prompt_cache.get(session, user_id)
+
 # ===============================
 # ES 유사 맥락 검색 (KNN + 사용자 필터)
 # ===============================
@@ -79,12 +135,9 @@ def _safe_join_lines(lines: List) -> str:
             out.append(json.dumps(x, ensure_ascii=False))
     return "\n".join(out)
 
-def search_similar_context_es(query: str, user_id: str, top_k: int = KNN_TOP_K, min_score: float = KNN_MIN_SCORE):
-    es = get_es()
-    emb = get_embedder().encode(query).tolist()
-
+def _knn_body(emb: List[float], user_id: str, top_k: int) -> dict:
     # ES 8.x/OpenSearch의 KNN 검색은 filter를 함께 줄 수 있음
-    body = {
+    return {
         "knn": {
             "field": "embedding",
             "query_vector": emb,
@@ -97,7 +150,7 @@ def search_similar_context_es(query: str, user_id: str, top_k: int = KNN_TOP_K,
         "_source": ["content", "user_id", "trace_id", "created_at"]
     }
 
-    resp = es.search(index=USER_MEMORY_EMBED_INDEX, body=body)
+def _contents_from_hits(resp, min_score: float) -> List[str]:
     hits = resp.get("hits", {}).get("hits", []) or []
 
     results = []
@@ -111,6 +164,35 @@ def search_similar_context_es(query: str, user_id: str, top_k: int = KNN_TOP_K,
             results.append(content)
     return results
 
+def search_similar_context_es(query: str, user_id: str, top_k: int = KNN_TOP_K, min_score: float = KNN_MIN_SCORE):
+    es = get_es()
+    emb = cached_embedding(query, get_provider().encode)
+    resp = es.search(index=USER_MEMORY_EMBED_INDEX, body=_knn_body(emb, user_id, top_k))
+    return _contents_from_hits(resp, min_score)
+
+async def search_similar_context_es_async(query: str, user_id: str, top_k: int = KNN_TOP_K, min_score: float = KNN_MIN_SCORE):
+    # 임베딩은 CPU 작업이라 스레드로 넘기고, ES 검색만 이벤트 루프에서 대기
+    emb = await asyncio.to_thread(cached_embedding, query, get_provider().encode)
+    resp = await get_async_es().search(index=USER_MEMORY_EMBED_INDEX, body=_knn_body(emb, user_id, top_k))
+    return _contents_from_hits(resp, min_score)
+
+def _build_messages(system_prompt: str, history: List[dict], similar_contexts: List, text: str) -> List[dict]:
+    # 최종 메시지 구성 (OpenAI 스타일)
+    messages = [{"role": "system", "content": system_prompt}]
+    for h in history:
+        # h는 {"role": "...", "content": "..."} 포맷이라고 가정
+        role = h.get("role")
+        content = h.get("content")
+        if role and content:
+            messages.append({"role": role, "content": content})
+
+    if similar_contexts:
+        context_str = _safe_join_lines(similar_contexts)
+        messages.append({"role": "system", "content": f"참고할 추가 맥락:\n{context_str}"})
+
+    messages.append({"role": "user", "content": text})
+    return messages
+
 # ===============================
 # GPT 호출 + Redis 저장
 # ===============================
@@ -126,7 +208,7 @@ def process_user_message(session: Session, payload):
         raise RuntimeError("GMS_API_URL/GMS_API_KEY 환경변수가 설정되지 않았습니다.")
 
     # 1. System prompt
-    system_prompt = build_system_prompt(session, payload.user_id)
+    system_prompt = get_system_prompt(session, payload.user_id)
 
     # 2. Redis 최근 대화: adapters.redis_io 쪽의 getter를 쓰는 것이 이상적이지만,
     #    여기서는 최소 메시지 크기를 위해 최근 N턴만 불러온다고 가정.
@@ -147,19 +229,7 @@ def process_user_message(session: Session, payload):
         similar_contexts = []
 
     # 4. 최종 메시지 구성 (OpenAI 스타일)
-    messages = [{"role": "system", "content": system_prompt}]
-    for h in history:
-        # h는 {"role": "...", "content": "..."} 포맷이라고 가정
-        role = h.get("role")
-        content = h.get("content")
-        if role and content:
-            messages.append({"role": role, "content": content})
-
-    if similar_contexts:
-        context_str = _safe_join_lines(similar_contexts)
-        messages.append({"role": "system", "content": f"참고할 추가 맥락:\n{context_str}"})
-
-    messages.append({"role": "user", "content": payload.text})
+    messages = _build_messages(system_prompt, history, similar_contexts, payload.text)
 
     # 5. GMS API 호출
     headers = {"Authorization": f"Bearer {GMS_API_KEY}"}
@@ -173,8 +243,131 @@ def process_user_message(session: Session, payload):
     except (requests.RequestException, KeyError, IndexError) as e:
         raise Exception(f"GMS API error: {getattr(e, 'response', None) and getattr(e.response, 'text', '') or str(e)}")
 
-    # 6. Redis에 저장 (턴 분리: user → assistant)
-    append_conversation(payload.room_id, "user", payload.text)
-    append_conversation(payload.room_id, "assistant", assistant_output)
+    # 6. Redis에 저장 (user → assistant 한 턴)
+    append_turn(payload.room_id, payload.text, assistant_output)
+
+    return assistant_output
+
+
+async def _build_messages_async(session: Session, payload) -> List[dict]:
+    """System prompt(DB), Redis 최근 대화, ES 유사 맥락을 동시에 조회해 메시지 구성"""
+    async def _history():
+        try:
+            return await get_conversation_async(payload.room_id, limit=5) or []
+        except Exception:
+            return []
+
+    async def _similar():
+        try:
+            return await search_similar_context_es_async(payload.text, user_id=payload.user_id, top_k=KNN_TOP_K)
+        except Exception:
+            # ES 장애 시에도 본 로직은 진행
+            return []
+
+    # 동기 SQLAlchemy 세션은 스레드에서 사용
+    system_prompt, history, similar_contexts = await asyncio.gather(
+        asyncio.to_thread(get_system_prompt, session, payload.user_id),
+        _history(),
+        _similar(),
+    )
+    return _build_messages(system_prompt, history, similar_contexts, payload.text)
+
+
+async def process_user_message_async(session: Session, payload):
+    """
+    process_user_message의 async 버전
+    - System prompt(DB), Redis 최근 대화, ES 유사 맥락을 동시에 조회
+    - GMS 호출은 공유 httpx.AsyncClient로 대기 (스레드풀 점유 없음)
+    """
+    if not GMS_API_URL or not GMS_API_KEY:
+        raise RuntimeError("GMS_API_URL/GMS_API_KEY 환경변수가 설정되지 않았습니다.")
+
+    messages = await _build_messages_async(session, payload)
+
+    headers = {"Authorization": f"Bearer {GMS_API_KEY}"}
+    req_json = {"model": GMS_MODEL_NAME, "messages": messages}
+
+    try:
+        response = await get_http_client().post(GMS_API_URL, headers=headers, json=req_json)
+        response.raise_for_status()
+        j = response.json()
+        assistant_output = j["choices"][0]["message"]["content"]
+    except (httpx.HTTPError, KeyError, IndexError) as e:
+        raise Exception(f"GMS API error: {getattr(e, 'response', None) and getattr(e.response, 'text', '') or str(e)}")
+
+    # Redis에 저장 (user → assistant 한 턴)
+    await append_turn_async(payload.room_id, payload.text, assistant_output)
 
     return assistant_output
+
+# ===============================
+# 스트리밍 응답 (SSE)
+# ===============================
+def _sse(data: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _save_stream_result(payload, full_text: str, usage: Dict[str, int]) -> None:
+    """스트림 완료 후 대화 히스토리와 토큰 사용량 저장"""
+    try:
+        append_turn(payload.room_id, payload.text, full_text)
+    except Exception:
+        logger.exception("❌ Redis 히스토리 저장 실패 (trace_id=%s)", payload.trace_id)
+
+    try:
+        total_tokens = usage.get("total_tokens", 0)
+        cost_usd, energy_wh, co2_g, _ = estimate_usage_by_tokens(total_tokens)
+        token_usage = TokenUsage(
+            id=uuid.uuid4(),  # 집계 이벤트 event_id와 같은 값
+            message_id=payload.message_id,
+            user_id=int(payload.user_id) if payload.user_id is not None else None,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=total_tokens,
+            cost_usd=cost_usd,
+            energy_wh=energy_wh,
+            co2_g=co2_g,
+            saved_tokens=0,
+            saved_cost_usd=0,
+            saved_energy_wh=0,
+            saved_co2_g=0,
+            created_at=datetime.now(timezone.utc),
+        )
+        # commit 후 expire되기 전에 이벤트 생성
+        event = TokenUsageEvent.from_row(token_usage, source="llm")
+        with get_session() as db:
+            db.add(token_usage)
+            db.commit()
+    except Exception:
+        logger.exception("❌ TokenUsage 저장 실패 (trace_id=%s)", payload.trace_id)
+        return
+
+    # 저장된 행만 집계 이벤트로 발행 (대시보드 스트리밍 집계가 DB와 어긋나지 않도록)
+    if KAFKA_OUT_USAGE:
+        try:
+            publish(get_usage_producer(), KAFKA_OUT_USAGE, key=event.user_id, value=event.to_dict())
+        except Exception:
+            logger.exception("❌ TokenUsage 이벤트 발행 실패 (trace_id=%s)", payload.trace_id)
+
+async def build_stream_prompt(session: Session, payload) -> str:
+    """llm_client.call_llm에 넘길 단일 프롬프트 (role: content 줄 단위)"""
+    messages = await _build_messages_async(session, payload)
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+def stream_user_message(prompt: str, payload) -> Iterator[str]:
+    """
+    LLM 스트림 delta를 SSE 이벤트로 바로 전달 (Kafka 경유 없음)
+    완료 후 히스토리/사용량 저장 → done 이벤트
+    """
+    chunks: List[str] = []
+    try:
+        for event in llm_client.call_llm(prompt, stream=True, model=GMS_MODEL_NAME):
+            if event["type"] == "delta":
+                chunks.append(event["delta"])
+                yield _sse({"type": "chunk", "delta": event["delta"]})
+            elif event["type"] == "done":
+                usage = event["usage"]
+                _save_stream_result(payload, "".join(chunks), usage)
+                yield _sse({"type": "done", "usage": usage})
+    except Exception as e:
+        logger.exception("❌ LLM 스트리밍 실패 (trace_id=%s)", payload.trace_id)
+        yield _sse({"type": "error", "message": str(e)})
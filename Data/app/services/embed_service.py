@@ -1,23 +1,19 @@
-import os
 from typing import List
-from sentence_transformers import SentenceTransformer
 
 from app.pipelines.embedding.store import save_embedding
 from app.pipelines.embedding.search import search_similar
-
-EMBED_MODEL_PATH = os.getenv("EMBED_MODEL_PATH", "/app/models/embedding")
-model = SentenceTransformer(EMBED_MODEL_PATH)
+from app.pipelines.embedding.cache import cached_embedding
+from app.pipelines.embedding.model import get_provider
 
 
 def embed_text(text: str) -> List[float]:
-    """SentenceTransformer 기반 임베딩 생성"""
-    emb = model.encode([text])[0]
-    return emb.tolist()
+    """SentenceTransformer 기반 임베딩 생성 (쿼리 임베딩 캐시 사용)"""
+    return cached_embedding(text, get_provider().encode)
 
 
 def store_text(user_id: str, source_id: str, text: str) -> str:
-    """텍스트를 임베딩 후 ES에 저장"""
-    embedding = embed_text(text)
+    """텍스트를 임베딩 후 ES에 저장 (요약/문서 본문은 반복되지 않으므로 쿼리 캐시를 거치지 않음)"""
+    embedding = get_provider().encode(text)
     return save_embedding(
         user_id=user_id,
         source_id=source_id,
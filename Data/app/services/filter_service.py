@@ -1,28 +1,59 @@
 from datetime import datetime, timedelta, timezone
 from difflib import ndiff
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Optional
 from app.contracts.raw_filtered import RawFilteredMessage
 from app.adapters.db import get_session
-from app.utils.es import get_es
+from app.utils.es_bulk import BulkIndexer
 from app.models import FilterResult
 
 # 한국시간 타임존 정의
 KST = timezone(timedelta(hours=9))
 
+FILTER_LOG_INDEX = "filter-logs"
+FILTER_LOG_BULK_MAX_DOCS = int(os.getenv("FILTER_LOG_BULK_MAX_DOCS", "500"))
+FILTER_LOG_BULK_INTERVAL_SEC = float(os.getenv("FILTER_LOG_BULK_INTERVAL_SEC", "1.0"))
+FILTER_LOG_BULK_MAX_BUFFER = int(os.getenv("FILTER_LOG_BULK_MAX_BUFFER", "10000"))
+
+_filter_log_indexer: Optional[BulkIndexer] = None
+
+
+def get_filter_log_indexer() -> BulkIndexer:
+    global _filter_log_indexer
+    if _filter_log_indexer is None:
+        _filter_log_indexer = BulkIndexer(
+            FILTER_LOG_INDEX,
+            max_docs=FILTER_LOG_BULK_MAX_DOCS,
+            flush_interval_sec=FILTER_LOG_BULK_INTERVAL_SEC,
+            max_buffer_docs=FILTER_LOG_BULK_MAX_BUFFER,
+        )
+    return _filter_log_indexer
+
+
+def close_filter_log_indexer() -> None:
+    """종료 시 버퍼에 남은 filter-logs 문서 flush"""
+    global _filter_log_indexer
+    if _filter_log_indexer is not None:
+        _filter_log_indexer.close()
+        _filter_log_indexer = None
+
+
+def build_filter_result(raw: RawFilteredMessage, decision: Dict[str, Any], rule_name: str = "no_meaning") -> FilterResult:
+    return FilterResult(
+        chat_room_id=raw.room_id,
+        message_id=raw.message_id,
+        stage="ml",
+        action=decision["status"].upper(),
+        rule_name=decision.get("label") or rule_name,
+        score=decision.get("score", 0.0),
+        created_at=datetime.now(timezone.utc),
+        trace_id=raw.trace_id,
+    )
+
 
 def save_filter_results(raw: RawFilteredMessage, decision: Dict[str, Any], rule_name: str = "no_meaning"):
     with get_session() as session:
-        filter_entry = FilterResult(
-            chat_room_id=raw.room_id,
-            message_id=raw.message_id,
-            stage="ml",
-            action=decision["status"].upper(),
-            rule_name=decision.get("label") or rule_name,
-            score=decision.get("score", 0.0),
-            created_at=datetime.now(timezone.utc),
-            trace_id=raw.trace_id,
-        )
-        session.add(filter_entry)
+        session.add(build_filter_result(raw, decision, rule_name))
         session.commit()
 
 
@@ -52,8 +83,8 @@ def _compute_dropped_tokens_by_diff(original_text: str, cleaned_text: str) -> Li
     return drops
 
 
-def save_to_es(raw: RawFilteredMessage, decision: Dict[str, Any]) -> None:
-    es = get_es()
+def build_es_docs(raw: RawFilteredMessage, decision: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """filter-logs 인덱스에 저장할 문서 목록 생성 (규칙 기반 단어 우선, 없으면 ML drop_logs)"""
     docs: List[Dict[str, Any]] = []
     now = datetime.now(KST).isoformat()
 
@@ -87,6 +118,16 @@ def save_to_es(raw: RawFilteredMessage, decision: Dict[str, Any]) -> None:
                         "created_at": now,
                     })
 
+    return docs
+
 
-    for doc in docs:
-        es.index(index="filter-logs", document=doc)
+def bulk_index_es(docs: List[Dict[str, Any]]) -> None:
+    """filter-logs 문서를 버퍼에 넣고 즉시 flush (호출 시점에 저장 완료가 필요한 경우)"""
+    indexer = get_filter_log_indexer()
+    indexer.add_many(docs)
+    indexer.flush()
+
+
+def save_to_es(raw: RawFilteredMessage, decision: Dict[str, Any]) -> None:
+    """filter-logs 문서를 bulk 버퍼에 적재 (크기/시간 기준으로 백그라운드 flush)"""
+    get_filter_log_indexer().add_many(build_es_docs(raw, decision))
@@ -1,6 +1,6 @@
 from openai import OpenAI
 import os
-import tiktoken
+from app.utils import tokens
 
 
 client = OpenAI(
@@ -10,14 +10,7 @@ client = OpenAI(
 
 def count_tokens(model: str, messages: list[str]) -> int:
     """tiktoken 기반 토큰 수 계산"""
-    try:
-        enc = tiktoken.encoding_for_model(model)
-    except Exception:
-        enc = tiktoken.get_encoding("cl100k_base")
-    text = ""
-    for m in messages:
-        text += m["role"] + ": " + m["content"] + "\n"
-    return len(enc.encode(text))
+    return tokens.count_message_tokens(messages, model)
 
 def call_llm(prompt, stream=True, model="gpt-4o", temperature=0.7):
     messages = [
@@ -41,11 +34,7 @@ def call_llm(prompt, stream=True, model="gpt-4o", temperature=0.7):
                 yield {"type": "delta", "delta": delta}
 
         full_text = "".join(completion_chunks)
-        try:
-            enc = tiktoken.encoding_for_model(model)
-        except Exception:
-            enc = tiktoken.get_encoding("cl100k_base")
-        completion_tokens = len(enc.encode(full_text))
+        completion_tokens = tokens.count_tokens(full_text, model)
 
         yield {
             "type": "done",
@@ -64,11 +53,7 @@ def call_llm(prompt, stream=True, model="gpt-4o", temperature=0.7):
             stream=False,
         )
         content = resp.choices[0].message.content
-        try:
-            enc = tiktoken.encoding_for_model(model)
-        except Exception:
-            enc = tiktoken.get_encoding("cl100k_base")
-        completion_tokens = len(enc.encode(content))
+        completion_tokens = tokens.count_tokens(content, model)
 
         return {
             "text": content,
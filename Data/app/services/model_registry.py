@@ -0,0 +1,90 @@
+# app/services/model_registry.py
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+from app.pipelines.embedding.model import get_provider as get_embedding_provider
+from app.pipelines.filter.model import get_filter_provider
+
+logger = logging.getLogger("model-registry")
+
+# 이름 → 지연 로딩 provider (모두 .loaded / .load() 제공)
+_PROVIDERS = {
+    "filter": get_filter_provider,
+    "embedding": get_embedding_provider,
+}
+
+_warmup_lock = threading.Lock()
+_warmup: Dict[str, Optional[float]] = {}  # 이름 → 로드 소요 시간(초), 진행 중/실패면 None
+_warmup_errors: Dict[str, str] = {}
+
+
+def parse_names(spec: str) -> list:
+    """"filter,embedding" / "all" → 모델 이름 목록"""
+    spec = (spec or "").strip()
+    if not spec:
+        return []
+    if spec == "all":
+        return list(_PROVIDERS)
+    names = [n.strip() for n in spec.split(",") if n.strip()]
+    unknown = [n for n in names if n not in _PROVIDERS]
+    if unknown:
+        logger.warning("⚠️ 알 수 없는 warm-up 모델 무시: %s", unknown)
+    return [n for n in names if n in _PROVIDERS]
+
+
+def loaded_models() -> Dict[str, bool]:
+    return {name: factory().loaded for name, factory in _PROVIDERS.items()}
+
+
+def warm_up(names: Iterable[str]) -> Dict[str, Optional[float]]:
+    """지정한 모델을 미리 로드 (이미 로드된 모델은 바로 반환)"""
+    names = list(names)
+    with _warmup_lock:
+        for name in names:
+            _warmup.setdefault(name, None)
+
+    for name in names:
+        t0 = time.perf_counter()
+        try:
+            _PROVIDERS[name]().load()
+        except Exception as e:
+            logger.exception("❌ 모델 warm-up 실패: %s", name)
+            with _warmup_lock:
+                _warmup_errors[name] = str(e)
+            continue
+        elapsed = time.perf_counter() - t0
+        with _warmup_lock:
+            _warmup[name] = elapsed
+        logger.info("🔥 모델 warm-up 완료: %s (%.2fs)", name, elapsed)
+    return warmup_status()
+
+
+def warm_up_in_background(names: Iterable[str]) -> None:
+    names = list(names)
+    if not names:
+        return
+    with _warmup_lock:
+        for name in names:
+            _warmup.setdefault(name, None)
+    threading.Thread(target=warm_up, args=(names,), name="model-warmup", daemon=True).start()
+
+
+def warmup_status() -> Dict[str, Optional[float]]:
+    with _warmup_lock:
+        return dict(_warmup)
+
+
+def readiness() -> Dict[str, object]:
+    """warm-up 요청된 모델이 모두 로드됐으면 ready"""
+    with _warmup_lock:
+        pending = [n for n, sec in _warmup.items() if sec is None and n not in _warmup_errors]
+        failed = dict(_warmup_errors)
+    return {
+        "ready": not pending and not failed,
+        "models": loaded_models(),
+        "warmup_sec": warmup_status(),
+        "warmup_pending": pending,
+        "warmup_errors": failed,
+    }
@@ -1,50 +1,21 @@
-import os
-import json
-import redis
 from datetime import timedelta
 from sqlalchemy.orm import Session
 from app.models import UserSetting
 from app.utils.es import get_es
-from sentence_transformers import SentenceTransformer
-
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
-REDIS_TTL_SEC = int(os.getenv("REDIS_TTL_SEC", "3600"))  # 1시간 기본
-
-r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-
-EMBED_MODEL_PATH = os.getenv("EMBED_MODEL_PATH", "/app/models/embedding")
-embedder = SentenceTransformer(EMBED_MODEL_PATH)
+from app.adapters import redis_io
+from app.services.system_prompt_cache import SystemPromptCache
+from app.pipelines.embedding.cache import cached_embedding
+from app.pipelines.embedding.model import get_provider
 
 
 def append_conversation(room_id: str, user_input: str, assistant_output: str, max_turns: int = 5):
-
-    key = f"chat:{room_id}:messages"
-    history_json = r.get(key)
-    history = json.loads(history_json) if history_json else []
-
-    # 새로운 대화 추가
-    if user_input:
-        history.append({"role": "user", "content": user_input})
-    if assistant_output:
-        history.append({"role": "assistant", "content": assistant_output})
-
-    # 최근 max_turns * 2개 메시지만 유지 (user+assistant 쌍)
-    if len(history) > max_turns * 2:
-        history = history[-max_turns * 2 :]
-
-    r.setex(key, REDIS_TTL_SEC, json.dumps(history, ensure_ascii=False))
+    # user/assistant 한 턴을 Redis list에 한 번에 저장
+    redis_io.append_turn(room_id, user_input, assistant_output, max_turns=max_turns)
 
 
 def get_recent_conversation(room_id: str, limit: int = 5):
-
-    key = f"chat:{room_id}:messages"
-    history_json = r.get(key)
-    if not history_json:
-        return []
-    history = json.loads(history_json)
-    return history[-limit * 2 :]  # 최근 limit턴만 반환
+    # 최근 limit턴(user+assistant 쌍)만 반환
+    return redis_io.get_conversation(room_id, limit=limit * 2)
 
 
 
@@ -81,9 +52,22 @@ def build_system_prompt(session: Session, user_id: str) -> str:
 
 
 
+_prompt_cache = SystemPromptCache(build_system_prompt)
+
+
+def get_system_prompt(session: Session, user_id: str) -> str:
+    """build_system_prompt 캐시 버전 (user_id별 LRU + TTL, 설정 변경 시 pub/sub 무효화)"""
+    return _prompt_cache.get(session, user_id)
+
+
+def system_prompt_cache_stats():
+    return _prompt_cache.stats()
+
+
+
 def search_similar_context_es(query: str, user_id: str, top_k: int = 3, min_score: float = 0.7):
     es = get_es()
-    emb = embedder.encode(query).tolist()
+    emb = cached_embedding(query, get_provider().encode)
 
     body = {
         "knn": {
@@ -0,0 +1,127 @@
+import os
+import json
+import socket
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from app.adapters.kafka_io import make_consumer
+
+logger = logging.getLogger("stream-hub")
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1000"))
+SSE_HUB_POLL_SEC = float(os.getenv("SSE_HUB_POLL_SEC", "0.5"))
+
+# (topic, payload) — payload가 None이면 구독자가 밀려서 끊긴 것
+HubEvent = Tuple[str, Optional[Dict[str, Any]]]
+OVERFLOW_TOPIC = "__overflow__"
+
+
+class StreamHub:
+    """
+    프로세스당 Kafka consumer 1개로 LLM delta/done을 받아서
+    room_id별 asyncio.Queue로 나눠주는 fan-out 허브.
+
+    - consumer는 백그라운드 스레드에서 poll (이벤트 루프 블로킹 없음)
+    - 메시지 key(room_id)로 먼저 거르고, 구독자가 있는 방만 JSON 디코딩
+    - 큐가 가득 찬(느린) 구독자는 큐를 비우고 overflow 이벤트를 넣어 연결을 끊게 함
+    """
+
+    def __init__(self, topics: Iterable[str], queue_size: int = SSE_QUEUE_SIZE):
+        self.topics = list(topics)
+        self.queue_size = queue_size
+        # 프로세스마다 모든 메시지를 받아야 하므로 group.id는 프로세스 고유값
+        self.group_id = f"sse-hub-{socket.gethostname()}-{os.getpid()}"
+
+        self._subs: Dict[str, Set[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # -----------------------
+    # 구독 관리
+    # -----------------------
+    def subscribe(self, room_id: str) -> "asyncio.Queue[HubEvent]":
+        self._ensure_started()
+        q: "asyncio.Queue[HubEvent]" = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subs.setdefault(room_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, room_id: str, q: asyncio.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(room_id)
+            if subs is None:
+                return
+            subs.discard(q)
+            if not subs:
+                del self._subs[room_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
+
+    # -----------------------
+    # consumer 스레드
+    # -----------------------
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sse-stream-hub", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        consumer = make_consumer(
+            topics=self.topics,
+            group_id=self.group_id,
+            auto_offset_reset="latest",
+            enable_autocommit=False,
+        )
+        try:
+            while not self._stop.is_set():
+                msg = consumer.poll(SSE_HUB_POLL_SEC)
+                if msg is None or msg.error():
+                    continue
+
+                key = msg.key().decode() if msg.key() else None
+                with self._lock:
+                    if key is not None and key not in self._subs:
+                        continue
+                try:
+                    data = json.loads(msg.value())
+                except Exception:
+                    continue
+                room_id = data.get("room_id") or key
+
+                with self._lock:
+                    queues = list(self._subs.get(room_id, ()))
+                if queues:
+                    self._loop.call_soon_threadsafe(self._dispatch, queues, (msg.topic(), data))
+        except Exception:
+            logger.exception("❌ SSE 허브 consumer 오류")
+        finally:
+            consumer.close()
+            # 비정상 종료 시 다음 subscribe에서 다시 시작
+            self._thread = None
+
+    @staticmethod
+    def _dispatch(queues, event: HubEvent) -> None:
+        # 이벤트 루프 스레드에서 실행
+        for q in queues:
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                # backpressure: 밀린 구독자는 중간 delta가 빠지지 않도록 끊어버림
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait((OVERFLOW_TOPIC, None))
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=SSE_HUB_POLL_SEC + 5)
@@ -0,0 +1,142 @@
+# app/services/summary_trigger.py
+import os
+import time
+import socket
+import logging
+from typing import List, Optional, Tuple
+
+import redis
+
+from app.adapters import redis_io
+
+logger = logging.getLogger("summary-trigger")
+
+# llm_worker → summary_worker 방 활동 이벤트 (Redis stream)
+ACTIVITY_STREAM = os.getenv("SUMMARY_ACTIVITY_STREAM", "summary:room-activity")
+ACTIVITY_STREAM_MAXLEN = int(os.getenv("SUMMARY_ACTIVITY_STREAM_MAXLEN", "100000"))
+ACTIVITY_GROUP = os.getenv("SUMMARY_ACTIVITY_GROUP", "summary-worker")
+# room_id → 요약 안 된 턴 수
+PENDING_KEY = "summary:unsummarized"
+# room_id → idle 요약 기한 (epoch sec)
+DEADLINE_KEY = "summary:idle-deadline"
+LOCK_PREFIX = "summary:lock:"
+LOCK_TTL_SEC = int(os.getenv("SUMMARY_LOCK_TTL_SEC", "600"))
+
+# 요약 완료 처리: 차감 → 0 이하면 상태 삭제, 남으면 idle 기한 재설정 (중간에 들어온 HINCRBY와 원자적으로)
+_COMPLETE_LUA = """
+local n = redis.call('HINCRBY', KEYS[1], ARGV[1], -tonumber(ARGV[2]))
+if n <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return n
+"""
+
+
+def emit_room_activity(room_id, count: int = 1) -> None:
+    """unsummarized_count 증가와 함께 호출 (llm_worker)"""
+    redis_io.r.xadd(
+        ACTIVITY_STREAM,
+        {"room_id": str(room_id), "count": count, "ts": time.time()},
+        maxlen=ACTIVITY_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+class SummaryTrigger:
+    """
+    이벤트 기반 요약 트리거 상태 (Redis)
+    - 활동 이벤트마다 HINCRBY로 턴 수 누적 → threshold 이상이면 바로 요약 대상
+    - 처음 밀린 턴이 생긴 시각 + idle_sec 을 sorted set에 기한으로 저장 (ZADD NX)
+    - 기한이 지난 방은 ZREM에 성공한 인스턴스 하나만 가져감
+    - 같은 방 요약은 SET NX 락으로 한 번에 하나만
+    """
+
+    def __init__(self, threshold: int, idle_sec: int, consumer: Optional[str] = None,
+                 client: Optional[redis.StrictRedis] = None):
+        self.threshold = threshold
+        self.idle_sec = idle_sec
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.r = client or redis_io.r
+        self._complete = self.r.register_script(_COMPLETE_LUA)
+        # 기동 직후 한 번은 이전에 받고 ack 못 한 이벤트부터 다시 읽음
+        self._read_from = "0"
+
+    # -----------------------
+    # 이벤트 수신
+    # -----------------------
+    def ensure_group(self) -> None:
+        try:
+            self.r.xgroup_create(ACTIVITY_STREAM, ACTIVITY_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read_events(self, block_ms: int, count: int = 100) -> List[Tuple[str, str, int]]:
+        """[(event_id, room_id, count)] — 처리 후 ack() 필요"""
+        resp = self.r.xreadgroup(
+            ACTIVITY_GROUP, self.consumer, {ACTIVITY_STREAM: self._read_from}, count=count, block=max(block_ms, 1)
+        )
+        if self._read_from == "0" and not any(entries for _, entries in resp or []):
+            self._read_from = ">"
+        events = []
+        for _, entries in resp or []:
+            for event_id, fields in entries:
+                events.append((event_id, fields.get("room_id"), int(fields.get("count", 1))))
+        return events
+
+    def ack(self, event_ids: List[str]) -> None:
+        if event_ids:
+            self.r.xack(ACTIVITY_STREAM, ACTIVITY_GROUP, *event_ids)
+
+    # -----------------------
+    # 상태
+    # -----------------------
+    def record_activity(self, room_id: str, count: int = 1, now: Optional[float] = None) -> bool:
+        """누적 턴 수 반영, threshold 이상이면 True"""
+        now = time.time() if now is None else now
+        pipe = self.r.pipeline()
+        pipe.hincrby(PENDING_KEY, room_id, count)
+        pipe.zadd(DEADLINE_KEY, {room_id: now + self.idle_sec}, nx=True)
+        pending, _ = pipe.execute()
+        return pending >= self.threshold
+
+    def seed(self, room_id: str, pending: int, deadline: float) -> None:
+        """기동 시 DB 상태로 초기화 (Redis에 이미 있으면 유지)"""
+        pipe = self.r.pipeline()
+        pipe.hsetnx(PENDING_KEY, room_id, pending)
+        pipe.zadd(DEADLINE_KEY, {room_id: deadline}, nx=True)
+        pipe.execute()
+
+    def pending(self, room_id: str) -> int:
+        return int(self.r.hget(PENDING_KEY, room_id) or 0)
+
+    def next_deadline(self) -> Optional[float]:
+        head = self.r.zrange(DEADLINE_KEY, 0, 0, withscores=True)
+        return head[0][1] if head else None
+
+    def claim_idle(self, now: Optional[float] = None, limit: int = 100) -> List[str]:
+        """기한이 지난 방 (ZREM에 성공한 것만 반환)"""
+        now = time.time() if now is None else now
+        due = self.r.zrangebyscore(DEADLINE_KEY, "-inf", now, start=0, num=limit)
+        return [room_id for room_id in due if self.r.zrem(DEADLINE_KEY, room_id)]
+
+    def try_lock(self, room_id: str) -> bool:
+        return bool(self.r.set(LOCK_PREFIX + room_id, self.consumer, nx=True, ex=LOCK_TTL_SEC))
+
+    def unlock(self, room_id: str) -> None:
+        self.r.delete(LOCK_PREFIX + room_id)
+
+    def retry_later(self, room_id: str, delay_sec: float) -> None:
+        """요약 실패 시 idle 기한을 delay_sec 뒤로 다시 잡음"""
+        self.r.zadd(DEADLINE_KEY, {room_id: time.time() + delay_sec})
+
+    def complete(self, room_id: str, consumed: int, now: Optional[float] = None) -> int:
+        """
+        요약 완료: 요약 시작 시점의 턴 수만큼 차감.
+        요약 중에 새로 들어온 턴이 남아 있으면 idle 기한을 지금부터 다시 잡고 남은 수를 반환.
+        """
+        now = time.time() if now is None else now
+        return int(self._complete(keys=[PENDING_KEY, DEADLINE_KEY], args=[room_id, consumed, now + self.idle_sec]))
@@ -0,0 +1,143 @@
+# app/services/system_prompt_cache.py
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.adapters import redis_io
+
+logger = logging.getLogger("system-prompt-cache")
+
+SYSTEM_PROMPT_CACHE_SIZE = int(os.getenv("SYSTEM_PROMPT_CACHE_SIZE", "10000"))
+SYSTEM_PROMPT_CACHE_TTL_SEC = float(os.getenv("SYSTEM_PROMPT_CACHE_TTL_SEC", "300"))
+# Backend(UserSettingService)가 설정 변경 후 user_id를 발행, "*"는 전체 무효화
+USER_SETTING_INVALIDATE_CHANNEL = os.getenv("USER_SETTING_INVALIDATE_CHANNEL", "user-setting.invalidate")
+
+Builder = Callable[[Session, object], str]
+
+
+class SystemPromptCache:
+    """
+    user_id → system prompt LRU + TTL 캐시
+    - UserSetting은 거의 안 바뀌고 매 메시지마다 읽히므로 DB 조회를 캐시로 대체
+    - Redis pub/sub 무효화 메시지를 받으면 해당 user_id 삭제
+    - 무효화 메시지를 놓쳐도 TTL이 지나면 다시 조회
+    """
+
+    def __init__(
+        self,
+        builder: Builder,
+        maxsize: int = SYSTEM_PROMPT_CACHE_SIZE,
+        ttl_sec: float = SYSTEM_PROMPT_CACHE_TTL_SEC,
+    ):
+        self.builder = builder
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        # user_id → (만료 시각, prompt)
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 조회 중에 무효화가 들어오면 오래된 값을 넣지 않도록 세대 번호로 확인
+        self._gen = 0
+        self.hits = 0
+        self.misses = 0
+        _register(self)
+
+    def get(self, session: Session, user_id) -> str:
+        if _listener is None:
+            start_invalidation_listener()
+
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            gen = self._gen
+
+        prompt = self.builder(session, user_id)
+        if self.maxsize > 0:
+            with self._lock:
+                if gen != self._gen:
+                    return prompt
+                self._data[key] = (now + self.ttl_sec, prompt)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return prompt
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            self._gen += 1
+            self._data.pop(str(user_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._gen += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# -----------------------
+# 무효화 구독 (프로세스당 스레드 1개, 모든 캐시에 적용)
+# -----------------------
+_caches: List[SystemPromptCache] = []
+_listener: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+
+
+def _register(cache: SystemPromptCache) -> None:
+    with _listener_lock:
+        _caches.append(cache)
+
+
+def _apply_invalidation(user_id: str) -> None:
+    for cache in list(_caches):
+        if user_id == "*":
+            cache.clear()
+        else:
+            cache.invalidate(user_id)
+
+
+def _listen() -> None:
+    while True:
+        pubsub = redis_io.r.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(USER_SETTING_INVALIDATE_CHANNEL)
+            # (재)연결 사이에 놓친 메시지가 있을 수 있으므로 전부 비움
+            _apply_invalidation("*")
+            for msg in pubsub.listen():
+                if msg.get("type") == "message":
+                    _apply_invalidation(str(msg["data"]))
+        except Exception as e:
+            logger.warning("⚠️ system prompt 무효화 구독 끊김, 재연결: %s", e)
+            time.sleep(1.0)
+        finally:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+
+def start_invalidation_listener() -> None:
+    """무효화 구독 스레드 시작 (여러 번 호출해도 1개만 실행)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        _listener = threading.Thread(target=_listen, name="system-prompt-invalidate", daemon=True)
+        _listener.start()
+
+
+def publish_invalidation(user_id="*") -> None:
+    """설정 변경 시 모든 프로세스의 캐시 무효화"""
+    redis_io.r.publish(USER_SETTING_INVALIDATE_CHANNEL, str(user_id))
@@ -1,5 +1,5 @@
 # app/utils/es.py
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, AsyncElasticsearch
 from app.core.config import get_settings
 from typing import Optional
 import time
@@ -9,6 +9,7 @@ import os
 
 _settings = get_settings()
 _es: Optional[Elasticsearch] = None
+_async_es: Optional[AsyncElasticsearch] = None
 
 def es_health_ok() -> bool:
     try:
@@ -29,6 +30,21 @@ def get_es() -> Elasticsearch:
     return _es
 
 
+def get_async_es() -> AsyncElasticsearch:
+    """
+    async 엔드포인트용 ES 클라이언트 (aiohttp 커넥션 풀 공유)
+    """
+    global _async_es
+    if _async_es is None:
+        _async_es = AsyncElasticsearch(
+            _settings.ELASTICSEARCH_URL,
+            request_timeout=10,
+            retry_on_timeout=True,
+            max_retries=3,
+        )
+    return _async_es
+
+
 def es_ping() -> bool:
     try:
         return get_es().ping()
@@ -88,3 +104,16 @@ def close_es():
         except Exception:
             pass
         _es = None
+
+
+async def close_async_es():
+    """
+    Close async ES client (for shutdown)
+    """
+    global _async_es
+    if _async_es is not None:
+        try:
+            await _async_es.close()
+        except Exception:
+            pass
+        _async_es = None
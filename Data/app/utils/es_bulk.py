@@ -0,0 +1,147 @@
+# app/utils/es_bulk.py
+import uuid
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from elasticsearch import Elasticsearch, helpers
+
+from app.utils.es import get_es
+
+logger = logging.getLogger("es-bulk")
+
+
+class BulkIndexer:
+    """
+    문서를 메모리에 모았다가 _bulk 요청으로 한 번에 저장하는 버퍼.
+    - max_docs 만큼 쌓이거나 flush_interval_sec 가 지나면 flush
+    - 429(Too Many Requests)는 streaming_bulk가 지수 backoff로 재시도
+    - 연결 오류로 실패한 배치는 응답을 받지 못한 문서만 버퍼에 되돌려 다음 flush에서 재시도
+      (적재 시 _id를 부여해 두므로 재전송돼도 중복 문서가 생기지 않음)
+    - 버퍼는 max_buffer_docs 를 넘지 않음 (넘으면 오래된 문서부터 버림)
+    """
+
+    def __init__(
+        self,
+        index: str,
+        es_factory: Callable[[], Elasticsearch] = get_es,
+        max_docs: int = 500,
+        flush_interval_sec: float = 1.0,
+        max_buffer_docs: int = 10000,
+        max_retries: int = 5,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 10.0,
+    ):
+        self.index = index
+        self._es_factory = es_factory
+        self.max_docs = max_docs
+        self.flush_interval_sec = flush_interval_sec
+        self.max_buffer_docs = max_buffer_docs
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        # bulk action ({"_index", "_id", "_source"}) — _id는 add 시점에 고정
+        self._buf: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    # -----------------------
+    # 적재
+    # -----------------------
+    def add(self, doc: Dict[str, Any]) -> None:
+        self.add_many([doc])
+
+    def add_many(self, docs: Iterable[Dict[str, Any]]) -> None:
+        actions = [{"_index": self.index, "_id": uuid.uuid4().hex, "_source": doc} for doc in docs]
+        if not actions:
+            return
+        with self._lock:
+            self._buf.extend(actions)
+            self._trim_locked()
+            should_flush = len(self._buf) >= self.max_docs
+        self._ensure_thread()
+        if should_flush:
+            self._safe_flush()
+
+    def _trim_locked(self) -> None:
+        overflow = len(self._buf) - self.max_buffer_docs
+        if overflow > 0:
+            del self._buf[:overflow]
+            self.dropped += overflow
+            logger.warning("⚠️ ES bulk 버퍼 초과로 문서 %d건 폐기 (index=%s)", overflow, self.index)
+
+    # -----------------------
+    # flush
+    # -----------------------
+    def flush(self) -> Tuple[int, int]:
+        """
+        버퍼 전체를 저장하고 (성공 건수, 실패 건수) 반환.
+        연결 오류 시 문서를 버퍼에 되돌리고 예외를 다시 던진다.
+        """
+        with self._flush_lock:
+            with self._lock:
+                actions, self._buf = self._buf, []
+            if not actions:
+                return 0, 0
+
+            ok, failed = 0, 0
+            # 응답을 받은 문서 (_id) — 재시도가 섞이면 응답 순서가 입력 순서와 다름
+            done = set()
+            try:
+                for success, info in helpers.streaming_bulk(
+                    self._es_factory(),
+                    (dict(a) for a in actions),
+                    chunk_size=self.max_docs,
+                    max_retries=self.max_retries,
+                    initial_backoff=self.initial_backoff,
+                    max_backoff=self.max_backoff,
+                    raise_on_error=False,
+                ):
+                    done.add(next(iter(info.values()), {}).get("_id"))
+                    if success:
+                        ok += 1
+                    else:
+                        failed += 1
+                        logger.warning("⚠️ ES bulk 문서 저장 실패 (index=%s): %s", self.index, info)
+            except Exception:
+                remaining = [a for a in actions if a["_id"] not in done]
+                with self._lock:
+                    self._buf[:0] = remaining
+                    self._trim_locked()
+                raise
+            return ok, failed
+
+    def _safe_flush(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("❌ ES bulk flush 실패 (index=%s)", self.index)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or self.flush_interval_sec <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"es-bulk-{self.index}", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval_sec):
+            self._safe_flush()
+
+    def close(self) -> None:
+        """종료 시 타이머 스레드 정지 후 남은 문서 flush"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval_sec + 1)
+        self._safe_flush()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buf)
@@ -0,0 +1,119 @@
+# app/utils/tokens.py
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "10000"))
+TOKEN_COUNT_THREADS = int(os.getenv("TOKEN_COUNT_THREADS", "4"))
+# 이보다 긴 텍스트(LLM 완성 답변 등)는 재사용 가능성이 낮아 캐시하지 않음
+TOKEN_COUNT_CACHE_MAX_CHARS = int(os.getenv("TOKEN_COUNT_CACHE_MAX_CHARS", "2000"))
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: Optional[str] = None) -> tiktoken.Encoding:
+    """
+    모델별 tiktoken 인코더 (프로세스 내 1회만 로드)
+    모델을 모르면 cl100k_base로 대체
+    """
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except Exception:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+class _CountCache:
+    """(인코딩 이름, 텍스트) → 토큰 수 LRU"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[int]:
+        with self._lock:
+            val = self._data.get(key)
+            if val is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return val
+
+    def put(self, key: Tuple[str, str], val: int) -> None:
+        if self.maxsize <= 0 or len(key[1]) > TOKEN_COUNT_CACHE_MAX_CHARS:
+            return
+        with self._lock:
+            self._data[key] = val
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_cache = _CountCache(TOKEN_COUNT_CACHE_SIZE)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """단일 텍스트 토큰 수"""
+    if not text:
+        return 0
+    enc = get_encoder(model)
+    key = (enc.name, text)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    n = len(enc.encode_ordinary(text))
+    _cache.put(key, n)
+    return n
+
+
+def count_tokens_batch(texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+    """
+    여러 텍스트 토큰 수를 한 번에 계산
+    캐시에 없는 텍스트만 중복 제거 후 tiktoken 배치 인코딩(멀티스레드)으로 처리
+    """
+    enc = get_encoder(model)
+    counts: Dict[str, int] = {}
+    pending: List[str] = []
+    for text in texts:
+        if not text or text in counts:
+            continue
+        cached = _cache.get((enc.name, text))
+        if cached is not None:
+            counts[text] = cached
+        else:
+            counts[text] = 0
+            pending.append(text)
+
+    if pending:
+        encoded = enc.encode_ordinary_batch(pending, num_threads=TOKEN_COUNT_THREADS)
+        for text, ids in zip(pending, encoded):
+            counts[text] = len(ids)
+            _cache.put((enc.name, text), len(ids))
+
+    return [counts.get(text, 0) if text else 0 for text in texts]
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    """OpenAI 스타일 messages 토큰 수 ("role: content" 줄 단위 합산)"""
+    text = ""
+    for m in messages:
+        text += m["role"] + ": " + m["content"] + "\n"
+    return count_tokens(text, model)
+
+
+def cache_stats() -> Dict[str, int]:
+    return _cache.stats()
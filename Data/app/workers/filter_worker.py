@@ -1,16 +1,19 @@
 import os
 import json
+import uuid
 import logging
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timezone, timedelta
-import tiktoken
 from app.services import error_service, filter_service
-from app.adapters.kafka_io import make_consumer, make_producer, publish
-from app.pipelines.filter.filter_classifier import filter_classifier
-from app.adapters.db import get_session
+from app.adapters.kafka_io import make_consumer, make_producer, publish, flush_producer, flush_all
+from app.pipelines.filter.filter_classifier import filter_classifier_batch
+from app.adapters.db_writer import BatchWriter, FailedWrite
 from app.models import FilterResult, TokenUsage
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from app.pipelines.filter.model import get_filter_backend, classify_many, classify_cache_stats
 from app.contracts.raw_filtered import RawFilteredMessage
+from app.contracts.token_usage_event import TokenUsageEvent
 from app.utils.usage import estimate_usage_by_tokens
+from app.utils import tokens
 import dateutil.parser
 
 
@@ -35,13 +38,19 @@ logger = logging.getLogger("filter-worker")
 
 logging.getLogger("elastic_transport.transport").setLevel(logging.WARNING)
 
-FILTER_MODEL_PATH = os.getenv("FILTER_MODEL_PATH", "/app/models/filter")
-
-tokenizer = AutoTokenizer.from_pretrained(FILTER_MODEL_PATH, local_files_only=True)
-model = AutoModelForSequenceClassification.from_pretrained(FILTER_MODEL_PATH, local_files_only=True)
+# 워커는 기동 시 바로 로드 (FILTER_MODEL_PATH, FILTER_BACKEND)
+get_filter_backend()
 
 KAFKA_IN = os.getenv("KAFKA_TOPIC_IN_RAW", "chat.raw.filtered.v1")
 KAFKA_OUT_FILTER = os.getenv("KAFKA_TOPIC_FILTER_RESULT", "chat.filter.result.v1")
+# token_usage 집계용 이벤트 (빈 값이면 발행 안 함)
+KAFKA_OUT_USAGE = os.getenv("KAFKA_TOPIC_TOKEN_USAGE", "chat.token.usage.v1")
+# 재시도까지 실패한 DB 쓰기 (커밋 전에 발행해서 유실 방지)
+KAFKA_OUT_DB_DLQ = os.getenv("KAFKA_TOPIC_DB_DLQ", "chat.db.dlq.v1")
+
+# 마이크로 배치: 최대 N건 또는 T ms 동안 모아서 한 번에 처리
+FILTER_BATCH_SIZE = int(os.getenv("FILTER_BATCH_SIZE", "64"))
+FILTER_BATCH_TIMEOUT_MS = int(os.getenv("FILTER_BATCH_TIMEOUT_MS", "200"))
 
 KST = timezone(timedelta(hours=9))
 
@@ -112,292 +121,296 @@ def log_filter_process(original_text: str, decision: dict, mode: str = "ml", fil
 
 def estimate_tokens(text: str) -> int:
     try:
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text))
+        return tokens.count_tokens(text)
     except Exception as e:
         logger.warning("⚠️ 토큰 개수 추정 실패: %s", e)
         return 0
 
 
-def run_filter_worker():
-    consumer = make_consumer([KAFKA_IN], group_id="filter-worker")
-    producer = make_producer()
-
-    while True:
-        msg = consumer.poll(1.0)
-        if msg is None:
-            continue
-        if msg.error():
-            logger.error("❌ Kafka 오류: %s", msg.error())
-            continue
+def build_token_usage(message_id, user_id, prompt_tokens: int, saved_tokens: int,
+                      now_utc: datetime, billed: bool = True) -> TokenUsage:
+    """billed=False면 LLM 호출이 없는 DROP 건이므로 비용/에너지는 0으로 기록"""
+    cost_usd, energy_wh, co2_g, _ = estimate_usage_by_tokens(prompt_tokens) if billed else (0, 0, 0, 0)
+    saved_cost, saved_energy, saved_co2, _ = estimate_usage_by_tokens(saved_tokens)
+    return TokenUsage(
+        id=uuid.uuid4(),  # 집계 이벤트 event_id와 같은 값
+        message_id=message_id,
+        user_id=user_id,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=0,
+        total_tokens=prompt_tokens,
+        cost_usd=cost_usd,
+        energy_wh=energy_wh,
+        co2_g=co2_g,
+        saved_tokens=saved_tokens,
+        saved_cost_usd=saved_cost,
+        saved_energy_wh=saved_energy,
+        saved_co2_g=saved_co2,
+        created_at=now_utc,
+    )
+
+
+def parse_event(msg) -> Optional[Dict[str, Any]]:
+    if msg.error():
+        logger.error("❌ Kafka 오류: %s", msg.error())
+        return None
+    try:
+        ev = json.loads(msg.value().decode("utf-8"))
+    except Exception as e:
+        logger.error("❌ Kafka 메시지 디코딩 실패: %s", e)
+        return None
 
-        try:
-            ev = json.loads(msg.value().decode("utf-8"))
-            # logger.info("📩 Kafka 메시지 수신: %s", ev)
-        except Exception as e:
-            logger.error("❌ Kafka 메시지 디코딩 실패: %s", e)
-            continue
-
-        trace_id = ev.get("trace_id")
-        room_id = ev.get("room_id") or (msg.key().decode() if msg.key() else None)
-        message_id = ev.get("message_id")
-        user_id = ev.get("user_id")
-        user_id = int(user_id) if user_id is not None else None
-        text = ev.get("text", "")
-        final_text = ev.get("final_text", "")
-        mode = ev.get("mode", "pass")
-        top_category = ev.get("top_category", "no_meaning")
-        now_utc = datetime.now(timezone.utc)
-
-        if mode == "auto":
-            token_count = estimate_tokens(text)
-            saved_cost, saved_energy, saved_co2, _ = estimate_usage_by_tokens(token_count)
+    # 형식이 잘못된 메시지는 건너뜀 (예외로 워커가 죽으면 같은 배치를 재시작마다 반복)
+    try:
+        user_id = int(ev["user_id"]) if ev.get("user_id") is not None else None
+    except (TypeError, ValueError) as e:
+        logger.error("❌ 잘못된 user_id, 메시지 건너뜀 (trace_id=%s): %r", ev.get("trace_id"), ev.get("user_id"))
+        error_service.save_error(ev.get("trace_id"), "INVALID_EVENT", e)
+        return None
+
+    return {
+        "ev": ev,
+        "trace_id": ev.get("trace_id"),
+        "room_id": ev.get("room_id") or (msg.key().decode() if msg.key() else None),
+        "message_id": ev.get("message_id"),
+        "user_id": user_id,
+        "text": ev.get("text", ""),
+        "final_text": ev.get("final_text", ""),
+        "mode": ev.get("mode", "pass"),
+        "top_category": ev.get("top_category", "no_meaning"),
+        "now_utc": datetime.now(timezone.utc),
+    }
+
+
+def build_auto_outcome(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """규칙 기반 DROP (Spark에서 mode=auto로 넘어온 메시지)"""
+    ev, text = ctx["ev"], ctx["text"]
+    token_count = estimate_tokens(text)
+
+    fr = FilterResult(
+        trace_id=ctx["trace_id"],
+        chat_room_id=ctx["room_id"],
+        message_id=ctx["message_id"],
+        stage="rule",
+        action="DROP",
+        rule_name=ctx["top_category"],
+        created_at=ctx["now_utc"],
+    )
+    tu = build_token_usage(ctx["message_id"], ctx["user_id"], token_count, token_count, ctx["now_utc"], billed=False)
+
+    raw = type("RawObj", (), ev)()
+    es_docs = filter_service.build_es_docs(raw, {"action": "DROP", "drop_logs": []})
+
+    value = {
+        "trace_id": ctx["trace_id"],
+        "room_id": ctx["room_id"],
+        "message_id": ctx["message_id"],
+        "stage": "filler_removal",
+        "stage_order": 1,
+        "timestamp": normalize_timestamp(ev.get("timestamp")),
+        "original_text": text,
+        "cleaned_text": "",
+        "detected_phrases": ev.get("filtered_words_details", [[], []])[0],
+        "decision": {"action": "DROP", "reason_type": ctx["top_category"]},
+        "schema_version": "1.0.0",
+    }
+
+    log_filter_process(text, {}, mode="rule", filtered_words_details=ev.get("filtered_words_details"))
+    return {
+        "ctx": ctx,
+        "rows": [fr, tu],
+        "es_docs": es_docs,
+        "value": value,
+        "headers": [("traceparent", ctx["trace_id"].encode())] if ctx["trace_id"] else None,
+        "timing_label": "규칙 기반 DROP",
+    }
+
+
+def build_ml_outcome(ctx: Dict[str, Any], decision: Dict[str, Any]) -> Dict[str, Any]:
+    """ML 분류 결과 기반 DROP / PASS"""
+    ev, text, final_text = ctx["ev"], ctx["text"], ctx["final_text"]
+    log_filter_process(text, decision, mode="ml", filtered_words_details=ev.get("filtered_words_details"))
+
+    dropped = decision["status"] == "drop"
+    raw = RawFilteredMessage(
+        trace_id=ctx["trace_id"],
+        room_id=ctx["room_id"],
+        message_id=ctx["message_id"],
+        user_id=ctx["user_id"],
+        text=text,
+        final_text="" if dropped else (decision.get("content") or ""),
+        timestamp=normalize_timestamp(ev.get("timestamp")),
+        schema_version=ev.get("schema_version", "1.0.0"),
+    )
+
+    rows = []
+    original_tokens = estimate_tokens(text)
+    if dropped:
+        rows.append(filter_service.build_filter_result(raw, decision, rule_name="no_meaning"))
+        rows.append(build_token_usage(
+            ctx["message_id"], ctx["user_id"], original_tokens, original_tokens, ctx["now_utc"], billed=False
+        ))
+    else:
+        cleaned_text = decision.get("content") or (final_text or text)
+        cleaned_tokens = estimate_tokens(cleaned_text)
+        saved_tokens = max(0, original_tokens - cleaned_tokens)
+        if decision.get("drop_logs"):
+            rows.append(filter_service.build_filter_result(raw, decision, rule_name="no_meaning"))
+        rows.append(build_token_usage(ctx["message_id"], ctx["user_id"], cleaned_tokens, saved_tokens, ctx["now_utc"]))
+
+    value = {
+        "trace_id": ctx["trace_id"],
+        "room_id": ctx["room_id"],
+        "message_id": ctx["message_id"],
+        "stage": "intent_classifier",
+        "stage_order": 2,
+        "timestamp": normalize_timestamp(ev.get("timestamp")),
+        "original_text": text,
+        "cleaned_text": (final_text or text) if dropped else (decision.get("content") or text),
+        "decision": {
+            "action": "DROP" if dropped else "PASS",
+            "score": decision.get("score"),
+            "threshold": decision.get("threshold"),
+            "reason_type": decision.get("label"),
+            "reason_text": decision.get("reason_text"),
+        },
+        "explanations": decision.get("explanations", []),
+        "schema_version": "1.0.0",
+    }
+    if not dropped:
+        value["user_id"] = ctx["user_id"]
+
+    return {
+        "ctx": ctx,
+        "rows": rows,
+        "es_docs": filter_service.build_es_docs(raw, decision),
+        "value": value,
+        "headers": None,
+        "timing_label": "ML 기반 DROP" if dropped else "ML PASS",
+    }
+
+
+def process_batch(msgs, producer, writer: BatchWriter, usage_events: List[TokenUsageEvent]) -> None:
+    """
+    배치 처리 결과: FilterResult/TokenUsage는 writer에 예약, TokenUsage 이벤트는 usage_events에 모아 두고
+    commit_offsets()에서 DB 저장이 끝난 행만 발행
+    """
+    contexts = [ctx for ctx in (parse_event(m) for m in msgs) if ctx is not None]
+    if not contexts:
+        return
+
+    ml_contexts = [ctx for ctx in contexts if ctx["mode"] != "auto"]
+    # 추론은 공용 스케줄러 스레드에서 (torch 스레드 수 FILTER_TORCH_THREADS로 고정)
+    decisions = filter_classifier_batch(
+        [ctx["final_text"] or ctx["text"] for ctx in ml_contexts], classify=classify_many
+    )
+    decision_by_ctx = {id(ctx): d for ctx, d in zip(ml_contexts, decisions)}
+    logger.debug("🗂️ 분류 결과 캐시: %s", classify_cache_stats())
+
+    # 원문/정제문 토큰 수를 배치로 미리 계산 (이후 estimate_tokens는 캐시 조회)
+    try:
+        tokens.count_tokens_batch(
+            [ctx["text"] for ctx in contexts]
+            + [d.get("content") or (ctx["final_text"] or ctx["text"]) for ctx, d in zip(ml_contexts, decisions)]
+        )
+    except Exception as e:
+        logger.warning("⚠️ 토큰 개수 배치 추정 실패: %s", e)
 
-            try:
-                with get_session() as session:
-                    fr = FilterResult(
-                        trace_id=trace_id,
-                        chat_room_id=room_id,
-                        message_id=message_id,
-                        stage="rule",
-                        action="DROP",
-                        rule_name=top_category,
-                        created_at=now_utc,
-                    )
-                    session.add(fr)
-
-                    tu = TokenUsage(
-                        message_id=message_id,
-                        user_id=user_id,
-                        prompt_tokens=token_count,
-                        completion_tokens=0,
-                        total_tokens=token_count,
-                        cost_usd=0,
-                        energy_wh=0,
-                        co2_g=0,
-                        saved_tokens=token_count,
-                        saved_cost_usd=saved_cost,
-                        saved_energy_wh=saved_energy,
-                        saved_co2_g=saved_co2,
-                        created_at=now_utc,
-                    )
-                    session.add(tu)
-                    session.commit()
-            except Exception as e:
-                error_service.save_error(trace_id, "DB_INSERT_ERROR", e)
+    outcomes = []
+    for ctx in contexts:
+        if ctx["mode"] == "auto":
+            outcomes.append(build_auto_outcome(ctx))
+        else:
+            outcomes.append(build_ml_outcome(ctx, decision_by_ctx[id(ctx)]))
 
-            try:
-                raw = type("RawObj", (), ev)()
-                details = ev.get("filtered_words_details", [[], []])
-                words = details[0] if len(details) > 0 else []
-                labels = details[1] if len(details) > 1 else []
+    # FilterResult/TokenUsage는 write-behind로 모았다가 오프셋 커밋 직전에 한 트랜잭션으로 저장
+    for oc in outcomes:
+        writer.add_all(oc["rows"], trace_id=oc["ctx"]["trace_id"])
 
-                for w, l in zip(words, labels):
-                    es_decision = {
-                        "action": "DROP",
-                        "cleaned_text": "",
-                        "original_text": text,
-                        "drop_logs": {"word": w, "label": l},
-                        "reason_type": l,
-                        "explanations": [],
-                    }
-                    filter_service.save_to_es(raw, es_decision)
-            except Exception as e:
-                logger.exception("❌ ES 저장 실패 (AUTO)")
-                error_service.save_error(trace_id, "ES_SAVE_ERROR", e)
-
-            publish(
-                producer,
-                KAFKA_OUT_FILTER,
-                key=room_id,
-                value={
-                    "trace_id": trace_id,
-                    "room_id": room_id,
-                    "message_id": message_id,
-                    "stage": "filler_removal",
-                    "stage_order": 1,
-                    "timestamp": normalize_timestamp(ev.get("timestamp")),
-                    "original_text": text,
-                    "cleaned_text": "",
-                    "detected_phrases": ev.get("filtered_words_details", [[], []])[0],
-                    "decision": {"action": "DROP", "reason_type": top_category},
-                    "schema_version": "1.0.0",
-                },
-                headers=[("traceparent", trace_id.encode())] if trace_id else None,
+    try:
+        filter_service.bulk_index_es([doc for oc in outcomes for doc in oc["es_docs"]])
+    except Exception as e:
+        logger.exception("❌ ES 배치 저장 실패")
+        for oc in outcomes:
+            if oc["es_docs"]:
+                error_service.save_error(oc["ctx"]["trace_id"], "ES_SAVE_ERROR", e)
+
+    for oc in outcomes:
+        publish(
+            producer,
+            KAFKA_OUT_FILTER,
+            key=oc["ctx"]["room_id"],
+            value=oc["value"],
+            headers=oc["headers"],
+        )
+        if KAFKA_OUT_USAGE:
+            usage_events.extend(
+                TokenUsageEvent.from_row(row, source="filter") for row in oc["rows"] if isinstance(row, TokenUsage)
             )
+    # 오프셋 커밋 전에 배치 결과가 모두 브로커에 도달해야 함
+    # (횟수 제한, 실패하면 예외로 워커 종료 → 커밋 안 된 배치는 재시작 후 다시 처리)
+    flush_all(producer)
 
-            log_filter_process(text, {}, mode="rule", filtered_words_details=ev.get("filtered_words_details"))
-            done_at = int(datetime.now(timezone.utc).timestamp() * 1000)
-            produced_at = normalize_timestamp(ev.get("timestamp"))
-            total_pipeline_ms = done_at - produced_at
-            logger.info(f"🏁 전체 파이프라인 처리 시간 (규칙 기반 DROP): {total_pipeline_ms}ms")
+    done_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+    for oc in outcomes:
+        produced_at = normalize_timestamp(oc["ctx"]["ev"].get("timestamp", done_at))
+        logger.info(f"🏁 전체 파이프라인 처리 시간 ({oc['timing_label']}): {done_at - produced_at}ms")
 
 
-        else:
-            decision = filter_classifier(final_text or text, model, tokenizer)
-            #logger.info("🤖 ML 분류 결과: %s", decision)
-
-            fwd = ev.get("filtered_words_details")
-            log_filter_process(text, decision, mode="ml", filtered_words_details=fwd)
-
-            if decision["status"] == "drop":
-                original_tokens = estimate_tokens(text)
-                saved_cost, saved_energy, saved_co2, _ = estimate_usage_by_tokens(original_tokens)
-
-                raw = RawFilteredMessage(
-                    trace_id=trace_id,
-                    room_id=room_id,
-                    message_id=message_id,
-                    user_id=user_id,
-                    text=text,
-                    final_text="",
-                    timestamp= normalize_timestamp(ev.get("timestamp")),
-                    schema_version=ev.get("schema_version", "1.0.0"),
-                )
-                filter_service.save_filter_results(raw, decision, rule_name="no_meaning")
-
-                try:
-                    with get_session() as session:
-                        tu = TokenUsage(
-                            message_id=message_id,
-                            user_id=user_id,
-                            prompt_tokens=original_tokens,
-                            completion_tokens=0,
-                            total_tokens=original_tokens,
-                            cost_usd=0,
-                            energy_wh=0,
-                            co2_g=0,
-                            saved_tokens=original_tokens,
-                            saved_cost_usd=saved_cost,
-                            saved_energy_wh=saved_energy,
-                            saved_co2_g=saved_co2,
-                            created_at=now_utc,
-                        )
-                        session.add(tu)
-                        session.commit()
-                except Exception as e:
-                    logger.exception("❌ DB 저장 실패 (ML DROP)")
-                    error_service.save_error(trace_id, "DB_INSERT_ERROR", e)
-
-                try:
-                    filter_service.save_to_es(raw, decision)
-                except Exception as e:
-                    logger.exception("❌ ES 저장 실패 (ML DROP)")
-                    error_service.save_error(trace_id, "ES_SAVE_ERROR", e)
-
-                publish(
-                    producer,
-                    KAFKA_OUT_FILTER,
-                    key=room_id,
-                    value={
-                        "trace_id": trace_id,
-                        "room_id": room_id,
-                        "message_id": message_id,
-                        "stage": "intent_classifier",
-                        "stage_order": 2,
-                        "timestamp": normalize_timestamp(ev.get("timestamp")),
-                        "original_text": text,
-                        "cleaned_text": final_text or text,
-                        "decision": {
-                            "action": "DROP",
-                            "score": decision.get("score"),
-                            "threshold": decision.get("threshold"),
-                            "reason_type": decision.get("label"),
-                            "reason_text": decision.get("reason_text"),
-                        },
-                        "explanations": decision.get("explanations", []),
-                        "schema_version": "1.0.0",
-                    },
-                )
-
-                done_at = int(datetime.now(timezone.utc).timestamp() * 1000)
-                produced_at = normalize_timestamp(ev.get("timestamp", done_at))
-                total_pipeline_ms = done_at - produced_at
-                logger.info(f"🏁 전체 파이프라인 처리 시간 (ML 기반 DROP): {total_pipeline_ms}ms")
+def _save_db_error(trace_id, e):
+    error_service.save_error(trace_id, "DB_INSERT_ERROR", e)
 
-            else:
-                raw = RawFilteredMessage(
-                    trace_id=trace_id,
-                    room_id=room_id,
-                    message_id=message_id,
-                    user_id=user_id,
-                    text=text,
-                    final_text=decision.get("content") or "",
-                    timestamp=normalize_timestamp(ev.get("timestamp")),
-                    schema_version=ev.get("schema_version", "1.0.0"),
-                )
-
-                original_tokens = estimate_tokens(text)
-                cleaned_text = decision.get("content") or (final_text or text)
-                cleaned_tokens = estimate_tokens(cleaned_text)
-                saved_tokens = max(0, original_tokens - cleaned_tokens)
-
-                cost_usd, energy_wh, co2_g, _ = estimate_usage_by_tokens(cleaned_tokens)
-                saved_cost, saved_energy, saved_co2, _ = estimate_usage_by_tokens(saved_tokens)
-
-                if decision.get("drop_logs"):
-                    filter_service.save_filter_results(raw, decision, rule_name="no_meaning")
-
-                try:
-                    with get_session() as session:
-                        tu = TokenUsage(
-                            message_id=message_id,
-                            user_id=user_id,
-                            prompt_tokens=cleaned_tokens,
-                            completion_tokens=0,
-                            total_tokens=cleaned_tokens,
-                            cost_usd=cost_usd,
-                            energy_wh=energy_wh,
-                            co2_g=co2_g,
-                            saved_tokens=saved_tokens,
-                            saved_cost_usd=saved_cost,
-                            saved_energy_wh=saved_energy,
-                            saved_co2_g=saved_co2,
-                            created_at=now_utc,
-                        )
-                        session.add(tu)
-                        session.commit()
-                except Exception as e:
-                    logger.exception("❌ DB 저장 실패 (ML PASS)")
-                    error_service.save_error(trace_id, "DB_INSERT_ERROR", e)
-
-                try:
-                    filter_service.save_to_es(raw, decision)
-                except Exception as e:
-                    logger.exception("❌ ES 저장 실패 (ML PASS)")
-                    error_service.save_error(trace_id, "ES_SAVE_ERROR", e)
-
-                publish(
-                    producer,
-                    KAFKA_OUT_FILTER,
-                    key=room_id,
-                    value={
-                        "trace_id": trace_id,
-                        "room_id": room_id,
-                        "user_id": user_id,
-                        "message_id": message_id,
-                        "stage": "intent_classifier",
-                        "stage_order": 2,
-                        "timestamp": normalize_timestamp(ev.get("timestamp")),
-                        "original_text": text,
-                        "cleaned_text": decision.get("content") or text,
-                        "decision": {
-                            "action": "PASS",
-                            "score": decision.get("score"),
-                            "threshold": decision.get("threshold"),
-                            "reason_type": decision.get("label"),
-                            "reason_text": decision.get("reason_text"),
-                        },
-                        "explanations": decision.get("explanations", []),
-                        "schema_version": "1.0.0",
-                    },
-                )
-                done_at = int(datetime.now(timezone.utc).timestamp() * 1000)
-                produced_at = normalize_timestamp(ev.get("timestamp", done_at))
-                total_pipeline_ms = done_at - produced_at
-                logger.info(f"🏁 전체 파이프라인 처리 시간 (ML PASS): {total_pipeline_ms}ms")
+
+def publish_dead_letters(producer, failed: List[FailedWrite]) -> None:
+    for f in failed:
+        publish(producer, KAFKA_OUT_DB_DLQ, key=f.trace_id, value={**f.to_dict(), "worker": "filter-worker"})
+    if failed:
+        logger.error("❌ DB 저장 실패 %d건 dead-letter 발행 (%s)", len(failed), KAFKA_OUT_DB_DLQ)
+
+
+def commit_offsets(consumer, producer, writer: BatchWriter, usage_events: List[TokenUsageEvent]) -> None:
+    """
+    write-behind flush → 실패 항목 dead-letter → 저장된 TokenUsage만 집계 이벤트 발행
+    → 브로커 도달 확인 → 오프셋 커밋
+    """
+    failed = writer.flush()
+    publish_dead_letters(producer, failed)
+    # 저장 실패한 행의 이벤트를 보내면 스트리밍 집계가 token_usage보다 커짐
+    failed_ids = {str(f.params.get("id")) for f in failed if f.table == TokenUsage.__tablename__}
+    for event in usage_events:
+        if event.event_id not in failed_ids:
+            publish(producer, KAFKA_OUT_USAGE, key=event.user_id, value=event.to_dict())
+    if failed or usage_events:
+        flush_all(producer)
+    usage_events.clear()
+    consumer.commit(asynchronous=False)
+
+
+def run_filter_worker():
+    consumer = make_consumer([KAFKA_IN], group_id="filter-worker", enable_autocommit=False)
+    producer = make_producer()
+    writer = BatchWriter(on_error=_save_db_error)
+    # 커밋 전까지 모아 둔 TokenUsage 이벤트 (writer.flush() 이후 발행)
+    usage_events: List[TokenUsageEvent] = []
+    uncommitted = False
+
+    try:
+        while True:
+            msgs = consumer.consume(num_messages=FILTER_BATCH_SIZE, timeout=FILTER_BATCH_TIMEOUT_MS / 1000.0)
+            if msgs:
+                process_batch(msgs, producer, writer, usage_events)
+                uncommitted = True
+
+            # DB 저장(write-behind flush)과 Kafka 발행이 끝난 뒤에만 오프셋 커밋 (at-least-once)
+            if uncommitted and (writer.due() or not len(writer)):
+                commit_offsets(consumer, producer, writer, usage_events)
+                uncommitted = False
+    finally:
+        # writer에 남은 행은 오프셋이 커밋되지 않은 배치 → 재시작 후 다시 처리되므로 여기서 저장하지 않음 (중복 방지)
+        flush_producer(producer)
+        filter_service.close_filter_log_indexer()
+        consumer.close()
 
 
 if __name__ == "__main__":
     run_filter_worker()
-
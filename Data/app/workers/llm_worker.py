@@ -1,15 +1,22 @@
 import os
 import time
 import json
+import uuid
 import logging
 from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import update, bindparam, func
 
 from app.models import RoomSummaryState, PromptBuilt, TokenUsage
-from app.adapters.kafka_io import make_consumer, make_producer, publish, read_headers
+from app.contracts.token_usage_event import TokenUsageEvent
+from app.adapters.kafka_io import make_consumer, make_producer, publish, read_headers, poll_producer, flush_producer, flush_all
 from app.utils.trace import extract_traceparent
 from app.adapters.db import get_session
+from app.adapters.db_writer import BatchWriter, FailedWrite
 from app.services import prompt_builder_service, llm_client, error_service
-from app.adapters.redis_io import append_conversation
+from app.adapters.redis_io import append_turn
+from app.services.summary_trigger import emit_room_activity
 from app.utils.usage import estimate_usage_by_tokens
 
 
@@ -31,6 +38,20 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 KAFKA_IN = os.getenv("KAFKA_TOPIC_IN_LLM", "chat.filter.result.v1")
 KAFKA_OUT_DELTA = os.getenv("KAFKA_TOPIC_OUT_LLM_DELTA", "chat.llm.answer.delta.v1")
 KAFKA_OUT_DONE = os.getenv("KAFKA_TOPIC_OUT_LLM_DONE", "chat.llm.answer.done.v1")
+# token_usage 집계용 이벤트 (빈 값이면 발행 안 함)
+KAFKA_OUT_USAGE = os.getenv("KAFKA_TOPIC_TOKEN_USAGE", "chat.token.usage.v1")
+# 재시도까지 실패한 DB 쓰기 (커밋 전에 발행해서 유실 방지)
+KAFKA_OUT_DB_DLQ = os.getenv("KAFKA_TOPIC_DB_DLQ", "chat.db.dlq.v1")
+
+_summary_state = RoomSummaryState.__table__
+INCREMENT_UNSUMMARIZED = (
+    update(_summary_state)
+    .where(_summary_state.c.chat_room_id == bindparam("room_id"))
+    .values(
+        unsummarized_count=func.coalesce(_summary_state.c.unsummarized_count, 0) + 1,
+        last_summary_at=func.coalesce(_summary_state.c.last_summary_at, bindparam("now")),
+    )
+)
 
 
 def log_llm_process(user_input: str, system_prompt: str, context_snippets: list,
@@ -84,193 +105,260 @@ def log_llm_process(user_input: str, system_prompt: str, context_snippets: list,
         logger.warning("⚠️ 로그 요약 중 오류: %s", e)
 
 
-def run_worker():
-    consumer = make_consumer([KAFKA_IN], group_id="llm-worker")
-    producer = make_producer()
+def _save_db_error(trace_id, e):
+    error_service.save_error(trace_id, "DB_WRITE_ERROR", e)
 
-    while True:
-        msg = consumer.poll(1.0)
-        if msg is None:
-            continue
-        if msg.error():
-            continue  # 불필요한 영어 로그 대신 skip
 
-        try:
-            ev = json.loads(msg.value().decode("utf-8"))
-        except Exception:
+def _publish_dead_letters(producer, failed: List[FailedWrite]) -> None:
+    for f in failed:
+        publish(producer, KAFKA_OUT_DB_DLQ, key=f.trace_id, value={**f.to_dict(), "worker": "llm-worker"})
+    if failed:
+        logger.error("❌ DB 저장 실패 %d건 dead-letter 발행 (%s)", len(failed), KAFKA_OUT_DB_DLQ)
+        flush_all(producer)
+
+
+def _emit_activities(pending: Dict[str, Tuple[int, str]], failed: List[FailedWrite]) -> None:
+    """
+    writer.flush() 이후에 호출: unsummarized_count 증가가 DB에 반영된 방만 요약 트리거에 알림
+    (flush 전에 보내면 summary_worker가 아직 저장 안 된 턴 수를 보고 요약할 수 있음)
+    """
+    failed_rooms = {str(f.params.get("room_id")) for f in failed if f.table == RoomSummaryState.__tablename__}
+    for room_id, (count, trace_id) in pending.items():
+        if str(room_id) in failed_rooms:
             continue
+        try:
+            emit_room_activity(room_id, count)
+        except Exception as e:
+            error_service.save_error(trace_id, "REDIS_ACTIVITY_ERROR", e)
+    pending.clear()
 
-        headers_dict = read_headers(msg)
-        tp = extract_traceparent(headers_dict)
 
-        decision = ev.get("decision") or {}
-        action = decision.get("action") or ev.get("action")
-        if action != "PASS":
-            logger.info("\n" + f"⏩ PASS가 아닌 메시지 건너뜀")
-            continue 
+def _publish_usage(producer, events: List[Tuple[str, TokenUsageEvent]], failed: List[FailedWrite]) -> None:
+    """writer.flush() 이후에 호출: token_usage에 저장된 행만 집계 이벤트 발행"""
+    failed_ids = {str(f.params.get("id")) for f in failed if f.table == TokenUsage.__tablename__}
+    for trace_id, event in events:
+        if event.event_id in failed_ids:
+            continue
+        try:
+            publish(producer, KAFKA_OUT_USAGE, key=event.user_id, value=event.to_dict())
+        except Exception as e:
+            error_service.save_error(trace_id, "KAFKA_USAGE_ERROR", e)
+    if events:
+        flush_all(producer)
+    events.clear()
 
-        trace_id = ev.get("trace_id")
-        chat_room_id = ev.get("room_id")
-        message_id = ev.get("message_id")
-        user_id = ev.get("user_id")
-        user_id = int(user_id) if user_id is not None else None
 
-        # 입력 텍스트 확보
-        user_input = ev.get("cleaned_text") or ev.get("original_text") or ""
+def _after_flush(producer, failed: List[FailedWrite], usage_events: List[Tuple[str, TokenUsageEvent]],
+                 pending_activity: Dict[str, Tuple[int, str]]) -> None:
+    _publish_dead_letters(producer, failed)
+    _publish_usage(producer, usage_events, failed)
+    _emit_activities(pending_activity, failed)
 
-        try:
-            with get_session() as session:
-                # 1) system_prompt
-                system_prompt = prompt_builder_service.build_system_prompt(session, user_id)
-                system_prompt += "\n\n답변은 반드시 마크다운 형식으로 작성하세요."
-
-                # 2) 최근 대화 맥락
-                context_snippets = [
-                    f"{m['role']}: {m['content']}"
-                    for m in prompt_builder_service.get_recent_conversation(chat_room_id, limit=10)
-                ]
-
-                # 3) ES embedding 기반 검색
-                similar_contexts = prompt_builder_service.search_similar_context_es(
-                    query=user_input, user_id=user_id, top_k=3, min_score=0.7
-                )
-
-                # 4) full_prompt 조립
-                full_prompt = (
-                    f"System: {system_prompt}\n\n"
-                    + "\n".join(context_snippets)
-                    + (
-                        "\n\n[과거 유사 맥락]\n"
-                        + "\n".join([ctx["text"] if isinstance(ctx, dict) else str(ctx) for ctx in similar_contexts])
-                        if similar_contexts else ""
-                    )
-                    + (f"\n\n유저: {user_input}" if user_input else "")
-                )
-
-                # 5) PromptBuilt 저장
-                pb = PromptBuilt(
-                    trace_id=trace_id,
-                    built_prompt=full_prompt,
-                    context_messages=context_snippets,
-                    created_at=datetime.now(timezone.utc),
-                )
-                session.add(pb)
-                session.commit()
 
-        except Exception as e:
-            error_service.save_error(trace_id=trace_id, error_type="PROMPT_BUILD_ERROR", error=e)
-            continue
+def run_worker():
+    consumer = make_consumer([KAFKA_IN], group_id="llm-worker", enable_autocommit=False)
+    producer = make_producer()
+    # TokenUsage insert / unsummarized_count 증가는 write-behind로 모아서 저장
+    writer = BatchWriter(on_error=_save_db_error)
+    # room_id → (flush 대기 중인 턴 수, 마지막 trace_id)
+    pending_activity: Dict[str, Tuple[int, str]] = {}
+    # 커밋 전까지 모아 둔 TokenUsage 이벤트 (writer.flush() 이후 저장된 행만 발행)
+    usage_events: List[Tuple[str, TokenUsageEvent]] = []
+    uncommitted = False
 
-        start = time.time()
-        model_name = os.getenv("LLM_MODEL", "gpt-4o")
-        temperature = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+    try:
+        while True:
+            # 직전 메시지까지 처리 완료된 상태: DB flush 이후에만 오프셋 커밋
+            if uncommitted and (writer.due() or not len(writer)):
+                _after_flush(producer, writer.flush(), usage_events, pending_activity)
+                consumer.commit(asynchronous=True)
+                uncommitted = False
+
+            msg = consumer.poll(1.0)
+            if msg is None:
+                # idle 구간에도 delivery callback 처리
+                poll_producer(producer)
+                continue
+            if msg.error():
+                continue  # 불필요한 영어 로그 대신 skip
+            uncommitted = True
+
+            try:
+                ev = json.loads(msg.value().decode("utf-8"))
+            except Exception:
+                continue
+
+            headers_dict = read_headers(msg)
+            tp = extract_traceparent(headers_dict)
+
+            decision = ev.get("decision") or {}
+            action = decision.get("action") or ev.get("action")
+            if action != "PASS":
+                logger.info("\n" + f"⏩ PASS가 아닌 메시지 건너뜀")
+                continue 
+
+            trace_id = ev.get("trace_id")
+            chat_room_id = ev.get("room_id")
+            message_id = ev.get("message_id")
+            user_id = ev.get("user_id")
+            user_id = int(user_id) if user_id is not None else None
+
+            # 입력 텍스트 확보
+            user_input = ev.get("cleaned_text") or ev.get("original_text") or ""
+
+            try:
+                with get_session() as session:
+                    # 1) system_prompt
+                    system_prompt = prompt_builder_service.get_system_prompt(session, user_id)
+                    system_prompt += "\n\n답변은 반드시 마크다운 형식으로 작성하세요."
+
+                    # 2) 최근 대화 맥락
+                    context_snippets = [
+                        f"{m['role']}: {m['content']}"
+                        for m in prompt_builder_service.get_recent_conversation(chat_room_id, limit=10)
+                    ]
+
+                    # 3) ES embedding 기반 검색
+                    similar_contexts = prompt_builder_service.search_similar_context_es(
+                        query=user_input, user_id=user_id, top_k=3, min_score=0.7
+                    )
 
-        chunks = []
-        try:
-            for event in llm_client.call_llm(full_prompt, stream=True, model=model_name, temperature=temperature):
-                if event["type"] == "delta":
-                    delta = event["delta"]
-                    chunks.append(delta)
-
-                    try:
-                        publish(
-                            producer,
-                            KAFKA_OUT_DELTA,
-                            key=chat_room_id,
-                            value={
-                                "trace_id": trace_id,
-                                "room_id": chat_room_id,
-                                "message_id": message_id,
-                                "delta": delta,
-                                "timestamp": int(datetime.now(timezone.utc).timestamp() * 1000),
-                            },
-                            headers=[("traceparent", tp.encode())] if tp else None,
+                    # 4) full_prompt 조립
+                    full_prompt = (
+                        f"System: {system_prompt}\n\n"
+                        + "\n".join(context_snippets)
+                        + (
+                            "\n\n[과거 유사 맥락]\n"
+                            + "\n".join([ctx["text"] if isinstance(ctx, dict) else str(ctx) for ctx in similar_contexts])
+                            if similar_contexts else ""
                         )
-                    except Exception as e:
-                        logger.exception("🔥 LLM 스트리밍 중 오류 발생")
-                        error_service.save_error(trace_id, "KAFKA_DELTA_ERROR", e)
-
-                elif event["type"] == "done":
-                    usage = event["usage"]
-                    latency_ms = int((time.time() - start) * 1000)
-                    full_text = "".join(chunks)
-
-                    log_llm_process(user_input, system_prompt, context_snippets, similar_contexts, full_text, usage)
-
-                    # TokenUsage 저장
-                    try:
-                        with get_session() as session:
-                            total_tokens = usage.get("total_tokens", 0)
-                            cost_usd, energy_wh, co2_g, water_ml = estimate_usage_by_tokens(total_tokens)
-
-                            token_usage = TokenUsage(
-                                message_id=message_id,
-                                user_id=user_id,
-                                prompt_tokens=usage.get("prompt_tokens", 0),
-                                completion_tokens=usage.get("completion_tokens", 0),
-                                total_tokens=total_tokens,
-                                cost_usd=cost_usd,
-                                energy_wh=energy_wh,
-                                co2_g=co2_g,
-                                saved_tokens=0,
-                                saved_cost_usd=0,
-                                saved_energy_wh=0,
-                                saved_co2_g=0,
-                                created_at=datetime.now(timezone.utc),
+                        + (f"\n\n유저: {user_input}" if user_input else "")
+                    )
+
+                    # 5) PromptBuilt 저장
+                    pb = PromptBuilt(
+                        trace_id=trace_id,
+                        built_prompt=full_prompt,
+                        context_messages=context_snippets,
+                        created_at=datetime.now(timezone.utc),
+                    )
+                    session.add(pb)
+                    session.commit()
+
+            except Exception as e:
+                error_service.save_error(trace_id=trace_id, error_type="PROMPT_BUILD_ERROR", error=e)
+                continue
+
+            start = time.time()
+            model_name = os.getenv("LLM_MODEL", "gpt-4o")
+            temperature = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+
+            chunks = []
+            try:
+                for event in llm_client.call_llm(full_prompt, stream=True, model=model_name, temperature=temperature):
+                    if event["type"] == "delta":
+                        delta = event["delta"]
+                        chunks.append(delta)
+
+                        try:
+                            publish(
+                                producer,
+                                KAFKA_OUT_DELTA,
+                                key=chat_room_id,
+                                value={
+                                    "trace_id": trace_id,
+                                    "room_id": chat_room_id,
+                                    "message_id": message_id,
+                                    "delta": delta,
+                                    "timestamp": int(datetime.now(timezone.utc).timestamp() * 1000),
+                                },
+                                headers=[("traceparent", tp.encode())] if tp else None,
                             )
-                            session.add(token_usage)
-                            session.commit()
-                    except Exception as e:
-                        error_service.save_error(trace_id, "DB_INSERT_ERROR", e)
-
-                    # Redis Append (user + assistant 대화 저장)
-                    try:
-                        append_conversation(room_id=chat_room_id, role="user", content=user_input)
-                        append_conversation(room_id=chat_room_id, role="assistant", content=full_text)
-                    except Exception as e:
-                        error_service.save_error(trace_id, "REDIS_APPEND_ERROR", e)
-
-                    # unsummarized_count++
-                    try:
-                        with get_session() as session:
-                            state = session.query(RoomSummaryState).filter_by(chat_room_id=chat_room_id).first()
-                            if state:
-                                state.unsummarized_count = (state.unsummarized_count or 0) + 1
-                                if state.last_summary_at is None:
-                                    state.last_summary_at = datetime.now(timezone.utc)
-                                session.commit()
-                    except Exception as e:
-                        error_service.save_error(trace_id, "DB_UPDATE_ERROR", e)
-
-                    # Kafka DONE 발행
-                    try:
-                        publish(
-                            producer,
-                            KAFKA_OUT_DONE,
-                            key=chat_room_id,
-                            value={
-                                "trace_id": trace_id,
-                                "room_id": chat_room_id,
-                                "message_id": message_id,
-                                "response": {"text": full_text},
-                                "usage": usage,
-                                "latency_ms": latency_ms,
-                                "schema_version": "1.0.0",
-                                "timestamp": int(datetime.now(timezone.utc).timestamp() * 1000),
-                            },
-                            headers=[("traceparent", tp.encode())] if tp else None,
+                        except Exception as e:
+                            logger.exception("🔥 LLM 스트리밍 중 오류 발생")
+                            error_service.save_error(trace_id, "KAFKA_DELTA_ERROR", e)
+
+                    elif event["type"] == "done":
+                        usage = event["usage"]
+                        latency_ms = int((time.time() - start) * 1000)
+                        full_text = "".join(chunks)
+
+                        log_llm_process(user_input, system_prompt, context_snippets, similar_contexts, full_text, usage)
+
+                        # TokenUsage 저장 (write-behind)
+                        total_tokens = usage.get("total_tokens", 0)
+                        cost_usd, energy_wh, co2_g, water_ml = estimate_usage_by_tokens(total_tokens)
+                        token_usage = TokenUsage(
+                            id=uuid.uuid4(),  # 집계 이벤트 event_id와 같은 값
+                            message_id=message_id,
+                            user_id=user_id,
+                            prompt_tokens=usage.get("prompt_tokens", 0),
+                            completion_tokens=usage.get("completion_tokens", 0),
+                            total_tokens=total_tokens,
+                            cost_usd=cost_usd,
+                            energy_wh=energy_wh,
+                            co2_g=co2_g,
+                            saved_tokens=0,
+                            saved_cost_usd=0,
+                            saved_energy_wh=0,
+                            saved_co2_g=0,
+                            created_at=datetime.now(timezone.utc),
                         )
-
-                        done_at = int(datetime.now(timezone.utc).timestamp() * 1000)
-                        produced_at = int(ev.get("timestamp", done_at))
-                        total_pipeline_ms = done_at - produced_at
-                        logger.info(f"🏁 전체 파이프라인 처리 시간 (LLM DONE): {total_pipeline_ms}ms")
-
-                    except Exception as e:
-                        error_service.save_error(trace_id, "KAFKA_DONE_ERROR", e)
-
-        except Exception as e:
-            error_service.save_error(trace_id, "LLM_CALL_ERROR", e)
+                        writer.add(token_usage, trace_id=trace_id)
+                        if KAFKA_OUT_USAGE:
+                            usage_events.append((trace_id, TokenUsageEvent.from_row(token_usage, source="llm")))
+
+                        # Redis Append (user + assistant 대화 저장)
+                        try:
+                            append_turn(chat_room_id, user_input, full_text)
+                        except Exception as e:
+                            error_service.save_error(trace_id, "REDIS_APPEND_ERROR", e)
+
+                        # unsummarized_count++ (write-behind, 같은 배치의 증가분은 executemany로 처리)
+                        writer.execute(
+                            INCREMENT_UNSUMMARIZED,
+                            {"room_id": chat_room_id, "now": datetime.now(timezone.utc)},
+                            trace_id=trace_id,
+                        )
+                        # 요약 트리거용 방 활동 이벤트는 writer.flush() 이후에 발행 (_emit_activities)
+                        count, _ = pending_activity.get(chat_room_id, (0, trace_id))
+                        pending_activity[chat_room_id] = (count + 1, trace_id)
+
+                        # Kafka DONE 발행
+                        try:
+                            publish(
+                                producer,
+                                KAFKA_OUT_DONE,
+                                key=chat_room_id,
+                                value={
+                                    "trace_id": trace_id,
+                                    "room_id": chat_room_id,
+                                    "message_id": message_id,
+                                    "response": {"text": full_text},
+                                    "usage": usage,
+                                    "latency_ms": latency_ms,
+                                    "schema_version": "1.0.0",
+                                    "timestamp": int(datetime.now(timezone.utc).timestamp() * 1000),
+                                },
+                                headers=[("traceparent", tp.encode())] if tp else None,
+                            )
+                            # 스트림 완료 시점에만 flush (delta는 linger 단위로 묶여 전송)
+                            flush_producer(producer)
+
+                            done_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+                            produced_at = int(ev.get("timestamp", done_at))
+                            total_pipeline_ms = done_at - produced_at
+                            logger.info(f"🏁 전체 파이프라인 처리 시간 (LLM DONE): {total_pipeline_ms}ms")
+
+                        except Exception as e:
+                            error_service.save_error(trace_id, "KAFKA_DONE_ERROR", e)
+
+            except Exception as e:
+                error_service.save_error(trace_id, "LLM_CALL_ERROR", e)
+    finally:
+        _after_flush(producer, writer.flush(), usage_events, pending_activity)
+        flush_producer(producer)
+        consumer.close()
 
 
 if __name__ == "__main__":
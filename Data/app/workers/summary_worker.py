@@ -1,12 +1,13 @@
 import os
 import time
 import logging
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
 from app.adapters.db import get_session
 from app.models import ChatMessage, RoomSummaryState
 from app.services import summary_service, embed_service, error_service
-from sqlalchemy import and_, or_
+from app.services.summary_trigger import SummaryTrigger
+from sqlalchemy import and_
 import transformers
 
 logging.basicConfig(
@@ -26,7 +27,17 @@ logger = logging.getLogger("summary-worker")
 # 트리거 조건
 UNSUM_THRESHOLD = int(os.getenv("SUMMARY_TRIGGER_COUNT", "10"))  # 10턴 단위
 IDLE_SECONDS = int(os.getenv("SUMMARY_TRIGGER_IDLE_SEC", str(3600)))  # 1시간
-POLL_INTERVAL = int(os.getenv("SUMMARY_TRIGGER_POLL_SEC", "30"))  # 30초마다 체크
+# 이벤트 대기 최대 시간 (다음 idle 기한이 더 가까우면 그때까지만 대기)
+MAX_BLOCK_MS = int(os.getenv("SUMMARY_TRIGGER_MAX_BLOCK_MS", "5000"))
+# 요약 실패 / 다른 인스턴스가 요약 중일 때 다시 시도할 간격
+RETRY_SEC = int(os.getenv("SUMMARY_TRIGGER_RETRY_SEC", "60"))
+# DB 기준 재동기화 주기 (0이면 기동 시 1회만, Redis 상태 유실 대비 안전망)
+RECONCILE_SEC = int(os.getenv("SUMMARY_TRIGGER_RECONCILE_SEC", "0"))
+
+# summarize_room 결과
+SUMMARY_DONE = "done"            # 요약 완료 (또는 요약 상태 행 없음)
+SUMMARY_NOT_READY = "not_ready"  # 밀린 턴은 있는데 메시지가 아직 DB에 없음 (Backend 비동기 저장)
+SUMMARY_FAILED = "failed"
 
 
 def log_summary_process(room_id: str, messages, summary_text: str):
@@ -52,24 +63,81 @@ def log_summary_process(room_id: str, messages, summary_text: str):
         logger.warning("⚠️ 요약 로그 출력 중 오류: %s", e)
 
 
+def reconcile_from_db(trigger: SummaryTrigger) -> list:
+    """
+    DB의 밀린 방을 Redis 트리거 상태에 반영 (기동 시 / RECONCILE_SEC 주기)
+    threshold 이상인 방 목록 반환
+    """
+    with get_session() as session:
+        rows = (
+            session.query(RoomSummaryState.chat_room_id, RoomSummaryState.unsummarized_count,
+                          RoomSummaryState.last_summary_at)
+            .filter(RoomSummaryState.unsummarized_count > 0)
+            .all()
+        )
+
+    now = time.time()
+    ready = []
+    for room_id, count, last_summary_at in rows:
+        base = last_summary_at.timestamp() if last_summary_at else now
+        trigger.seed(str(room_id), count, base + IDLE_SECONDS)
+        if count >= UNSUM_THRESHOLD:
+            ready.append(str(room_id))
+    logger.info("🔄 요약 트리거 상태 동기화: 밀린 방 %d개 (즉시 요약 %d개)", len(rows), len(ready))
+    return ready
+
+
+def trigger_summary(trigger: SummaryTrigger, room_id: str) -> None:
+    """방 단위 락을 잡고 요약, 요약 중에 다시 threshold를 넘었으면 이어서 한 번 더"""
+    if not trigger.try_lock(room_id):
+        # 다른 인스턴스가 요약 중: 끝난 뒤 남은 턴이 있으면 그쪽에서 기한을 다시 잡지만, 놓치지 않도록 재시도 예약
+        trigger.retry_later(room_id, RETRY_SEC)
+        return
+    try:
+        while True:
+            consumed = trigger.pending(room_id)
+            # 실패 / 메시지 미도착이면 턴 수는 그대로 두고 나중에 다시 (complete하면 DB에 밀린 턴이 남은 채 잊힘)
+            if summarize_room(room_id) != SUMMARY_DONE:
+                trigger.retry_later(room_id, RETRY_SEC)
+                return
+            if trigger.complete(room_id, consumed) < UNSUM_THRESHOLD:
+                return
+    finally:
+        trigger.unlock(room_id)
+
+
 def run_summary_trigger_loop():
+    """
+    이벤트 기반 요약 트리거
+    - llm_worker가 unsummarized_count를 올릴 때 Redis stream에 방 활동 이벤트 발행
+    - 이벤트 수신 즉시 누적 턴 수가 UNSUM_THRESHOLD 이상이면 요약
+    - idle 기한(sorted set)이 지난 방은 기한 시각에 맞춰 요약
+    - RoomSummaryState 전체 스캔은 기동 시(및 RECONCILE_SEC 주기)에만
+    """
+    trigger = SummaryTrigger(UNSUM_THRESHOLD, IDLE_SECONDS)
+    trigger.ensure_group()
+    ready = []
+    last_reconcile = None
+
     while True:
         try:
-            with get_session() as session:
-                now = datetime.now(timezone.utc)
-
-                rooms = session.query(RoomSummaryState).filter(
-                    or_(
-                        RoomSummaryState.unsummarized_count >= UNSUM_THRESHOLD,
-                        and_(
-                            RoomSummaryState.unsummarized_count > 0,
-                            RoomSummaryState.last_summary_at < (now - timedelta(seconds=IDLE_SECONDS))
-                        )
-                    )
-                ).all()
+            if last_reconcile is None or (RECONCILE_SEC > 0 and time.monotonic() - last_reconcile >= RECONCILE_SEC):
+                ready.extend(reconcile_from_db(trigger))
+                last_reconcile = time.monotonic()
+
+            deadline = trigger.next_deadline()
+            block_ms = MAX_BLOCK_MS if deadline is None else int((deadline - time.time()) * 1000)
+            events = [] if ready else trigger.read_events(block_ms=min(max(block_ms, 1), MAX_BLOCK_MS))
+
+            for _, room_id, count in events:
+                if room_id and trigger.record_activity(room_id, count):
+                    ready.append(room_id)
+            trigger.ack([event_id for event_id, _, _ in events])
 
-            for state in rooms:
-                summarize_room(state.chat_room_id)
+            ready.extend(trigger.claim_idle())
+            for room_id in dict.fromkeys(ready):
+                trigger_summary(trigger, room_id)
+            ready = []
 
         except Exception as e:
             error_service.save_error(
@@ -77,16 +145,16 @@ def run_summary_trigger_loop():
                 error_type="SUMMARY_LOOP_ERROR",
                 error=e,
             )
+            time.sleep(1)
 
-        time.sleep(POLL_INTERVAL)
 
-
-def summarize_room(room_id: str):
+def summarize_room(room_id: str) -> str:
+    """SUMMARY_DONE / SUMMARY_NOT_READY / SUMMARY_FAILED"""
     try:
         with get_session() as session:
             state = session.query(RoomSummaryState).filter_by(chat_room_id=room_id).first()
             if not state:
-                return
+                return SUMMARY_DONE
 
             last_turn_end = state.last_turn_end or 0
 
@@ -104,7 +172,8 @@ def summarize_room(room_id: str):
             )
 
             if not messages:
-                return
+                logger.info("⏳ 요약할 메시지가 아직 없음, %d초 후 재시도 (room_id=%s)", RETRY_SEC, room_id)
+                return SUMMARY_NOT_READY
 
             # 요약 텍스트 블록
             text_block = "\n".join(
@@ -114,8 +183,7 @@ def summarize_room(room_id: str):
             # 요약 생성
             summary_text = summary_service.summarize(text_block)
 
-            # ES 임베딩 저장
-            embedding = embed_service.embed_text(summary_text)
+            # ES 임베딩 저장 (store_text 안에서 한 번만 임베딩)
             embed_service.store_text(
                 user_id=messages[-1].author_id,
                 source_id=room_id,
@@ -131,6 +199,7 @@ def summarize_room(room_id: str):
 
             # 발표용 로그 출력
             log_summary_process(room_id, messages, summary_text)
+            return SUMMARY_DONE
 
     except Exception as e:
         error_service.save_error(
@@ -138,6 +207,7 @@ def summarize_room(room_id: str):
             error_type="SUMMARY_ROOM_ERROR",
             error=e,
         )
+        return SUMMARY_FAILED
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+# tests/test_chat_service_context.py
+import asyncio
+
+import pytest
+
+chat_service = pytest.importorskip("app.services.chat_service")
+
+
+class _FakeProvider:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, text, normalize=False):
+        self.calls.append(text)
+        return [0.1, 0.2, 0.3]
+
+
+class _FakeAsyncES:
+    def __init__(self, hits):
+        self.hits = hits
+        self.requests = []
+
+    async def search(self, index, body):
+        self.requests.append((index, body))
+        return {"hits": {"hits": self.hits}}
+
+
+def test_search_similar_context_es_async_uses_provider(monkeypatch):
+    """async 유사 맥락 검색: provider 임베딩 → KNN 검색 → min_score 필터"""
+    provider = _FakeProvider()
+    es = _FakeAsyncES([
+        {"_score": 0.9, "_source": {"content": "가까운 맥락"}},
+        {"_score": 0.1, "_source": {"content": "먼 맥락"}},
+    ])
+    monkeypatch.setattr(chat_service, "get_provider", lambda: provider)
+    monkeypatch.setattr(chat_service, "get_async_es", lambda: es)
+    # Redis 캐시 없이 encoder를 그대로 호출
+    monkeypatch.setattr(chat_service, "cached_embedding", lambda text, encode: encode(text))
+
+    result = asyncio.run(chat_service.search_similar_context_es_async("질문", "42", top_k=2, min_score=0.5))
+
+    assert result == ["가까운 맥락"]
+    assert provider.calls == ["질문"]
+    index, body = es.requests[0]
+    assert index == chat_service.USER_MEMORY_EMBED_INDEX
+    assert body["knn"]["query_vector"] == [0.1, 0.2, 0.3]
+    assert body["knn"]["filter"] == {"term": {"user_id": "42"}}
@@ -0,0 +1,76 @@
+# tests/test_filter_scheduler.py
+import pytest
+
+from app.pipelines.filter.scheduler import InferenceScheduler
+
+
+def _label(text):
+    return ("meaningful", {"meaningful": float(len(text))})
+
+
+def test_classify_many_keeps_order_and_dedups():
+    calls = []
+
+    def classify(texts):
+        calls.append(list(texts))
+        return [_label(t) for t in texts]
+
+    sched = InferenceScheduler(classify, max_batch_size=8, max_wait_ms=50)
+    try:
+        assert sched.classify_many(["a", "bb", "a"], timeout=5) == [_label("a"), _label("bb"), _label("a")]
+        assert sum(len(c) for c in calls) == 2
+    finally:
+        sched.stop()
+
+
+def test_classify_fn_error_fails_batch_and_thread_keeps_running():
+    fail = {"on": True}
+
+    def classify(texts):
+        if fail["on"]:
+            raise RuntimeError("boom")
+        return [_label(t) for t in texts]
+
+    sched = InferenceScheduler(classify, max_batch_size=8, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError):
+            sched.classify_many(["x"], timeout=5)
+        fail["on"] = False
+        assert sched.classify_many(["x"], timeout=5) == [_label("x")]
+    finally:
+        sched.stop()
+
+
+def test_short_result_list_fails_futures_instead_of_killing_thread():
+    short = {"on": True}
+
+    def classify(texts):
+        results = [_label(t) for t in texts]
+        return results[:-1] if short["on"] else results
+
+    sched = InferenceScheduler(classify, max_batch_size=8, max_wait_ms=20)
+    try:
+        futures = sched.submit_many(["a", "b"])
+        for fut in futures:
+            with pytest.raises(ValueError):
+                fut.result(timeout=5)
+        assert sched._thread.is_alive()
+
+        short["on"] = False
+        assert sched.classify_many(["c"], timeout=5) == [_label("c")]
+    finally:
+        sched.stop()
+
+
+def test_dead_thread_is_restarted():
+    sched = InferenceScheduler(lambda texts: [_label(t) for t in texts], max_batch_size=4, max_wait_ms=1)
+    try:
+        assert sched.classify_many(["a"], timeout=5) == [_label("a")]
+        # 스레드만 종료시킴 (stop()과 달리 _stopped는 그대로)
+        sched._queue.put(None)
+        sched._thread.join(timeout=5)
+        assert not sched._thread.is_alive()
+
+        assert sched.classify_many(["b"], timeout=5) == [_label("b")]
+    finally:
+        sched.stop()
@@ -0,0 +1,147 @@
+# filter_matcher.py
+"""
+filter_word.json 규칙 → 정규식 컴파일 + 단일 스캔 매처 (Spark 의존성 없는 순수 Python)
+stream_filter_router.py가 driver/executor 양쪽에서 import (spark-submit --py-files로 배포)
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+
+def _escape_spaces_to_ws_regex(s: str) -> str:
+    parts = s.split()
+    parts = [re.escape(p) for p in parts]
+    return r"\s+".join(parts)
+
+def _build_trailer_group(trailers: List[str]) -> str:
+    if not trailers:
+        return r""
+    escaped = sorted([re.escape(t) for t in trailers], key=len, reverse=True)
+    return r"(?:\s*(?:" + "|".join(escaped) + r"))*"
+
+def _left_boundary() -> str:
+    return r"(?<![0-9A-Za-z가-힣])"
+
+def compile_filters(filter_cfg: Dict[str, Any]) -> Dict[str, List[re.Pattern]]:
+    compiled: Dict[str, List[re.Pattern]] = {}
+    for f in filter_cfg.get("filters", []):
+        cat = f.get("category")
+        strict = f.get("strict", {})
+        pats: List[re.Pattern] = []
+        if cat == "call_only":
+            bases = strict.get("base", [])
+            suf = strict.get("allow_suffix", [])
+            trailers = strict.get("allowed_trailers", [])
+            trail = _build_trailer_group(trailers)
+            left = _left_boundary()
+            suf_alt = r"(?:" + "|".join([re.escape(s) for s in suf]) + r")?" if suf else r""
+            for base in bases:
+                b = _escape_spaces_to_ws_regex(base)
+                rx = left + "(" + b + ")" + suf_alt + trail + r"(?![0-9A-Za-z가-힣])"
+                pats.append(re.compile(rx, re.IGNORECASE | re.UNICODE))
+        else:
+            exact = strict.get("exact", [])
+            trailers = strict.get("allowed_trailers", [])
+            trail = _build_trailer_group(trailers)
+            left = _left_boundary()
+            for phrase in exact:
+                p = _escape_spaces_to_ws_regex(phrase)
+                rx = left + "(" + p + ")" + trail + r"(?![0-9A-Za-z가-힣])"
+                pats.append(re.compile(rx, re.IGNORECASE | re.UNICODE))
+        compiled[cat] = pats
+    return compiled
+
+# -----------------------
+# Combined matcher
+#   패턴마다 finditer를 도는 대신, 모든 패턴의 첫 단어(anchor)로 만든 trie 정규식 하나로
+#   텍스트를 한 번 스캔해서 anchor가 나타난 위치만 찾고, 그 위치에서만 해당 패턴을 match.
+#   - 매치 시작 = 첫 단어 시작이므로 후보 위치 밖에서는 어떤 패턴도 매치될 수 없음
+#   - 패턴별로 finditer와 같은 규칙(이전 매치 끝 이후부터)으로 진행 → 결과가 기존과 동일
+# -----------------------
+def _anchor_tokens(filter_cfg: Dict[str, Any]) -> Dict[str, List[str]]:
+    """compile_filters와 같은 순서로 패턴별 첫 단어 (소문자)"""
+    anchors: Dict[str, List[str]] = {}
+    for f in filter_cfg.get("filters", []):
+        strict = f.get("strict", {})
+        phrases = strict.get("base", []) if f.get("category") == "call_only" else strict.get("exact", [])
+        anchors[f.get("category")] = [(p.split() or [""])[0].lower() for p in phrases]
+    return anchors
+
+def _trie_regex(words: List[str]) -> str:
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # 여기서 끝나는 단어가 있으면 더 긴 쪽을 먼저 시도하고 실패 시 여기서 종료 (greedy)
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+class CompiledMatcher:
+    def __init__(self, compiled: Dict[str, List[re.Pattern]], anchors: Dict[str, List[str]]):
+        self.entries: List[Tuple[str, re.Pattern]] = []
+        by_anchor: Dict[str, List[int]] = {}
+        self.always: List[int] = []  # 첫 단어가 없는 패턴은 항상 검사
+        for cat, pats in compiled.items():
+            for pat, anchor in zip(pats, anchors.get(cat, [])):
+                idx = len(self.entries)
+                self.entries.append((cat, pat))
+                if anchor:
+                    by_anchor.setdefault(anchor, []).append(idx)
+                else:
+                    self.always.append(idx)
+
+        # anchor → 그 anchor의 prefix인 모든 anchor의 패턴 (같은 위치에서 함께 나타남)
+        self.closure: Dict[str, List[int]] = {
+            a: sorted(i for b, ids in by_anchor.items() if a.startswith(b) for i in ids)
+            for a in by_anchor
+        }
+        self.scanner = re.compile("(?=(" + _trie_regex(list(by_anchor)) + "))", re.IGNORECASE | re.UNICODE) \
+            if by_anchor else None
+
+    def _all_matches(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """기존 방식 (모든 패턴 finditer)"""
+        raw = []
+        for cat, pat in self.entries:
+            for m in pat.finditer(text):
+                raw.append((m.start(), m.end(), cat, m.group(1).strip()))
+        return raw
+
+    def raw_matches(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """(start, end, category, word) — 기존 패턴 순서/finditer 결과와 동일"""
+        starts: Dict[int, List[int]] = {i: [] for i in self.always}
+        if self.scanner is not None:
+            for m in self.scanner.finditer(text):
+                ids = self.closure.get(m.group(1).lower())
+                if ids is None:
+                    # 대소문자 변환으로 길이가 바뀌는 특수 문자 등: 안전하게 기존 방식
+                    return self._all_matches(text)
+                for i in ids:
+                    starts.setdefault(i, []).append(m.start())
+
+        raw = []
+        for idx in sorted(starts):
+            cat, pat = self.entries[idx]
+            if idx in self.always:
+                for m in pat.finditer(text):
+                    raw.append((m.start(), m.end(), cat, m.group(1).strip()))
+                continue
+            last_end = 0
+            for pos in starts[idx]:
+                if pos < last_end:
+                    continue
+                m = pat.match(text, pos)
+                if m is not None:
+                    raw.append((m.start(), m.end(), cat, m.group(1).strip()))
+                    last_end = m.end()
+        return raw
+
+def build_matcher(filter_cfg: Dict[str, Any]) -> CompiledMatcher:
+    return CompiledMatcher(compile_filters(filter_cfg), _anchor_tokens(filter_cfg))
@@ -11,4 +11,5 @@ echo "--- Running Spark batch aggregation at $(date) ---" >> cron.log
   /opt/bitnami/spark/bin/spark-submit \
   --master local[*] \
   --packages org.postgresql:postgresql:42.7.3 \
+  --py-files /opt/bitnami/spark/app/token_usage_sink.py \
   /opt/bitnami/spark/app/spark_batch_aggregation.py >> cron.log 2>&1
\ No newline at end of file
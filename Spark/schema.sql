@@ -1,8 +1,10 @@
 -- schema.sql
 
 -- 1. Source Table
+-- created_at 기준 일 단위 RANGE 파티션 (운영 DB는 Backend Flyway V2__Partition_token_usage.sql,
+-- 일 파티션 생성/보관 정리는 token_usage_ensure_partitions / token_usage_retention)
 CREATE TABLE IF NOT EXISTS token_usage (
-    id UUID PRIMARY KEY,
+    id UUID NOT NULL,
     user_id UUID,
     message_id UUID,
     prompt_tokens INT,
@@ -15,8 +17,14 @@ CREATE TABLE IF NOT EXISTS token_usage (
     saved_cost_usd NUMERIC(14, 6),
     saved_energy_wh NUMERIC(14, 6),
     saved_co2_g NUMERIC(14, 6),
-    created_at TIMESTAMPTZ DEFAULT NOW()
-);
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS token_usage_default PARTITION OF token_usage DEFAULT;
+CREATE INDEX IF NOT EXISTS idx_token_usage_created_at_brin ON token_usage USING BRIN (created_at) WITH (pages_per_range = 32);
+CREATE INDEX IF NOT EXISTS idx_token_usage_user_created ON token_usage (user_id, created_at)
+    INCLUDE (total_tokens, saved_tokens, cost_usd);
 
 -- 2. Aggregation Tables
 CREATE TABLE IF NOT EXISTS user_saved_token_daily (
@@ -31,12 +39,12 @@ CREATE TABLE IF NOT EXISTS user_saved_token_daily (
 
 CREATE TABLE IF NOT EXISTS user_saved_token_total (
     user_id TEXT,
-    stat_time TIMESTAMPTZ,
+    stat_date TIMESTAMPTZ,
     request_count BIGINT,
     saved_tokens BIGINT,
     token_sum BIGINT,
     cost_sum_usd NUMERIC(14, 6),
-    PRIMARY KEY (user_id, stat_time)
+    PRIMARY KEY (user_id, stat_date)
 );
 
 CREATE TABLE IF NOT EXISTS global_saved_token_daily (
@@ -48,9 +56,37 @@ CREATE TABLE IF NOT EXISTS global_saved_token_daily (
 );
 
 CREATE TABLE IF NOT EXISTS global_saved_token_total (
-    stat_time TIMESTAMPTZ PRIMARY KEY,
+    stat_date TIMESTAMPTZ PRIMARY KEY,
     request_count BIGINT,
     saved_tokens BIGINT,
     token_sum BIGINT,
     cost_sum_usd NUMERIC(14, 6)
-);
\ No newline at end of file
+);
+
+-- 3. Incremental Aggregation State
+-- 5분 버킷 (24시간 window = 버킷 288개 합)
+CREATE TABLE IF NOT EXISTS user_saved_token_bucket (
+    user_id TEXT NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    saved_tokens BIGINT NOT NULL DEFAULT 0,
+    token_sum BIGINT NOT NULL DEFAULT 0,
+    cost_sum_usd NUMERIC(14, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, bucket_start)
+);
+CREATE INDEX IF NOT EXISTS idx_user_saved_token_bucket_start ON user_saved_token_bucket (bucket_start);
+
+CREATE TABLE IF NOT EXISTS global_saved_token_bucket (
+    bucket_start TIMESTAMPTZ PRIMARY KEY,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    saved_tokens BIGINT NOT NULL DEFAULT 0,
+    token_sum BIGINT NOT NULL DEFAULT 0,
+    cost_sum_usd NUMERIC(14, 6) NOT NULL DEFAULT 0
+);
+
+-- 마지막으로 반영한 created_at 상한 (job별)
+CREATE TABLE IF NOT EXISTS token_usage_agg_watermark (
+    job_name TEXT PRIMARY KEY,
+    high_watermark TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
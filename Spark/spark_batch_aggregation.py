@@ -1,8 +1,13 @@
 import os
 from datetime import datetime, timedelta, timezone
+
 from pyspark.sql import SparkSession, functions as F
 from pyspark.sql.window import Window
 
+from token_usage_sink import (
+    BUCKET_MINUTES, METRICS, apply_user_buckets, epoch_to_utc, floor_to_bucket, pg_connect, read_watermark,
+)
+
 # -------------------------------------------------------------------
 # Configurations
 # -------------------------------------------------------------------
@@ -25,6 +30,18 @@ USER_TOTAL_TABLE = "user_saved_token_total"
 GLOBAL_DAILY_TABLE = "global_saved_token_daily"
 GLOBAL_TOTAL_TABLE = "global_saved_token_total"
 
+# incremental: watermark 이후 구간만 읽어서 5분 버킷/누적 합계 갱신
+# full: 기존 방식 (token_usage 전체 스캔 + 스냅샷 append)
+AGG_MODE = os.environ.get("AGG_MODE", "incremental").lower()
+JOB_NAME = os.environ.get("AGG_JOB_NAME", "token_usage_5m")
+# 늦게 커밋된 행을 반영하기 위해 watermark 이전 몇 분을 다시 집계할지 (버킷 단위로 재계산, 중복 합산 없음)
+LATE_GRACE_MINUTES = int(os.environ.get("AGG_LATE_GRACE_MINUTES", "10"))
+# watermark가 없을 때(첫 실행) 버킷을 채울 기간
+BOOTSTRAP_HOURS = int(os.environ.get("AGG_BOOTSTRAP_HOURS", "24"))
+# 첫 실행 때 채운 버킷을 누적 합계에도 더할지 (기존 full 모드 합계가 이미 있으면 false)
+BOOTSTRAP_TOTALS = os.environ.get("AGG_BOOTSTRAP_TOTALS", "false").lower() == "true"
+JDBC_NUM_PARTITIONS = int(os.environ.get("AGG_JDBC_PARTITIONS", "4"))
+
 print(f"Connecting to main PostgreSQL at {POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}")
 
 # -------------------------------------------------------------------
@@ -32,6 +49,7 @@ print(f"Connecting to main PostgreSQL at {POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGR
 # -------------------------------------------------------------------
 spark = SparkSession.builder \
     .appName("SETA Token Usage Hourly Aggregation") \
+    .config("spark.sql.session.timeZone", "UTC") \
     .getOrCreate()
 
 # -------------------------------------------------------------------
@@ -57,140 +75,218 @@ def insert_batch_results(df, target_table):
     print(f"Successfully inserted data into {target_table}")
 
 # -------------------------------------------------------------------
-# Main Logic
+# Incremental (watermark + 5분 버킷)
 # -------------------------------------------------------------------
-now = datetime.now(timezone.utc)
-print(f"[*] Current script execution time (UTC): {now}")
+def read_source_range(start, end):
+    """
+    [start, end) 구간만 DB에서 읽음.
+    시간 조건은 서브쿼리로 JDBC에 push down, created_at 기준으로 파티션 나눠 병렬 조회.
+    """
+    query = (
+        f"(SELECT user_id, saved_tokens, total_tokens, cost_usd, created_at FROM {SOURCE_TABLE} "
+        f"WHERE user_id IS NOT NULL "
+        f"AND created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}') AS src"
+    )
+    fmt = "%Y-%m-%d %H:%M:%S"
+    return spark.read.format("jdbc") \
+        .option("url", JDBC_URL) \
+        .option("driver", JDBC_DRIVER) \
+        .option("user", POSTGRES_USER) \
+        .option("password", POSTGRES_PASSWORD) \
+        .option("dbtable", query) \
+        .option("partitionColumn", "created_at") \
+        .option("lowerBound", start.strftime(fmt)) \
+        .option("upperBound", end.strftime(fmt)) \
+        .option("numPartitions", JDBC_NUM_PARTITIONS) \
+        .option("sessionInitStatement", "SET TIME ZONE 'UTC'") \
+        .load()
 
-end_minute = now.minute - (now.minute % 5)
-five_min_end_time = now.replace(minute=end_minute, second=0, microsecond=0)
-five_min_start_time = five_min_end_time - timedelta(minutes=5)
+def aggregate_buckets(source_df):
+    """(user_id, 5분 버킷) 단위 합계 → driver로 가져올 수 있을 만큼 작은 결과"""
+    # driver로 가져올 때 로컬 타임존 변환이 끼지 않도록 epoch 초로 계산
+    bucket_sec = BUCKET_MINUTES * 60
+    rows = source_df.withColumn(
+        "bucket_epoch", (F.floor(F.unix_timestamp("created_at") / bucket_sec) * bucket_sec).cast("long")
+    ).groupBy(
+        F.col("user_id").cast("string").alias("user_id"), "bucket_epoch"
+    ).agg(
+        F.count(F.lit(1)).alias("request_count"),
+        F.coalesce(F.sum("saved_tokens"), F.lit(0)).cast("long").alias("saved_tokens"),
+        F.coalesce(F.sum("total_tokens"), F.lit(0)).cast("long").alias("token_sum"),
+        F.coalesce(F.sum("cost_usd"), F.lit(0)).cast("decimal(20,6)").alias("cost_sum_usd"),
+    ).collect()
+    return [(r.user_id, epoch_to_utc(r.bucket_epoch), *(r[m] for m in METRICS)) for r in rows]
 
-twenty_four_hour_start_time = now - timedelta(hours=24)
+def run_incremental(now):
+    end = floor_to_bucket(now)  # 닫힌 버킷까지만 처리
+    conn = pg_connect()
+    try:
+        watermark = read_watermark(conn, JOB_NAME)
+        if watermark is None:
+            range_start = end - timedelta(hours=BOOTSTRAP_HOURS)
+            apply_totals = BOOTSTRAP_TOTALS
+            print(f"[*] No watermark for {JOB_NAME}. Bootstrapping buckets from {range_start} (totals: {apply_totals})")
+        else:
+            range_start = floor_to_bucket(watermark - timedelta(minutes=LATE_GRACE_MINUTES))
+            apply_totals = True
 
-print("\n--- Time Window Calculation ---")
-print(f"Based on current minute ({now.minute}), calculated end minute for 5-min window: {end_minute}")
-print(f"==> 5-min batch window: {five_min_start_time} to {five_min_end_time} (UTC)")
-print(f"==> 24-hour rolling window: {twenty_four_hour_start_time} to {now} (UTC)\n")
+        if watermark is not None and watermark >= end:
+            print(f"Watermark {watermark} is already at {end}. Nothing to do.")
+            return
 
-base_df = spark.read.jdbc(
-    url=JDBC_URL,   
-    table=SOURCE_TABLE,
-    properties=CONNECTION_PROPERTIES
-).filter(F.col("user_id").isNotNull())
+        print(f"==> Incremental window: {range_start} to {end} (UTC), watermark: {watermark}")
+        user_rows = aggregate_buckets(read_source_range(range_start, end))
+        print(f"--- {len(user_rows)} user buckets recomputed ---")
 
-five_min_source_df = base_df.where(
-    F.col("created_at").between(five_min_start_time, five_min_end_time)
-)
-five_min_source_df.cache()
-print(f"--- Found {five_min_source_df.count()} records with valid user_id in the last 5 minutes. ---")
-if not five_min_source_df.rdd.isEmpty():
-    five_min_source_df.show(5, truncate=False)
+        apply_user_buckets(conn, JOB_NAME, user_rows, window_end=end, stat_time=end, apply_totals=apply_totals)
+        print(f"Advanced {JOB_NAME} watermark to {end}")
+    finally:
+        conn.close()
 
-twenty_four_hour_source_df = base_df.where(
-    F.col("created_at").between(twenty_four_hour_start_time, now)
-)
-print(f"--- Found {twenty_four_hour_source_df.count()} records with valid user_id in the last 24 hours. ---")
-if not twenty_four_hour_source_df.rdd.isEmpty():
-    twenty_four_hour_source_df.show(5, truncate=False)
-
-
-daily_user_agg = twenty_four_hour_source_df.groupBy(F.col("user_id").cast("string").alias("user_id")).agg(
-    F.sum("saved_tokens").alias("saved_tokens"),
-    F.sum("total_tokens").alias("token_sum"),
-    F.sum("cost_usd").alias("cost_sum_usd"),
-    F.count(F.lit(1)).alias("request_count")
-).withColumn("window_start", F.lit(now))
+# -------------------------------------------------------------------
+# Full refresh (기존 방식)
+# -------------------------------------------------------------------
+def run_full_refresh(now):
+    end_minute = now.minute - (now.minute % 5)
+    five_min_end_time = now.replace(minute=end_minute, second=0, microsecond=0)
+    five_min_start_time = five_min_end_time - timedelta(minutes=5)
 
-daily_global_agg = twenty_four_hour_source_df.agg(
-    F.sum("saved_tokens").alias("saved_tokens"),
-    F.sum("total_tokens").alias("token_sum"),
-    F.sum("cost_usd").alias("cost_sum_usd"),
-    F.count(F.lit(1)).alias("request_count")
-).withColumn("window_start", F.lit(now))
+    twenty_four_hour_start_time = now - timedelta(hours=24)
 
-print("Inserting 24-hour rolling aggregation into daily tables...")
-insert_batch_results(daily_user_agg, USER_DAILY_TABLE)
-insert_batch_results(daily_global_agg, GLOBAL_DAILY_TABLE)
+    print("\n--- Time Window Calculation ---")
+    print(f"Based on current minute ({now.minute}), calculated end minute for 5-min window: {end_minute}")
+    print(f"==> 5-min batch window: {five_min_start_time} to {five_min_end_time} (UTC)")
+    print(f"==> 24-hour rolling window: {twenty_four_hour_start_time} to {now} (UTC)\n")
 
+    base_df = spark.read.jdbc(
+        url=JDBC_URL,   
+        table=SOURCE_TABLE,
+        properties=CONNECTION_PROPERTIES
+    ).filter(F.col("user_id").isNotNull())
 
-if five_min_source_df.rdd.isEmpty():
-    print("No new data in the last 5 minutes to update total tables.")
-else:
-    print("Calculating and inserting cumulative totals based on 5-minute aggregation...")
-    five_min_user_agg = five_min_source_df.groupBy(F.col("user_id").cast("string").alias("user_id")).agg(
-        F.sum("saved_tokens").alias("new_saved_tokens"),
-        F.sum("total_tokens").alias("new_token_sum"),
-        F.sum("cost_usd").alias("new_cost_sum_usd"),
-        F.count(F.lit(1)).alias("new_request_count")
+    five_min_source_df = base_df.where(
+        F.col("created_at").between(five_min_start_time, five_min_end_time)
     )
-    five_min_global_agg = five_min_source_df.agg(
-        F.sum("saved_tokens").alias("new_saved_tokens"),
-        F.sum("total_tokens").alias("new_token_sum"),
-        F.sum("cost_usd").alias("new_cost_sum_usd"),
-        F.count(F.lit(1)).alias("new_request_count")
+    five_min_source_df.cache()
+    print(f"--- Found {five_min_source_df.count()} records with valid user_id in the last 5 minutes. ---")
+    if not five_min_source_df.rdd.isEmpty():
+        five_min_source_df.show(5, truncate=False)
+
+    twenty_four_hour_source_df = base_df.where(
+        F.col("created_at").between(twenty_four_hour_start_time, now)
     )
+    print(f"--- Found {twenty_four_hour_source_df.count()} records with valid user_id in the last 24 hours. ---")
+    if not twenty_four_hour_source_df.rdd.isEmpty():
+        twenty_four_hour_source_df.show(5, truncate=False)
+
+
+    daily_user_agg = twenty_four_hour_source_df.groupBy(F.col("user_id").cast("string").alias("user_id")).agg(
+        F.sum("saved_tokens").alias("saved_tokens"),
+        F.sum("total_tokens").alias("token_sum"),
+        F.sum("cost_usd").alias("cost_sum_usd"),
+        F.count(F.lit(1)).alias("request_count")
+    ).withColumn("window_start", F.lit(now))
+
+    daily_global_agg = twenty_four_hour_source_df.agg(
+        F.sum("saved_tokens").alias("saved_tokens"),
+        F.sum("total_tokens").alias("token_sum"),
+        F.sum("cost_usd").alias("cost_sum_usd"),
+        F.count(F.lit(1)).alias("request_count")
+    ).withColumn("window_start", F.lit(now))
+
+    print("Inserting 24-hour rolling aggregation into daily tables...")
+    insert_batch_results(daily_user_agg, USER_DAILY_TABLE)
+    insert_batch_results(daily_global_agg, GLOBAL_DAILY_TABLE)
 
-    # Global Total
-    try:
-        prev_global_total_df = spark.read.jdbc(url=JDBC_URL, table=GLOBAL_TOTAL_TABLE, properties=CONNECTION_PROPERTIES)
-        latest_global_total = prev_global_total_df.orderBy(F.desc("stat_date")).limit(1)
 
-        if latest_global_total.rdd.isEmpty():
-            new_global_total = five_min_global_agg.select(
+    if five_min_source_df.rdd.isEmpty():
+        print("No new data in the last 5 minutes to update total tables.")
+    else:
+        print("Calculating and inserting cumulative totals based on 5-minute aggregation...")
+        five_min_user_agg = five_min_source_df.groupBy(F.col("user_id").cast("string").alias("user_id")).agg(
+            F.sum("saved_tokens").alias("new_saved_tokens"),
+            F.sum("total_tokens").alias("new_token_sum"),
+            F.sum("cost_usd").alias("new_cost_sum_usd"),
+            F.count(F.lit(1)).alias("new_request_count")
+        )
+        five_min_global_agg = five_min_source_df.agg(
+            F.sum("saved_tokens").alias("new_saved_tokens"),
+            F.sum("total_tokens").alias("new_token_sum"),
+            F.sum("cost_usd").alias("new_cost_sum_usd"),
+            F.count(F.lit(1)).alias("new_request_count")
+        )
+
+        # Global Total
+        try:
+            prev_global_total_df = spark.read.jdbc(url=JDBC_URL, table=GLOBAL_TOTAL_TABLE, properties=CONNECTION_PROPERTIES)
+            latest_global_total = prev_global_total_df.orderBy(F.desc("stat_date")).limit(1)
+
+            if latest_global_total.rdd.isEmpty():
+                new_global_total = five_min_global_agg.select(
+                    F.col("new_request_count").alias("request_count"),
+                    F.col("new_saved_tokens").alias("saved_tokens"),
+                    F.col("new_token_sum").alias("token_sum"),
+                    F.col("new_cost_sum_usd").alias("cost_sum_usd")
+                )
+            else:
+                new_global_total = latest_global_total.crossJoin(five_min_global_agg).select(
+                    (F.col("request_count") + F.col("new_request_count")).alias("request_count"),
+                    (F.col("saved_tokens") + F.col("new_saved_tokens")).alias("saved_tokens"),
+                    (F.col("token_sum") + F.col("new_token_sum")).alias("token_sum"),
+                    (F.col("cost_sum_usd") + F.col("new_cost_sum_usd")).alias("cost_sum_usd")
+                )
+
+            global_total_to_insert = new_global_total.withColumn("stat_date", F.lit(now))
+            insert_batch_results(global_total_to_insert, GLOBAL_TOTAL_TABLE)
+
+        except Exception as e:
+            print(f"Could not process {GLOBAL_TOTAL_TABLE}. It might be empty or an error occurred. Treating as first run. Error: {e}")
+            first_global_total = five_min_global_agg.select(
                 F.col("new_request_count").alias("request_count"),
                 F.col("new_saved_tokens").alias("saved_tokens"),
                 F.col("new_token_sum").alias("token_sum"),
                 F.col("new_cost_sum_usd").alias("cost_sum_usd")
+            ).withColumn("stat_date", F.lit(now))
+            insert_batch_results(first_global_total, GLOBAL_TOTAL_TABLE)
+
+        # User Total
+        try:
+            prev_user_total_df = spark.read.jdbc(url=JDBC_URL, table=USER_TOTAL_TABLE, properties=CONNECTION_PROPERTIES)
+            window = Window.partitionBy("user_id").orderBy(F.desc("stat_date"))
+            latest_user_total = prev_user_total_df.withColumn("rank", F.row_number().over(window)).filter(F.col("rank") == 1).drop("rank")
+
+            new_user_total = latest_user_total.join(five_min_user_agg, "user_id", "full_outer").select(
+                F.coalesce(latest_user_total.user_id, five_min_user_agg.user_id).alias("user_id"),
+                (F.coalesce(F.col("request_count"), F.lit(0)) + F.coalesce(F.col("new_request_count"), F.lit(0))).alias("request_count"),
+                (F.coalesce(F.col("saved_tokens"), F.lit(0)) + F.coalesce(F.col("new_saved_tokens"), F.lit(0))).alias("saved_tokens"),
+                (F.coalesce(F.col("token_sum"), F.lit(0)) + F.coalesce(F.col("new_token_sum"), F.lit(0))).alias("token_sum"),
+                (F.coalesce(F.col("cost_sum_usd"), F.lit(0)) + F.coalesce(F.col("new_cost_sum_usd"), F.lit(0))).alias("cost_sum_usd")
             )
-        else:
-            new_global_total = latest_global_total.crossJoin(five_min_global_agg).select(
-                (F.col("request_count") + F.col("new_request_count")).alias("request_count"),
-                (F.col("saved_tokens") + F.col("new_saved_tokens")).alias("saved_tokens"),
-                (F.col("token_sum") + F.col("new_token_sum")).alias("token_sum"),
-                (F.col("cost_sum_usd") + F.col("new_cost_sum_usd")).alias("cost_sum_usd")
-            )
-        
-        global_total_to_insert = new_global_total.withColumn("stat_date", F.lit(now))
-        insert_batch_results(global_total_to_insert, GLOBAL_TOTAL_TABLE)
-
-    except Exception as e:
-        print(f"Could not process {GLOBAL_TOTAL_TABLE}. It might be empty or an error occurred. Treating as first run. Error: {e}")
-        first_global_total = five_min_global_agg.select(
-            F.col("new_request_count").alias("request_count"),
-            F.col("new_saved_tokens").alias("saved_tokens"),
-            F.col("new_token_sum").alias("token_sum"),
-            F.col("new_cost_sum_usd").alias("cost_sum_usd")
-        ).withColumn("stat_date", F.lit(now))
-        insert_batch_results(first_global_total, GLOBAL_TOTAL_TABLE)
-
-    # User Total
-    try:
-        prev_user_total_df = spark.read.jdbc(url=JDBC_URL, table=USER_TOTAL_TABLE, properties=CONNECTION_PROPERTIES)
-        window = Window.partitionBy("user_id").orderBy(F.desc("stat_date"))
-        latest_user_total = prev_user_total_df.withColumn("rank", F.row_number().over(window)).filter(F.col("rank") == 1).drop("rank")
-
-        new_user_total = latest_user_total.join(five_min_user_agg, "user_id", "full_outer").select(
-            F.coalesce(latest_user_total.user_id, five_min_user_agg.user_id).alias("user_id"),
-            (F.coalesce(F.col("request_count"), F.lit(0)) + F.coalesce(F.col("new_request_count"), F.lit(0))).alias("request_count"),
-            (F.coalesce(F.col("saved_tokens"), F.lit(0)) + F.coalesce(F.col("new_saved_tokens"), F.lit(0))).alias("saved_tokens"),
-            (F.coalesce(F.col("token_sum"), F.lit(0)) + F.coalesce(F.col("new_token_sum"), F.lit(0))).alias("token_sum"),
-            (F.coalesce(F.col("cost_sum_usd"), F.lit(0)) + F.coalesce(F.col("new_cost_sum_usd"), F.lit(0))).alias("cost_sum_usd")
-        )
-        
-        user_total_to_insert = new_user_total.withColumn("stat_date", F.lit(now))
-        insert_batch_results(user_total_to_insert, USER_TOTAL_TABLE)
-
-    except Exception as e:
-        print(f"Could not process {USER_TOTAL_TABLE}. It might be empty or an error occurred. Treating as first run. Error: {e}")
-        first_user_total = five_min_user_agg.select(
-            "user_id",
-            F.col("new_request_count").alias("request_count"),
-            F.col("new_saved_tokens").alias("saved_tokens"),
-            F.col("new_token_sum").alias("token_sum"),
-            F.col("new_cost_sum_usd").alias("cost_sum_usd")
-        ).withColumn("stat_date", F.lit(now))
-        insert_batch_results(first_user_total, USER_TOTAL_TABLE)
+
+            user_total_to_insert = new_user_total.withColumn("stat_date", F.lit(now))
+            insert_batch_results(user_total_to_insert, USER_TOTAL_TABLE)
+
+        except Exception as e:
+            print(f"Could not process {USER_TOTAL_TABLE}. It might be empty or an error occurred. Treating as first run. Error: {e}")
+            first_user_total = five_min_user_agg.select(
+                "user_id",
+                F.col("new_request_count").alias("request_count"),
+                F.col("new_saved_tokens").alias("saved_tokens"),
+                F.col("new_token_sum").alias("token_sum"),
+                F.col("new_cost_sum_usd").alias("cost_sum_usd")
+            ).withColumn("stat_date", F.lit(now))
+            insert_batch_results(first_user_total, USER_TOTAL_TABLE)
+
+# -------------------------------------------------------------------
+# Main Logic
+# -------------------------------------------------------------------
+now = datetime.now(timezone.utc)
+print(f"[*] Current script execution time (UTC): {now} (mode: {AGG_MODE})")
+
+if AGG_MODE == "full":
+    run_full_refresh(now)
+else:
+    run_incremental(now)
 
 spark.stop()
 print("Batch aggregation job finished successfully.")
\ No newline at end of file
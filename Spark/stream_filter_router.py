@@ -1,10 +1,12 @@
 # stream_filter_router.py
 
-from array import ArrayType
 import json
 import os
 import re
-from typing import Dict, List, Tuple, Any
+import time
+from typing import List, Tuple
+
+import pandas as pd
 
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
@@ -12,12 +14,16 @@ from pyspark.sql.types import (
     StringType, IntegerType, StructType, StructField, LongType, ArrayType
 )
 from opentelemetry import trace
+from opentelemetry.trace import Link
 from opentelemetry.propagate import extract
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace import TracerProvider, SpanLimits
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import Sampler, SamplingResult, Decision, TraceIdRatioBased
 from opentelemetry.exporter.jaeger.thrift import JaegerExporter
 from opentelemetry.sdk.resources import Resource
 
+from filter_matcher import build_matcher
+
 # -----------------------
 # Config
 # -----------------------
@@ -28,6 +34,18 @@ OUTPUT_TOPIC = os.environ.get("OUTPUT_TOPIC", "chat.raw.filtered.v1")
 FILTER_JSON_PATH = os.environ.get("FILTER_JSON_PATH", "filter_word.json")
 JAEGER_HOST = os.environ.get("JAEGER_AGENT_HOST", "localhost")
 JAEGER_PORT = int(os.environ.get("JAEGER_AGENT_PORT", 6831))
+# batch: BatchSpanProcessor (비동기 export) / simple: 기존 동기 export / off: tracing 안 함
+TRACING_MODE = os.environ.get("TRACING_MODE", "batch").lower()
+# Arrow 배치 span 샘플링 비율 (head sampling)
+TRACE_SAMPLE_RATIO = float(os.environ.get("TRACE_SAMPLE_RATIO", "0.1"))
+# drop(mode=auto)된 메시지는 비율과 관계없이 항상 행 단위 span으로 남김
+TRACE_ALWAYS_SAMPLE_DROPS = os.environ.get("TRACE_ALWAYS_SAMPLE_DROPS", "true").lower() == "true"
+TRACE_BATCH_MAX_IDS = int(os.environ.get("TRACE_BATCH_MAX_IDS", "20"))
+# 속성 크기 제한 (문자열 길이 / span당 속성 수 / 리스트 항목 수)
+TRACE_ATTR_MAX_LEN = int(os.environ.get("TRACE_ATTR_MAX_LEN", "256"))
+TRACE_ATTR_MAX_COUNT = int(os.environ.get("TRACE_ATTR_MAX_COUNT", "32"))
+TRACE_ATTR_MAX_ITEMS = int(os.environ.get("TRACE_ATTR_MAX_ITEMS", "10"))
+ARROW_BATCH_SIZE = int(os.environ.get("ARROW_BATCH_SIZE", "10000"))
 
 # -----------------------
 # Load configs (driver)
@@ -38,70 +56,58 @@ with open(FILTER_JSON_PATH, "r", encoding="utf-8") as f:
 # -----------------------
 # OpenTelemetry
 # -----------------------
-tracer = None
+class FilterSampler(Sampler):
+    """
+    head sampling 규칙
+    - filter.drop=True 속성으로 시작한 span은 항상 샘플링 (TRACE_ALWAYS_SAMPLE_DROPS)
+    - 나머지는 trace_id 기반 비율 샘플링 (부모 샘플링 여부와 무관)
+    """
+
+    def __init__(self, ratio: float, always_sample_drops: bool):
+        self._ratio = TraceIdRatioBased(ratio)
+        self._always_sample_drops = always_sample_drops
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        if self._always_sample_drops and attributes and attributes.get("filter.drop"):
+            return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes)
+        return self._ratio.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+
+    def get_description(self) -> str:
+        return f"FilterSampler{{drops={self._always_sample_drops},{self._ratio.get_description()}}}"
+
 def get_tracer():
-    global tracer
-    if tracer is None:
+    """
+    executor의 Python worker 프로세스마다 provider를 한 번만 만들고 재사용.
+    UDF 클로저는 태스크마다 새로 역직렬화되므로 모듈 전역 변수 대신
+    프로세스 전역인 OpenTelemetry tracer provider에 보관한다.
+    """
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
         provider = TracerProvider(
-            resource=Resource.create({"service.name": "backend"})
+            resource=Resource.create({"service.name": "backend"}),
+            sampler=FilterSampler(TRACE_SAMPLE_RATIO, TRACE_ALWAYS_SAMPLE_DROPS),
+            span_limits=SpanLimits(
+                max_attributes=TRACE_ATTR_MAX_COUNT,
+                max_attribute_length=TRACE_ATTR_MAX_LEN,
+            ),
         )
         jaeger_exporter = JaegerExporter(
             agent_host_name=JAEGER_HOST,
             agent_port=JAEGER_PORT,
         )
-        provider.add_span_processor(SimpleSpanProcessor(jaeger_exporter))
+        if TRACING_MODE == "simple":
+            provider.add_span_processor(SimpleSpanProcessor(jaeger_exporter))
+        else:
+            provider.add_span_processor(BatchSpanProcessor(jaeger_exporter))
         trace.set_tracer_provider(provider)
-        tracer = trace.get_tracer(__name__)
-    return tracer
+        provider = trace.get_tracer_provider()
+    return provider.get_tracer(__name__)
 
 BIT_INDEX = {"goodbye": 0, "apology": 1, "thank": 2, "greeting": 3, "call_only": 4, "reaction_only": 5, "no_meaning": 6}
 CATEGORY_PRIORITY = {f["category"]: f.get("priority", 9999) for f in FILTER_CFG.get("filters", [])}
 MEANINGFUL_RE = re.compile(r"[0-9A-Za-z가-힣]")
 
-def _escape_spaces_to_ws_regex(s: str) -> str:
-    parts = s.split()
-    parts = [re.escape(p) for p in parts]
-    return r"\s+".join(parts)
-
-def _build_trailer_group(trailers: List[str]) -> str:
-    if not trailers:
-        return r""
-    escaped = sorted([re.escape(t) for t in trailers], key=len, reverse=True)
-    return r"(?:\s*(?:" + "|".join(escaped) + r"))*"
-
-def _left_boundary() -> str:
-    return r"(?<![0-9A-Za-z가-힣])"
-
-def compile_filters(filter_cfg: Dict[str, Any]) -> Dict[str, List[re.Pattern]]:
-    compiled: Dict[str, List[re.Pattern]] = {}
-    for f in filter_cfg.get("filters", []):
-        cat = f.get("category")
-        strict = f.get("strict", {})
-        pats: List[re.Pattern] = []
-        if cat == "call_only":
-            bases = strict.get("base", [])
-            suf = strict.get("allow_suffix", [])
-            trailers = strict.get("allowed_trailers", [])
-            trail = _build_trailer_group(trailers)
-            left = _left_boundary()
-            suf_alt = r"(?:" + "|".join([re.escape(s) for s in suf]) + r")?" if suf else r""
-            for base in bases:
-                b = _escape_spaces_to_ws_regex(base)
-                rx = left + "(" + b + ")" + suf_alt + trail + r"(?![0-9A-Za-z가-힣])"
-                pats.append(re.compile(rx, re.IGNORECASE | re.UNICODE))
-        else:
-            exact = strict.get("exact", [])
-            trailers = strict.get("allowed_trailers", [])
-            trail = _build_trailer_group(trailers)
-            left = _left_boundary()
-            for phrase in exact:
-                p = _escape_spaces_to_ws_regex(phrase)
-                rx = left + "(" + p + ")" + trail + r"(?![0-9A-Za-z가-힣])"
-                pats.append(re.compile(rx, re.IGNORECASE | re.UNICODE))
-        compiled[cat] = pats
-    return compiled
-
-COMPILED = compile_filters(FILTER_CFG)
+MATCHER = build_matcher(FILTER_CFG)
 
 def remove_spans(text: str, spans: List[Tuple[int, int]]) -> str:
     if not spans:
@@ -119,11 +125,7 @@ def remove_spans(text: str, spans: List[Tuple[int, int]]) -> str:
     return result.strip()
 
 def filter_once(text: str) -> Tuple[str, int, List[Tuple[str, str]]]:
-    raw_matches = []
-    for cat, patterns in COMPILED.items():
-        for pat in patterns:
-            for m in pat.finditer(text):
-                raw_matches.append((m.start(), m.end(), cat, m.group(1).strip()))
+    raw_matches = MATCHER.raw_matches(text)
     
     raw_matches.sort(key=lambda m: (-(m[1] - m[0]), m[0], CATEGORY_PRIORITY.get(m[2], 9999)))
     
@@ -167,7 +169,7 @@ def route_message(text: str) -> Tuple[str, str, int, str, List[Tuple[str, str]]]
     return ("", top_cat, mask, "auto", matched_word_details)
 
 # -----------------------
-# Spark UDF
+# Spark UDF (Arrow 기반 pandas_udf, 배치 단위 처리)
 # -----------------------
 udf_schema = StructType([
     StructField("final_text", StringType(), True),
@@ -175,46 +177,88 @@ udf_schema = StructType([
     StructField("category_mask", IntegerType(), True),
     StructField("mode", StringType(), True),
     StructField("filtered_words_details", ArrayType(ArrayType(StringType())), False),
-    StructField("outgoing_headers", ArrayType(
-        StructType([
-            StructField("key", StringType(), False),
-            StructField("value", StringType(), True)
-        ])
-    ))
 ])
 
-@F.udf(returnType=udf_schema)
-def apply_filter_and_trace_udf(trace_id, room_id, message_id, user_id, timestamp, text, schema_version):
+def route_batch(texts: pd.Series) -> pd.DataFrame:
+    final_texts, top_categories, masks, modes, details = [], [], [], [], []
+    for text in texts:
+        final_text, top_category, category_mask, mode, matched = route_message(text)
+        final_texts.append(final_text)
+        top_categories.append(top_category)
+        masks.append(category_mask)
+        modes.append(mode)
+        details.append([[w for w, _ in matched], [c for _, c in matched]])
+    return pd.DataFrame({
+        "final_text": final_texts,
+        "top_category": top_categories,
+        "category_mask": pd.Series(masks, dtype="int32"),
+        "mode": modes,
+        "filtered_words_details": details,
+    })
+
+def _context_of(traceparent):
+    return extract({"traceparent": traceparent}) if traceparent else None
+
+def _trace_batch(trace_ids: pd.Series, texts: pd.Series, out: pd.DataFrame, started_ns: int, ended_ns: int) -> None:
     local_tracer = get_tracer()
-    carrier = {'traceparent': trace_id} if trace_id else {}
-    ctx = extract(carrier)
+    is_drop = (out["mode"] == "auto").to_numpy()
 
-    with local_tracer.start_as_current_span("pyspark-filter-and-route", context=ctx) as span:
-        
-        final_text, top_category, category_mask, mode, matched_word_details = route_message(text)
-        words = [item[0] for item in matched_word_details]
-        categories = [item[1] for item in matched_word_details]
-        filtered_words_details = [words, categories]
-        
-        input_data = {
-            "trace_id": trace_id, "room_id": room_id, "message_id": message_id,
-            "user_id": user_id, "timestamp": timestamp, "text": text,
-            "schema_version": schema_version
-        }
-        output_data = {
-            "final_text": final_text, "top_category": top_category,
-            "category_mask": category_mask, "mode": mode,
-            "filtered_words": [item[0] for item in matched_word_details]
-        }
-
-        span.set_attribute("input.data.json", json.dumps(input_data, ensure_ascii=False))
-        span.set_attribute("output.data.json", json.dumps(output_data, ensure_ascii=False))
-        span.set_attribute("correlation.trace_id", trace_id if trace_id else "N/A")
-        span.set_attribute("filter.word_count", len(words))
-
-        outgoing_headers = [{"key": "trace_id", "value": trace_id if trace_id else ""}]
-        
-        return (final_text, top_category, category_mask, mode, filtered_words_details, outgoing_headers)
+    # 배치 span: 비율 샘플링, 요청 trace와는 span link로 연결 (상위 몇 개만)
+    links = []
+    for tid in trace_ids.dropna().head(TRACE_BATCH_MAX_IDS):
+        sc = trace.get_current_span(_context_of(tid)).get_span_context()
+        if sc.is_valid:
+            links.append(Link(sc))
+    span = local_tracer.start_span(
+        "pyspark-filter-and-route-batch",
+        links=links,
+        start_time=started_ns,
+        attributes={
+            "batch.rows": len(texts),
+            "batch.auto_rows": int(is_drop.sum()),
+            "batch.duration_ms": round((ended_ns - started_ns) / 1e6, 3),
+        },
+    )
+    span.end(end_time=ended_ns)
+
+    if not TRACE_ALWAYS_SAMPLE_DROPS:
+        return
+
+    # drop된 메시지: 요청 trace의 자식 span (샘플러가 항상 샘플링)
+    for i in is_drop.nonzero()[0]:
+        tid = trace_ids.iat[i]
+        words, categories = out["filtered_words_details"].iat[i]
+        span = local_tracer.start_span(
+            "pyspark-filter-drop",
+            context=_context_of(tid),
+            start_time=started_ns,
+            attributes={
+                "filter.drop": True,
+                "filter.top_category": out["top_category"].iat[i],
+                "filter.category_mask": int(out["category_mask"].iat[i]),
+                "filter.word_count": len(words),
+                "filter.words": list(words[:TRACE_ATTR_MAX_ITEMS]),
+                "filter.categories": list(categories[:TRACE_ATTR_MAX_ITEMS]),
+                "input.text": texts.iat[i] or "",
+                "correlation.trace_id": tid or "N/A",
+            },
+        )
+        span.end(end_time=ended_ns)
+
+@F.pandas_udf(udf_schema)
+def route_batch_udf(trace_id: pd.Series, text: pd.Series) -> pd.DataFrame:
+    # 행마다 span/JSON 직렬화를 하지 않고 배치 단위로 처리, span은 끝난 뒤 샘플링 규칙에 따라 기록
+    if TRACING_MODE == "off":
+        return route_batch(text)
+
+    started_ns = time.time_ns()
+    out = route_batch(text)
+    try:
+        _trace_batch(trace_id, text, out, started_ns, time.time_ns())
+    except Exception as e:
+        # tracing 실패가 필터링 결과에 영향을 주지 않도록
+        print(f"[stream_filter_router] tracing skipped: {e}")
+    return out
 
 # -----------------------
 # Spark app
@@ -223,6 +267,8 @@ spark = SparkSession.builder \
     .appName("SETA - Save Earth Through AI") \
     .config("spark.sql.shuffle.partitions", "4") \
     .config("spark.ui.showConsoleProgress", "true") \
+    .config("spark.sql.execution.arrow.maxRecordsPerBatch", str(ARROW_BATCH_SIZE)) \
+    .config("spark.python.worker.reuse", "true") \
     .getOrCreate()
 
 spark.sparkContext.setLogLevel("WARN")
@@ -239,10 +285,7 @@ kafka_schema = StructType([
 
 kafka_stream = spark.readStream.format("kafka").option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP_SERVERS).option("subscribe", INPUT_TOPIC).load()
 parsed_stream = kafka_stream.select(F.from_json(F.decode(F.col("value"), "UTF-8"), kafka_schema).alias("data")).select("data.*")
-applied = parsed_stream.withColumn("result", apply_filter_and_trace_udf(
-    F.col("trace_id"), F.col("room_id"), F.col("message_id"),
-    F.col("user_id"), F.col("timestamp"), F.col("text"), F.col("schema_version")
-))
+applied = parsed_stream.withColumn("result", route_batch_udf(F.col("trace_id"), F.col("text")))
 
 final_df = applied.select(
     "trace_id", "room_id", "message_id", "user_id", "timestamp", "text", "schema_version",
@@ -251,7 +294,11 @@ final_df = applied.select(
     F.col("result.category_mask").alias("category_mask"),
     F.col("result.mode").alias("mode"),
     F.col("result.filtered_words_details").alias("filtered_words_details"),
-    F.col("result.outgoing_headers").alias("headers")
+    # Kafka 헤더는 trace_id만 전달하므로 UDF 밖에서 컬럼 연산으로 생성
+    F.array(F.struct(
+        F.lit("trace_id").alias("key"),
+        F.coalesce(F.col("trace_id"), F.lit("")).alias("value"),
+    )).alias("headers")
 )
 
 console_q = final_df.writeStream.outputMode("append").format("console").option("truncate", "false").start()
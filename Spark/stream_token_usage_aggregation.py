@@ -0,0 +1,117 @@
+# stream_token_usage_aggregation.py
+"""
+TokenUsage 이벤트(Kafka) → 5분 버킷 스트리밍 집계 → PostgreSQL upsert
+
+filter_worker / llm_worker가 token_usage insert와 함께 발행하는 이벤트를 소비해서
+(user_id, 5분 window) 합계를 Spark state에 유지하고, foreachBatch에서 token_usage_sink로 반영한다.
+배치 잡(spark_batch_aggregation.py)과 같은 버킷/daily/total 테이블을 쓰므로 대시보드 쿼리는 그대로.
+
+- event_id 기준 중복 제거 (워커는 at-least-once 발행)
+- watermark보다 늦게 도착한 이벤트는 버림 (필요하면 배치 잡 incremental 모드로 보정)
+- foreachBatch 재실행 시에도 버킷 교체 + delta 반영이라 중복 합산 없음
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+from pyspark.sql import SparkSession, functions as F
+from pyspark.sql.types import StructType, StructField, StringType, LongType, DoubleType
+
+from token_usage_sink import BUCKET_MINUTES, METRICS, apply_user_buckets, epoch_to_utc, floor_to_bucket, pg_connect
+
+# -----------------------
+# 환경 설정
+# -----------------------
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "kafka:29092")
+USAGE_TOPIC = os.environ.get("KAFKA_TOPIC_TOKEN_USAGE", "chat.token.usage.v1")
+# checkpoint가 없을 때(최초 기동, checkpoint 유실)만 적용. 이후에는 checkpoint의 오프셋부터 이어서 읽음.
+# latest로 시작하면 이미 DB에 있는 버킷을 일부 이벤트만으로 다시 계산하게 되므로(싱크가 더 작은 값은 버림 → 누락)
+# 기본은 earliest: 토픽 보관 범위의 이벤트로 버킷 전체를 다시 만들고 event_id로 중복 제거
+STARTING_OFFSETS = os.environ.get("USAGE_STARTING_OFFSETS", "earliest")
+JOB_NAME = os.environ.get("AGG_JOB_NAME", "token_usage_stream")
+# 이벤트 시간 기준 지연 허용 (이보다 늦은 이벤트는 state에서 빠진 window라 반영 안 됨)
+EVENT_WATERMARK = os.environ.get("USAGE_EVENT_WATERMARK", "10 minutes")
+TRIGGER_INTERVAL = os.environ.get("USAGE_TRIGGER_INTERVAL", "10 seconds")
+# 반드시 영속 볼륨 경로 (docker-compose: usage-stream-checkpoint)
+CHECKPOINT_DIR = os.environ.get("USAGE_CHECKPOINT_DIR", "/opt/bitnami/spark/checkpoints/token-usage-agg-v1")
+
+usage_schema = StructType([
+    StructField("event_id", StringType(), False),
+    StructField("user_id", StringType(), True),
+    StructField("message_id", StringType(), True),
+    StructField("source", StringType(), True),
+    StructField("prompt_tokens", LongType(), True),
+    StructField("completion_tokens", LongType(), True),
+    StructField("total_tokens", LongType(), True),
+    StructField("cost_usd", DoubleType(), True),
+    StructField("saved_tokens", LongType(), True),
+    StructField("saved_cost_usd", DoubleType(), True),
+    StructField("created_at", LongType(), True),  # epoch milliseconds
+    StructField("schema_version", StringType(), True),
+])
+
+# -----------------------
+# Spark
+# -----------------------
+spark = SparkSession.builder \
+    .appName("SETA Token Usage Streaming Aggregation") \
+    .config("spark.sql.session.timeZone", "UTC") \
+    .config("spark.sql.shuffle.partitions", "4") \
+    .getOrCreate()
+
+spark.sparkContext.setLogLevel("WARN")
+
+events = spark.readStream.format("kafka") \
+    .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP_SERVERS) \
+    .option("subscribe", USAGE_TOPIC) \
+    .option("startingOffsets", STARTING_OFFSETS) \
+    .option("failOnDataLoss", "false") \
+    .load() \
+    .select(F.from_json(F.decode(F.col("value"), "UTF-8"), usage_schema).alias("e")) \
+    .select("e.*") \
+    .where(F.col("event_id").isNotNull() & F.col("user_id").isNotNull()) \
+    .withColumn("event_time", F.timestamp_millis(F.col("created_at")))
+
+bucket_sec = BUCKET_MINUTES * 60
+buckets = events \
+    .withWatermark("event_time", EVENT_WATERMARK) \
+    .dropDuplicatesWithinWatermark(["event_id"]) \
+    .groupBy(F.window("event_time", f"{BUCKET_MINUTES} minutes"), F.col("user_id")) \
+    .agg(
+        F.count(F.lit(1)).alias("request_count"),
+        F.coalesce(F.sum("saved_tokens"), F.lit(0)).alias("saved_tokens"),
+        F.coalesce(F.sum("total_tokens"), F.lit(0)).alias("token_sum"),
+        F.coalesce(F.sum("cost_usd"), F.lit(0.0)).cast("decimal(20,6)").alias("cost_sum_usd"),
+    ) \
+    .select(
+        "user_id",
+        F.unix_timestamp(F.col("window.start")).alias("bucket_epoch"),
+        *METRICS,
+    )
+
+
+def upsert_buckets(batch_df, batch_id):
+    """update 모드: 이번 마이크로배치에서 값이 바뀐 (user, window)만 들어옴 (window 전체 합계)"""
+    rows = batch_df.collect()
+    if not rows:
+        return
+    user_rows = [(r.user_id, epoch_to_utc(r.bucket_epoch), *(r[m] for m in METRICS)) for r in rows]
+
+    now = datetime.now(timezone.utc)
+    # 아직 열려 있는 현재 버킷까지 포함한 최근 24시간
+    window_end = floor_to_bucket(now) + timedelta(minutes=BUCKET_MINUTES)
+    conn = pg_connect()
+    try:
+        apply_user_buckets(conn, JOB_NAME, user_rows, window_end=window_end, stat_time=now)
+    finally:
+        conn.close()
+    print(f"[batch {batch_id}] upserted {len(user_rows)} user buckets (window_end={window_end})")
+
+
+query = buckets.writeStream \
+    .outputMode("update") \
+    .foreachBatch(upsert_buckets) \
+    .option("checkpointLocation", CHECKPOINT_DIR) \
+    .trigger(processingTime=TRIGGER_INTERVAL) \
+    .start()
+
+query.awaitTermination()
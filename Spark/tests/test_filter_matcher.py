@@ -0,0 +1,85 @@
+# tests/test_filter_matcher.py
+import json
+import os
+import random
+import sys
+
+import pytest
+
+SPARK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SPARK_DIR)
+
+from filter_matcher import build_matcher, compile_filters  # noqa: E402
+
+
+def legacy_matches(cfg, text):
+    """기존 방식: 패턴마다 finditer"""
+    raw = []
+    for cat, pats in compile_filters(cfg).items():
+        for pat in pats:
+            for m in pat.finditer(text):
+                raw.append((m.start(), m.end(), cat, m.group(1).strip()))
+    return raw
+
+
+def _cfg(*filters):
+    return {"filters": list(filters)}
+
+
+with open(os.path.join(SPARK_DIR, "filter_word.json"), encoding="utf-8") as f:
+    FILTER_CFG = json.load(f)
+
+OVERLAP_CFG = _cfg(
+    {"category": "goodbye", "strict": {"exact": ["잘", "잘 가", "잘가요", "잘가", "bye", "bye bye"], "allowed_trailers": ["~", "!"]}},
+    {"category": "thank", "strict": {"exact": ["잘 먹었습니다", "thanks", "thank you"]}},
+    {"category": "call_only", "strict": {"base": ["세타", "seta"], "allow_suffix": ["야", "아"], "allowed_trailers": ["?"]}},
+)
+
+# 첫 단어(anchor)가 없는 패턴: 항상 finditer 경로
+ANCHORLESS_CFG = _cfg(
+    {"category": "no_meaning", "strict": {"exact": ["", "   "], "allowed_trailers": ["ㅋ"]}},
+    {"category": "greeting", "strict": {"exact": ["안녕", "hi"]}},
+)
+
+TEXTS = [
+    "",
+    " ",
+    "잘 가~! 잘가요 잘가 bye bye bye",
+    "잘 먹었습니다 thanks thank you 잘",
+    "세타야? seta 세타아 setaa 세타",
+    "BYE Bye bYe ByE bye",
+    "안녕하세요! 고마워요 ㅋㅋㅋ 잘자 굿나잇",
+    "İstanbul bye ǅ잘 가 ß thank you",
+    "bye\tbye\nbye  bye",
+    "🙂잘가🙂 bye🙂 세타야",
+    "오늘 날씨 알려줘 그리고 고마워 안녕",
+]
+
+
+@pytest.mark.parametrize("cfg", [FILTER_CFG, OVERLAP_CFG, ANCHORLESS_CFG], ids=["filter_word", "overlap", "anchorless"])
+@pytest.mark.parametrize("text", TEXTS)
+def test_matches_legacy(cfg, text):
+    assert build_matcher(cfg).raw_matches(text) == legacy_matches(cfg, text)
+
+
+def test_empty_input():
+    matcher = build_matcher(FILTER_CFG)
+    assert matcher.raw_matches("") == []
+
+
+def test_empty_config():
+    matcher = build_matcher({})
+    assert matcher.scanner is None
+    assert matcher.raw_matches("bye 안녕") == []
+
+
+@pytest.mark.parametrize("cfg", [FILTER_CFG, OVERLAP_CFG], ids=["filter_word", "overlap"])
+def test_random_texts_match_legacy(cfg):
+    """규칙 단어/공백/구두점/유니코드 조각을 섞은 임의 문자열"""
+    rng = random.Random(1234)
+    pieces = ["잘", "가", "요", "bye", "BYE", "세타", "야", "thank", "you", "안녕", "ㅋㅋ",
+              " ", "  ", "\n", "~", "!", "?", ".", "a", "1", "İ", "ß", "🙂"]
+    matcher = build_matcher(cfg)
+    for _ in range(500):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        assert matcher.raw_matches(text) == legacy_matches(cfg, text), text
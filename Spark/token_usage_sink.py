@@ -0,0 +1,198 @@
+# token_usage_sink.py
+"""
+token_usage 집계 결과를 PostgreSQL에 반영하는 공용 로직
+(spark_batch_aggregation.py incremental 모드 / stream_token_usage_aggregation.py 에서 사용)
+
+- (user_id, 5분 버킷) 단위 합계를 받아서 버킷 테이블을 교체(upsert)
+- 교체 전후 차이(delta)만 누적 합계 / 전체 버킷에 더함 → 같은 버킷을 여러 번 넣어도 중복 합산 없음
+- 24시간 window = 버킷 288개 합으로 daily 스냅샷 upsert
+- 모든 단계는 한 트랜잭션, 배치/스트리밍 잡 간에는 advisory lock으로 직렬화
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+POSTGRES_HOST = os.environ.get("POSTGRES_HOST")
+POSTGRES_PORT = os.environ.get("POSTGRES_PORT", "5432")
+POSTGRES_DB = os.environ.get("POSTGRES_DB")
+POSTGRES_USER = os.environ.get("POSTGRES_USER")
+POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD")
+
+USER_DAILY_TABLE = "user_saved_token_daily"
+USER_TOTAL_TABLE = "user_saved_token_total"
+GLOBAL_DAILY_TABLE = "global_saved_token_daily"
+GLOBAL_TOTAL_TABLE = "global_saved_token_total"
+USER_BUCKET_TABLE = "user_saved_token_bucket"
+GLOBAL_BUCKET_TABLE = "global_saved_token_bucket"
+WATERMARK_TABLE = "token_usage_agg_watermark"
+# 배치/스트리밍 잡이 같은 버킷·누적 테이블을 갱신하므로 잡 이름과 무관한 공용 락으로 직렬화
+AGG_LOCK_KEY = "token_usage_agg"
+
+BUCKET_MINUTES = 5
+DAILY_WINDOW_HOURS = 24
+BUCKET_RETENTION_HOURS = int(os.environ.get("AGG_BUCKET_RETENTION_HOURS", "48"))
+
+METRICS = ("request_count", "saved_tokens", "token_sum", "cost_sum_usd")
+COLS = ", ".join(METRICS)
+
+
+def floor_to_bucket(ts):
+    return ts.replace(minute=ts.minute - (ts.minute % BUCKET_MINUTES), second=0, microsecond=0)
+
+
+def epoch_to_utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+def pg_connect():
+    return psycopg2.connect(
+        host=POSTGRES_HOST,
+        port=POSTGRES_PORT,
+        dbname=POSTGRES_DB,
+        user=POSTGRES_USER,
+        password=POSTGRES_PASSWORD,
+    )
+
+
+def read_watermark(conn, job_name):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT high_watermark FROM {WATERMARK_TABLE} WHERE job_name = %s", (job_name,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _sum_cols():
+    return ", ".join(f"SUM({m}) AS {m}" for m in METRICS)
+
+
+def _set_excluded():
+    return ", ".join(f"{m} = EXCLUDED.{m}" for m in METRICS)
+
+
+def _add_delta(target="t"):
+    return ", ".join(f"{m} = {target}.{m} + d.{m}" for m in METRICS)
+
+
+def _add_excluded(target):
+    return ", ".join(f"{m} = {target}.{m} + EXCLUDED.{m}" for m in METRICS)
+
+
+def _d_cols():
+    return ", ".join("d." + m for m in METRICS)
+
+
+def apply_user_buckets(conn, job_name, user_rows, window_end, stat_time, apply_totals=True):
+    """
+    user_rows: [(user_id, bucket_start, request_count, saved_tokens, token_sum, cost_sum_usd), ...]
+    window_end: daily 스냅샷 기준 시각 (버킷 경계, window_start 컬럼 값으로도 사용)
+    stat_time: 누적 합계 행의 stat_date
+
+    daily 스냅샷은 window_end가 watermark보다 앞서면 전체 사용자,
+    아니면(같은 5분 구간 안에서 반복 호출되는 스트리밍) 이번에 바뀐 사용자만 갱신.
+    끝나면 watermark = max(watermark, window_end).
+    """
+    daily_params = {"start": window_end - timedelta(hours=DAILY_WINDOW_HOURS), "end": window_end}
+    with conn, conn.cursor() as cur:
+        # 버킷 delta 계산~반영 사이에 다른 잡이 끼어들면 같은 delta가 두 번 더해짐 → 트랜잭션 끝까지 잡 간 배타
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (AGG_LOCK_KEY,))
+        cur.execute(f"SELECT high_watermark FROM {WATERMARK_TABLE} WHERE job_name = %s FOR UPDATE", (job_name,))
+        row = cur.fetchone()
+        watermark = row[0] if row else None
+        full_refresh = watermark is None or window_end > watermark
+
+        cur.execute(f"CREATE TEMP TABLE stage_user_bucket (LIKE {USER_BUCKET_TABLE}) ON COMMIT DROP")
+        if user_rows:
+            execute_values(cur, f"INSERT INTO stage_user_bucket (user_id, bucket_start, {COLS}) VALUES %s", user_rows)
+        # 버킷 값은 줄어들지 않음 (행/이벤트 삭제 없음) → 더 작은 값으로 덮어쓰지 않도록 제외
+        cur.execute(f"""
+            DELETE FROM stage_user_bucket s USING {USER_BUCKET_TABLE} b
+            WHERE b.user_id = s.user_id AND b.bucket_start = s.bucket_start
+              AND b.request_count > s.request_count
+        """)
+
+        cur.execute(f"""
+            CREATE TEMP TABLE bucket_delta ON COMMIT DROP AS
+            SELECT s.user_id, s.bucket_start, {", ".join(f"s.{m} - COALESCE(b.{m}, 0) AS {m}" for m in METRICS)}
+            FROM stage_user_bucket s
+            LEFT JOIN {USER_BUCKET_TABLE} b USING (user_id, bucket_start)
+        """)
+
+        if apply_totals:
+            # 사용자별 누적 합계: 최신 행을 갱신, 없으면 새로 추가
+            cur.execute(f"""
+                CREATE TEMP TABLE user_delta ON COMMIT DROP AS
+                SELECT user_id, {_sum_cols()} FROM bucket_delta GROUP BY user_id
+            """)
+            cur.execute(f"""
+                UPDATE {USER_TOTAL_TABLE} t SET {_add_delta()}, stat_date = %(now)s
+                FROM user_delta d
+                WHERE t.user_id = d.user_id
+                  AND t.stat_date = (SELECT MAX(x.stat_date) FROM {USER_TOTAL_TABLE} x WHERE x.user_id = d.user_id)
+            """, {"now": stat_time})
+            cur.execute(f"""
+                INSERT INTO {USER_TOTAL_TABLE} (user_id, stat_date, {COLS})
+                SELECT d.user_id, %(now)s, {_d_cols()}
+                FROM user_delta d
+                WHERE NOT EXISTS (SELECT 1 FROM {USER_TOTAL_TABLE} t WHERE t.user_id = d.user_id)
+            """, {"now": stat_time})
+
+            # 전체 누적 합계 (단일 최신 행)
+            cur.execute(f"""
+                CREATE TEMP TABLE global_delta ON COMMIT DROP AS
+                SELECT {_sum_cols()} FROM bucket_delta HAVING COUNT(*) > 0
+            """)
+            cur.execute(f"""
+                UPDATE {GLOBAL_TOTAL_TABLE} t SET {_add_delta()}, stat_date = %(now)s
+                FROM global_delta d
+                WHERE t.stat_date = (SELECT MAX(stat_date) FROM {GLOBAL_TOTAL_TABLE})
+            """, {"now": stat_time})
+            cur.execute(f"""
+                INSERT INTO {GLOBAL_TOTAL_TABLE} (stat_date, {COLS})
+                SELECT %(now)s, {_d_cols()}
+                FROM global_delta d
+                WHERE NOT EXISTS (SELECT 1 FROM {GLOBAL_TOTAL_TABLE})
+            """, {"now": stat_time})
+
+        cur.execute(f"""
+            INSERT INTO {USER_BUCKET_TABLE} (user_id, bucket_start, {COLS})
+            SELECT user_id, bucket_start, {COLS} FROM stage_user_bucket
+            ON CONFLICT (user_id, bucket_start) DO UPDATE SET {_set_excluded()}
+        """)
+        # 전체 버킷 = 사용자 버킷 합 → 사용자 버킷 변화량만 더함
+        cur.execute(f"""
+            INSERT INTO {GLOBAL_BUCKET_TABLE} (bucket_start, {COLS})
+            SELECT bucket_start, {_sum_cols()} FROM bucket_delta GROUP BY bucket_start
+            ON CONFLICT (bucket_start) DO UPDATE SET {_add_excluded(GLOBAL_BUCKET_TABLE)}
+        """)
+
+        # 24시간 rolling window = 버킷 합 (token_usage는 읽지 않음)
+        touched = "" if full_refresh else "AND user_id IN (SELECT user_id FROM stage_user_bucket)"
+        cur.execute(f"""
+            INSERT INTO {USER_DAILY_TABLE} (user_id, window_start, {COLS})
+            SELECT user_id, %(end)s, {_sum_cols()}
+            FROM {USER_BUCKET_TABLE}
+            WHERE bucket_start >= %(start)s AND bucket_start < %(end)s {touched}
+            GROUP BY user_id
+            ON CONFLICT (user_id, window_start) DO UPDATE SET {_set_excluded()}
+        """, daily_params)
+        cur.execute(f"""
+            INSERT INTO {GLOBAL_DAILY_TABLE} (window_start, {COLS})
+            SELECT %(end)s, {_sum_cols()}
+            FROM {GLOBAL_BUCKET_TABLE}
+            WHERE bucket_start >= %(start)s AND bucket_start < %(end)s
+            HAVING COUNT(*) > 0
+            ON CONFLICT (window_start) DO UPDATE SET {_set_excluded()}
+        """, daily_params)
+
+        if full_refresh:
+            cur.execute(f"""
+                INSERT INTO {WATERMARK_TABLE} (job_name, high_watermark, updated_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (job_name) DO UPDATE SET high_watermark = EXCLUDED.high_watermark, updated_at = NOW()
+            """, (job_name, window_end))
+
+            retention = window_end - timedelta(hours=max(BUCKET_RETENTION_HOURS, DAILY_WINDOW_HOURS) + 1)
+            cur.execute(f"DELETE FROM {USER_BUCKET_TABLE} WHERE bucket_start < %s", (retention,))
+            cur.execute(f"DELETE FROM {GLOBAL_BUCKET_TABLE} WHERE bucket_start < %s", (retention,))